@@ -0,0 +1,244 @@
+from itertools import product
+from typing import Collection
+from typing import Iterator
+from typing import List
+from typing import Set
+from typing import Tuple
+from uuid import UUID
+
+import numpy as np
+from shapely.geometry.base import BaseGeometry
+
+from .distance import DEFAULT_CHUNK_SIZE
+from .distance import eval_rotation
+from .distance import is_circle
+from .internal import LENGTH
+from .internal import WIDTH
+from .internal import X
+from .internal import Y
+from .model import Building
+from .model import BuildingConnection
+from .model import ExternalPoint
+from .model import InputData
+
+# касание границы области не считается выходом за нее
+AREA_TOLERANCE_M = 1e-7
+
+
+def get_building_connection_types(
+        buildings: List[Building],
+        building_connections: List[BuildingConnection]
+) -> List[Set[UUID]]:
+    """
+    Типы соединений, подключенных к точкам подключения сооружений. У точек подключения нет собственного типа,
+    поэтому с `ExternalPoint.connection_point_type_id` сравниваются типы их соединений.
+
+    :return List[Set[UUID]]: id типов соединений для каждого сооружения
+    """
+    point_types = {}
+    for connection in building_connections:
+        for point_id in (connection.source_connection_point_id, connection.target_connection_point_id):
+            point_types.setdefault(point_id, set()).add(connection.connection_type_id)
+    return [
+        set().union(*(point_types.get(point.id, set()) for point in building.connection_points))
+        for building in buildings
+    ]
+
+
+class SiteEvaluator:
+    """Проверка сооружений на размещение в допустимой области генплана и расстояния до внешних точек.
+
+    Граница области один раз переводится в массив отрезков, после чего все сооружения массива проверяются
+    векторизованно, без построения `shapely`-геометрии для каждого сооружения. Сооружения передаются массивом
+    формы (n, 5) со столбцами `X`, `Y`, `ANGLE`, `WIDTH`, `LENGTH`, прямоугольники могут быть повернуты
+    на произвольный угол, круги задаются как в `force.internal`.
+
+    Attributes:
+        :segments (np.ndarray): отрезки границы области (внешних и внутренних колец) формы (s, 4)
+            со столбцами x и y начала и конца.
+        :external_point_coordinates (np.ndarray): координаты внешних точек формы (e, 2).
+        :external_point_type_ids (List[UUID]): типы точек подключения внешних точек.
+
+    """
+
+    def __init__(self, development_area: BaseGeometry, external_points: List[ExternalPoint]):
+        rings = [
+            ring
+            for polygon in getattr(development_area, 'geoms', [development_area]) if not polygon.is_empty
+            for ring in (polygon.exterior, *polygon.interiors)
+        ]
+        segments = [
+            np.hstack([coordinates[:-1], coordinates[1:]])
+            for coordinates in (np.asarray(ring.coords, dtype=np.float64)[:, :2] for ring in rings)
+        ]
+        segments = np.concatenate(segments) if segments else np.empty((0, 4), dtype=np.float64)
+        # повторяющиеся вершины дают отрезки нулевой длины, у которых нет нормали
+        self.segments = segments[(segments[:, 0] != segments[:, 2]) | (segments[:, 1] != segments[:, 3])]
+
+        self.external_point_coordinates = np.array(
+            [(point.point_m.x, point.point_m.y) for point in external_points], dtype=np.float64
+        ).reshape(-1, 2)
+        self.external_point_type_ids = [point.connection_point_type_id for point in external_points]
+
+    @classmethod
+    def from_input_data(cls, data: InputData) -> 'SiteEvaluator':
+        return cls(data.development_area_m, data.external_points)
+
+    def check_buildings(
+            self,
+            buildings: np.ndarray,
+            chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Размещение сооружений в допустимой области: сооружение должно лежать внутри области, касание границы
+        допускается.
+
+        :param buildings: сооружения в глобальных координатах
+        :param chunk_size: наибольшее количество пар сооружение-отрезок, обрабатываемых за один проход
+        :return Tuple[np.ndarray, np.ndarray]: маска сооружений внутри области формы (n,),
+            расстояния от сооружений до границы области формы (n,), у пересекающих границу -- 0
+        """
+        contained = np.zeros(len(buildings), dtype=bool)
+        distances = np.full(len(buildings), np.inf)
+        if not len(self.segments):
+            return contained, distances
+        for start, stop in _iter_chunks(len(buildings), len(self.segments), chunk_size):
+            contained[start:stop], distances[start:stop] = self._check_chunk(buildings[start:stop])
+        return contained, distances
+
+    def get_external_point_mask(self, building_types: List[Collection[UUID]]) -> np.ndarray:
+        """
+        Маска внешних точек, тип которых совпадает с одним из типов сооружения.
+
+        :param building_types: типы сооружений, например из `get_building_connection_types`
+        :return np.ndarray: маска формы (n, e)
+        """
+        return np.array(
+            [[type_id in types for type_id in self.external_point_type_ids] for types in building_types], dtype=bool
+        ).reshape(-1, len(self.external_point_type_ids))
+
+    def calculate_external_point_distances(
+            self,
+            buildings: np.ndarray,
+            external_point_mask: np.ndarray,
+            chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Расстояния от сооружений до ближайших подходящих им внешних точек.
+
+        :param buildings: сооружения в глобальных координатах
+        :param external_point_mask: маска подходящих внешних точек формы (n, e), см. `get_external_point_mask`
+        :param chunk_size: наибольшее количество пар сооружение-точка, обрабатываемых за один проход
+        :return Tuple[np.ndarray, np.ndarray]: расстояния формы (n,), индексы ближайших внешних точек формы (n,);
+            для сооружений без подходящих точек -- бесконечность и -1
+        """
+        distances = np.full(len(buildings), np.inf)
+        indices = np.full(len(buildings), -1, dtype=np.int64)
+        if not len(self.external_point_coordinates):
+            return distances, indices
+        for start, stop in _iter_chunks(len(buildings), len(self.external_point_coordinates), chunk_size):
+            chunk = buildings[start:stop]
+            x, y = _to_local(chunk, *self.external_point_coordinates.T[:, None, :])
+            half_width, half_length, radius = _eval_box(chunk)
+            chunk_distances = np.maximum(_calculate_point_to_box_distance(x, y, half_width, half_length) - radius, 0.)
+            chunk_distances = np.where(external_point_mask[start:stop], chunk_distances, np.inf)
+            chunk_indices = np.argmin(chunk_distances, axis=1)
+            distances[start:stop] = chunk_distances[np.arange(len(chunk)), chunk_indices]
+            indices[start:stop] = np.where(np.isinf(distances[start:stop]), -1, chunk_indices)
+        return distances, indices
+
+    def _check_chunk(self, buildings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        segment_first_x, segment_first_y, segment_second_x, segment_second_y = self.segments.T[:, None, :]
+        first_x, first_y = _to_local(buildings, segment_first_x, segment_first_y)
+        second_x, second_y = _to_local(buildings, segment_second_x, segment_second_y)
+        half_width, half_length, radius = _eval_box(buildings)
+
+        # расстояние от отрезка до прямоугольника сооружения: 0 при пересечении, иначе -- наименьшее из расстояний
+        # от концов отрезка до прямоугольника и от вершин прямоугольника до отрезка
+        normal_x, normal_y = first_y - second_y, second_x - first_x
+        normal_length = np.hypot(normal_x, normal_y)
+        normal_x, normal_y = normal_x / normal_length, normal_y / normal_length
+        # проекции прямоугольника и отрезка на нормаль отрезка
+        box_projection = half_length * np.abs(normal_x) + half_width * np.abs(normal_y)
+        segment_projection = np.abs(first_x * normal_x + first_y * normal_y)
+        min_x, max_x = np.minimum(first_x, second_x), np.maximum(first_x, second_x)
+        min_y, max_y = np.minimum(first_y, second_y), np.maximum(first_y, second_y)
+        intersects = (
+            (min_x <= half_length) & (max_x >= -half_length) & (min_y <= half_width) & (max_y >= -half_width)
+            & (segment_projection <= box_projection)
+        )
+        distances = np.minimum(
+            _calculate_point_to_box_distance(first_x, first_y, half_width, half_length),
+            _calculate_point_to_box_distance(second_x, second_y, half_width, half_length)
+        )
+        for length_sign, width_sign in product((-1., 1.), (-1., 1.)):
+            distances = np.minimum(distances, _calculate_point_to_segment_distance(
+                length_sign * half_length, width_sign * half_width, first_x, first_y, second_x, second_y
+            ))
+        distances = np.where(intersects, 0., distances)
+
+        # граница заходит внутрь сооружения: у прямоугольника проекции пересекаются с ненулевой длиной на всех осях,
+        # у круга расстояние от центра до отрезка меньше радиуса
+        enters = np.where(
+            radius > 0,
+            distances < radius - AREA_TOLERANCE_M,
+            (min_x < half_length - AREA_TOLERANCE_M) & (max_x > AREA_TOLERANCE_M - half_length)
+            & (min_y < half_width - AREA_TOLERANCE_M) & (max_y > AREA_TOLERANCE_M - half_width)
+            & (segment_projection < box_projection - AREA_TOLERANCE_M)
+        )
+        # если граница не заходит внутрь сооружения, оно целиком лежит внутри или снаружи области,
+        # что определяется по центру: количество пересечений луча от центра вдоль оси X с границей нечетно
+        center_y = buildings[:, Y, None]
+        crosses = (segment_first_y > center_y) != (segment_second_y > center_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_x = segment_first_x + (center_y - segment_first_y) * (
+                (segment_second_x - segment_first_x) / (segment_second_y - segment_first_y)
+            )
+        inside = np.count_nonzero(crosses & (buildings[:, X, None] < crossing_x), axis=1) % 2 == 1
+        return inside & ~enters.any(axis=1), np.maximum(distances.min(axis=1) - radius[:, 0], 0.)
+
+
+def _iter_chunks(row_count: int, column_count: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    rows = max(1, chunk_size // max(1, column_count))
+    for start in range(0, row_count, rows):
+        yield start, min(start + rows, row_count)
+
+
+def _to_local(buildings: np.ndarray, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Координаты точек в осях сооружений, ось длины повернута по часовой стрелке: (cos, -sin), ширины: (sin, cos)."""
+    cos, sin = eval_rotation(buildings)
+    delta_x = x - buildings[:, X, None]
+    delta_y = y - buildings[:, Y, None]
+    return delta_x * cos[:, None] - delta_y * sin[:, None], delta_x * sin[:, None] + delta_y * cos[:, None]
+
+
+def _eval_box(buildings: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Половины ширины и длины прямоугольников сооружений и радиусы кругов; прямоугольник круга вырожден в центр."""
+    circle = is_circle(buildings)[:, None]
+    half_width = np.where(circle, 0., buildings[:, WIDTH, None] / 2)
+    half_length = np.where(circle, 0., buildings[:, LENGTH, None] / 2)
+    return half_width, half_length, np.where(circle, buildings[:, LENGTH, None] / 2, 0.)
+
+
+def _calculate_point_to_box_distance(
+        x: np.ndarray,
+        y: np.ndarray,
+        half_width: np.ndarray,
+        half_length: np.ndarray
+) -> np.ndarray:
+    gap_x = np.maximum(np.abs(x) - half_length, 0.)
+    gap_y = np.maximum(np.abs(y) - half_width, 0.)
+    return np.hypot(gap_x, gap_y)
+
+
+def _calculate_point_to_segment_distance(
+        x: np.ndarray,
+        y: np.ndarray,
+        first_x: np.ndarray,
+        first_y: np.ndarray,
+        second_x: np.ndarray,
+        second_y: np.ndarray
+) -> np.ndarray:
+    delta_x, delta_y = second_x - first_x, second_y - first_y
+    t = np.clip(((x - first_x) * delta_x + (y - first_y) * delta_y) / (delta_x ** 2 + delta_y ** 2), 0., 1.)
+    return np.hypot(first_x + t * delta_x - x, first_y + t * delta_y - y)
@@ -0,0 +1,167 @@
+from typing import Dict
+from typing import List
+from uuid import UUID
+
+import numpy as np
+
+from .distance import eval_rotation
+from .distance import get_building_array
+from .internal import X
+from .internal import Y
+from .internal import Cluster
+from .internal import ClusterArray
+from .internal import ClusterPosition
+from .internal import ClusterShift
+from .internal import ConnectionPointWrapper
+from .internal import ConnectionWrapper
+from .model import BuildingConnection
+from .model import ConnectionType
+
+
+def get_connection_wrappers(
+        building_connections: List[BuildingConnection],
+        connection_types: List[ConnectionType]
+) -> List[ConnectionWrapper]:
+    """Соединения сооружений с удельной стоимостью прокладки из их типов."""
+    costs = {connection_type.id: connection_type.cost for connection_type in connection_types}
+    return [
+        ConnectionWrapper(
+            id=connection.id,
+            first_connection_point_id=connection.source_connection_point_id,
+            second_connection_point_id=connection.target_connection_point_id,
+            connection_cost=costs[connection.connection_type_id]
+        )
+        for connection in building_connections
+    ]
+
+
+class ConnectionCostEvaluator:
+    """Стоимость соединений сооружений при заданных положениях кластеров, обновляемая по сдвигам кластеров.
+
+    Соединения один раз переводятся в массивы индексов: каждой точке подключения сопоставляются сооружение и кластер,
+    а её координаты относительно положения кластера считаются с учетом поворота сооружения. Стоимость соединения --
+    длина отрезка между точками подключения, умноженная на `ConnectionWrapper.connection_cost`.
+
+    После сдвига пересчитываются только соединения между разными кластерами, хотя бы один из которых сдвинут,
+    поэтому стоимость шага пропорциональна количеству соединений сдвинутых кластеров.
+
+    Attributes:
+        :clusters (List[Cluster]): кластеры.
+        :positions (List[ClusterPosition]): текущие положения кластеров в том же порядке.
+        :connection_ids (List[UUID]): id соединений.
+        :connection_costs (np.ndarray): удельные стоимости соединений формы (k,).
+        :point_clusters (np.ndarray): индексы кластеров точек подключения формы (p,).
+        :point_buildings (np.ndarray): индексы сооружений точек подключения в своих кластерах формы (p,).
+        :costs (np.ndarray): стоимости соединений в текущем положении формы (k,).
+
+    """
+
+    def __init__(
+            self,
+            clusters: List[Cluster],
+            cluster_positions: List[ClusterPosition],
+            connections: List[ConnectionWrapper]
+    ):
+        self.clusters = clusters
+        self.positions = [ClusterPosition(cluster_id=p.cluster_id, x=p.x, y=p.y) for p in cluster_positions]
+        self._cluster_indices: Dict[UUID, int] = {cluster.cluster_id: idx for idx, cluster in enumerate(clusters)}
+
+        point_indices: Dict[UUID, int] = {}
+        point_clusters, point_buildings, local_points = [], [], []
+        for cluster_idx, cluster in enumerate(clusters):
+            buildings = get_building_array(cluster, ClusterPosition(cluster_id=cluster.cluster_id, x=0., y=0.))
+            cos, sin = eval_rotation(buildings)
+            for building_idx, points in enumerate(_get_connection_points(cluster)):
+                for point in points:
+                    point_indices[point.id] = len(point_indices)
+                    point_clusters.append(cluster_idx)
+                    point_buildings.append(building_idx)
+                    # поворот по часовой стрелке относительно центра сооружения
+                    x, y = point.local_position.x, point.local_position.y
+                    local_points.append((
+                        buildings[building_idx, X] + x * cos[building_idx] + y * sin[building_idx],
+                        buildings[building_idx, Y] - x * sin[building_idx] + y * cos[building_idx]
+                    ))
+        self.point_clusters = np.array(point_clusters, dtype=np.int64)
+        self.point_buildings = np.array(point_buildings, dtype=np.int64)
+        self._local_points = np.array(local_points, dtype=np.float64).reshape(-1, 2)
+
+        self.connection_ids = [connection.id for connection in connections]
+        self._first_points = np.array([point_indices[c.first_connection_point_id] for c in connections],
+                                      dtype=np.int64)
+        self._second_points = np.array([point_indices[c.second_connection_point_id] for c in connections],
+                                       dtype=np.int64)
+        self.connection_costs = np.array([c.connection_cost for c in connections], dtype=np.float64)
+
+        # соединения между разными кластерами, сгруппированные по кластерам (по одному разу для каждого конца)
+        first_clusters = self.point_clusters[self._first_points]
+        second_clusters = self.point_clusters[self._second_points]
+        external = np.flatnonzero(first_clusters != second_clusters)
+        connection_clusters = np.concatenate([first_clusters[external], second_clusters[external]])
+        order = np.argsort(connection_clusters, kind='stable')
+        self._cluster_connections = np.concatenate([external, external])[order]
+        self._cluster_connection_offsets = np.searchsorted(connection_clusters[order], np.arange(len(clusters) + 1))
+
+        self.costs = self.calculate_costs(self._get_position_array())
+        self._total_cost = float(self.costs.sum())
+
+    @property
+    def total_cost(self) -> float:
+        """Суммарная стоимость соединений в текущем положении."""
+        return self._total_cost
+
+    def calculate_costs(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Стоимости соединений при заданных положениях кластеров за один векторизованный проход.
+
+        :param positions: положения кластеров формы (N, 2) или набор вариантов положений формы (..., N, 2)
+        :return np.ndarray: стоимости соединений формы (k,) или (..., k)
+        """
+        return self._calculate_costs(positions, slice(None))
+
+    def calculate_total_cost(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Суммарная стоимость соединений при заданных положениях кластеров.
+
+        :param positions: положения кластеров формы (N, 2) или набор вариантов положений формы (..., N, 2)
+        :return np.ndarray: суммарные стоимости формы () или (...)
+        """
+        return self.calculate_costs(positions).sum(axis=-1)
+
+    def apply_shifts(self, shifts: List[ClusterShift]) -> None:
+        """Сдвигает кластеры и пересчитывает стоимости соединений сдвинутых кластеров."""
+        moved = []
+        for shift in shifts:
+            idx = self._cluster_indices[shift.cluster_id]
+            self.positions[idx].x += shift.dx
+            self.positions[idx].y += shift.dy
+            if idx not in moved:
+                moved.append(idx)
+        if not moved:
+            return
+
+        offsets = self._cluster_connection_offsets
+        # соединение двух сдвинутых кластеров пересчитывается один раз
+        affected = np.unique(np.concatenate(
+            [self._cluster_connections[offsets[idx]:offsets[idx + 1]] for idx in moved]
+        ))
+        costs = self._calculate_costs(self._get_position_array(), affected)
+        self._total_cost += float(costs.sum() - self.costs[affected].sum())
+        self.costs[affected] = costs
+
+    def _calculate_costs(self, positions: np.ndarray, connections) -> np.ndarray:
+        first = self._first_points[connections]
+        second = self._second_points[connections]
+        deltas = (self._local_points[first] + positions[..., self.point_clusters[first], :] -
+                  self._local_points[second] - positions[..., self.point_clusters[second], :])
+        return self.connection_costs[connections] * np.hypot(deltas[..., 0], deltas[..., 1])
+
+    def _get_position_array(self) -> np.ndarray:
+        return np.array([(p.x, p.y) for p in self.positions], dtype=np.float64).reshape(-1, 2)
+
+
+def _get_connection_points(cluster: Cluster) -> List[List[ConnectionPointWrapper]]:
+    """Точки подключения сооружений кластера в порядке сооружений."""
+    if isinstance(cluster, ClusterArray):
+        return cluster.connection_points or [[] for _ in cluster.building_ids]
+    return [building.connection_points for building in cluster.buildings]
@@ -1,15 +1,40 @@
 from itertools import product
 from math import sqrt
 from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
 from typing import Tuple
+from typing import Union
 from uuid import UUID
 
 import numpy as np
 
+from .internal import ANGLE
+from .internal import BUILDING_ARRAY_COLUMNS
+from .internal import LENGTH
+from .internal import WIDTH
+from .internal import X
+from .internal import Y
+from .internal import Cluster
+from .internal import ClusterArray
 from .internal import ClusterPosition
 from .internal import ClusterShape
+from .internal import get_figure_sizes
+from .model import Circle
 from .model import Position
 from .model import Rectangle
+from .offsets import OFFSET_TABLE_TYPES
+from .offsets import BuildingOffsetRules
+
+# максимальное количество элементов в одном блоке матрицы расстояний,
+# ограничивает потребление памяти при расчете больших кластеров
+DEFAULT_CHUNK_SIZE = 1 << 22
+# максимальное количество элементов в одном блоке при проверке расстояния на пороговое значение,
+# меньший блок позволяет раньше прекратить проверку
+DEFAULT_PREDICATE_CHUNK_SIZE = 1 << 14
+# допуск, с которым угол поворота считается кратным 90 градусам
+AXIS_ALIGNED_TOLERANCE_DEG = 1e-5
 
 
 def calculate_normalized_distance_between_two_clusters(
@@ -109,11 +134,15 @@ def calculate_distance_between_two_clusters(
 
 
 def calculate_distance_between_two_buildings(
-        first_building_figure: Rectangle,
-        second_building_figure: Rectangle,
+        first_building_figure: Union[Circle, Rectangle],
+        second_building_figure: Union[Circle, Rectangle],
         first_building_position: Position,
         second_building_position: Position
 ) -> float:
+    if isinstance(first_building_figure, Circle) or isinstance(second_building_figure, Circle):
+        return _calculate_distance_with_circle(
+            first_building_figure, second_building_figure, first_building_position, second_building_position
+        )
     delta_x = abs(first_building_position.offset_x_m - second_building_position.offset_x_m)
     delta_y = abs(first_building_position.offset_y_m - second_building_position.offset_y_m)
     total_half_width, total_half_length = _eval_half_total_width_and_half_total_length(
@@ -133,6 +162,53 @@ def calculate_distance_between_two_buildings(
         return -1.
 
 
+def calculate_distance_between_two_oriented_buildings(
+        first_building_figure: Union[Circle, Rectangle],
+        second_building_figure: Union[Circle, Rectangle],
+        first_building_position: Position,
+        second_building_position: Position
+) -> float:
+    """
+    Аналог `calculate_distance_between_two_buildings` для произвольных углов поворота
+    (см. `calculate_oriented_distance_matrix`).
+    """
+    buildings = np.array([
+        (position.offset_x_m, position.offset_y_m, position.angle_deg, *get_figure_sizes(figure))
+        for figure, position in ((first_building_figure, first_building_position),
+                                 (second_building_figure, second_building_position))
+    ], dtype=np.float64)
+    return float(calculate_oriented_distance_matrix(buildings[:1], buildings[1:])[0, 0])
+
+
+def _calculate_distance_with_circle(
+        first_building_figure: Union[Circle, Rectangle],
+        second_building_figure: Union[Circle, Rectangle],
+        first_building_position: Position,
+        second_building_position: Position
+) -> float:
+    """
+    Расстояние между сооружениями, хотя бы одно из которых -- круг: расстояние от центра круга до прямоугольника
+    (или до центра второго круга) за вычетом радиусов. Для пересекающихся сооружений равно -1.
+    """
+    delta_x = abs(first_building_position.offset_x_m - second_building_position.offset_x_m)
+    delta_y = abs(first_building_position.offset_y_m - second_building_position.offset_y_m)
+    total_radius = 0.
+    for figure, position in ((first_building_figure, first_building_position),
+                             (second_building_figure, second_building_position)):
+        if isinstance(figure, Circle):
+            total_radius += figure.radius_m
+        else:
+            half_width, half_length = figure.width_m / 2, figure.length_m / 2
+            # если угол поворота здания составляет 90 или 270 градусов
+            # то длина является шириной, а ширина -- длиной
+            if abs(position.angle_deg % 180 - 90) < 1e-5:
+                half_width, half_length = half_length, half_width
+            delta_x = max(delta_x - half_length, 0.)
+            delta_y = max(delta_y - half_width, 0.)
+    distance = sqrt(delta_x ** 2 + delta_y ** 2) - total_radius
+    return -1. if distance < 0 else distance
+
+
 def _get_global_position_for_building(
         local_position: Position,
         cluster_position: ClusterPosition
@@ -166,3 +242,623 @@ def _eval_half_total_width_and_half_total_length(
         second_length, second_width = second_width, second_length
 
     return first_width + second_width, first_length + second_length
+
+
+def calculate_normalized_distance_between_two_clusters_vectorized(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition,
+        building_offset_rules: BuildingOffsetRules
+) -> Tuple[float, float]:
+    """
+    Векторизованный аналог `calculate_normalized_distance_between_two_clusters`.
+
+    :return Tuple[float, float]: безразмерное расстояние, значение оффсета
+    """
+    distance, offset, _ = calculate_min_normalized_distance(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position),
+        get_offset_matrix(first_cluster, second_cluster, building_offset_rules)
+    )
+    return distance, offset
+
+
+def calculate_distance_between_two_clusters_vectorized(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition
+) -> float:
+    """Векторизованный аналог `calculate_distance_between_two_clusters`."""
+    distance, _ = calculate_min_distance(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position)
+    )
+    return distance
+
+
+def calculate_oriented_distance_between_two_clusters_vectorized(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition
+) -> float:
+    """Аналог `calculate_distance_between_two_clusters_vectorized` для произвольных углов поворота сооружений."""
+    distance, _ = calculate_min_distance(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position),
+        oriented=True
+    )
+    return distance
+
+
+def calculate_distance_matrix_between_clusters(
+        clusters: List[Cluster],
+        cluster_positions: List[ClusterPosition]
+) -> np.ndarray:
+    """
+    Матрица минимальных расстояний между всеми парами кластеров, на диагонали -- бесконечность.
+
+    :return np.ndarray: матрица формы (N, N)
+    """
+    buildings = [get_building_array(cluster, position) for cluster, position in zip(clusters, cluster_positions)]
+    distances = np.full((len(clusters), len(clusters)), np.inf)
+    for i, j in zip(*np.triu_indices(len(clusters), k=1)):
+        distances[i, j] = distances[j, i] = calculate_min_distance(buildings[i], buildings[j])[0]
+    return distances
+
+
+def calculate_normalized_distance_matrix_between_clusters(
+        clusters: List[Cluster],
+        cluster_positions: List[ClusterPosition],
+        building_offset_rules: BuildingOffsetRules
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Матрицы минимальных безразмерных расстояний и соответствующих оффсетов между всеми парами кластеров.
+
+    Правила оффсетов считаются симметричными, значение для пары (i, j) вычисляется с i-м кластером в роли первого.
+    На диагонали -- бесконечность и нулевой оффсет.
+
+    :return Tuple[np.ndarray, np.ndarray]: матрицы расстояний и оффсетов формы (N, N)
+    """
+    buildings = [get_building_array(cluster, position) for cluster, position in zip(clusters, cluster_positions)]
+    distances = np.full((len(clusters), len(clusters)), np.inf)
+    offsets = np.zeros((len(clusters), len(clusters)))
+    for i, j in zip(*np.triu_indices(len(clusters), k=1)):
+        distance, offset, _ = calculate_min_normalized_distance(
+            buildings[i], buildings[j], get_offset_matrix(clusters[i], clusters[j], building_offset_rules))
+        distances[i, j] = distances[j, i] = distance
+        offsets[i, j] = offsets[j, i] = offset
+    return distances, offsets
+
+
+def get_building_array(
+        cluster: Cluster,
+        cluster_position: ClusterPosition
+) -> np.ndarray:
+    """
+    Массив сооружений кластера в глобальных координатах.
+
+    :return np.ndarray: массив формы (n, 5) со столбцами `X`, `Y`, `ANGLE`, `WIDTH`, `LENGTH`
+    """
+    if isinstance(cluster, ClusterArray):
+        return cluster.get_global_buildings(cluster_position)
+    buildings = np.array(
+        [
+            (
+                building.local_position.offset_x_m,
+                building.local_position.offset_y_m,
+                building.local_position.angle_deg,
+                *get_figure_sizes(building.figure)
+            )
+            for building in cluster.buildings
+        ],
+        dtype=np.float64
+    ).reshape(-1, BUILDING_ARRAY_COLUMNS)
+    buildings[:, X] += cluster_position.x
+    buildings[:, Y] += cluster_position.y
+    return buildings
+
+
+def get_offset_matrix(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        building_offset_rules: BuildingOffsetRules
+) -> np.ndarray:
+    """
+    Матрица оффсетов между сооружениями двух кластеров.
+
+    :return np.ndarray: матрица формы (n, m)
+    """
+    if isinstance(building_offset_rules, OFFSET_TABLE_TYPES):
+        return building_offset_rules.get_offset_matrix(
+            building_offset_rules.get_indices(first_cluster.building_ids),
+            building_offset_rules.get_indices(second_cluster.building_ids)
+        )
+    second_building_ids = second_cluster.building_ids
+    return np.array(
+        [
+            [building_offset_rules[(first_building_id, second_building_id)]
+             for second_building_id in second_building_ids]
+            for first_building_id in first_cluster.building_ids
+        ],
+        dtype=np.float64
+    ).reshape(len(first_cluster.buildings), len(second_cluster.buildings))
+
+
+def calculate_distance_matrix(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray
+) -> np.ndarray:
+    """
+    Матрица расстояний между всеми парами сооружений двух массивов (см. `get_building_array`).
+
+    Для пересекающихся сооружений значение равно -1, как и в `calculate_distance_between_two_buildings`.
+
+    :return np.ndarray: матрица формы (n, m)
+    """
+    first_half_width, first_half_length = eval_half_width_and_half_length(first_buildings)
+    second_half_width, second_half_length = eval_half_width_and_half_length(second_buildings)
+    first_radius, second_radius = _eval_radii(first_buildings, second_buildings)
+    return _calculate_distance_block(
+        first_buildings[:, X], first_buildings[:, Y], first_half_width, first_half_length,
+        second_buildings[:, X], second_buildings[:, Y], second_half_width, second_half_length,
+        first_radius, second_radius
+    )
+
+
+def calculate_paired_distances(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray
+) -> np.ndarray:
+    """
+    Расстояния между сооружениями двух массивов одинаковой длины с одинаковыми индексами,
+    та же формула, что и в `calculate_distance_matrix`.
+
+    :return np.ndarray: массив формы (n,)
+    """
+    first_half_width, first_half_length = eval_half_width_and_half_length(first_buildings)
+    second_half_width, second_half_length = eval_half_width_and_half_length(second_buildings)
+    first_radius, second_radius = _eval_radii(first_buildings, second_buildings)
+    return _calculate_distance(
+        np.abs(first_buildings[:, X] - second_buildings[:, X]),
+        np.abs(first_buildings[:, Y] - second_buildings[:, Y]),
+        first_half_width + second_half_width,
+        first_half_length + second_half_length,
+        None if first_radius is None else first_radius + second_radius
+    )
+
+
+def calculate_oriented_distance_matrix(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray
+) -> np.ndarray:
+    """
+    Матрица расстояний между всеми парами сооружений двух массивов с произвольными углами поворота.
+
+    В отличие от `calculate_distance_matrix`, где углы, не кратные 90 градусам, считаются нулевыми, сооружение
+    поворачивается вокруг центра по часовой стрелке на свой угол. Пересечение определяется по теореме
+    о разделяющей оси, для непересекающихся прямоугольников расстояние равно наименьшему из расстояний
+    от вершин одного прямоугольника до другого. Пары, в которых углы обоих сооружений кратны 90 градусам,
+    считаются по формуле `calculate_distance_matrix`. Для пересекающихся сооружений значение равно -1.
+
+    :return np.ndarray: матрица формы (n, m)
+    """
+    first_aligned = is_axis_aligned(first_buildings)
+    second_aligned = is_axis_aligned(second_buildings)
+    if first_aligned.all() and second_aligned.all():
+        return calculate_distance_matrix(first_buildings, second_buildings)
+
+    distances = _calculate_oriented_distance_block(first_buildings, second_buildings)
+    if first_aligned.any() and second_aligned.any():
+        aligned = np.ix_(first_aligned, second_aligned)
+        distances[aligned] = calculate_distance_matrix(first_buildings[first_aligned],
+                                                       second_buildings[second_aligned])
+    return distances
+
+
+def calculate_min_distance(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        oriented: bool = False
+) -> Tuple[float, Tuple[int, int]]:
+    """
+    Минимальное расстояние между сооружениями двух массивов без построения полной матрицы расстояний.
+
+    Матрица считается блоками не более чем по `chunk_size` элементов. При `oriented` допускаются произвольные углы
+    поворота (см. `calculate_oriented_distance_matrix`).
+
+    :return Tuple[float, Tuple[int, int]]: расстояние, индексы пары сооружений
+    """
+    min_distance = np.inf
+    min_index = (-1, -1)
+    for start, distances in _iter_distance_blocks(first_buildings, second_buildings, chunk_size, oriented):
+        first_idx, second_idx = np.unravel_index(np.argmin(distances), distances.shape)
+        if distances[first_idx, second_idx] < min_distance:
+            min_distance = float(distances[first_idx, second_idx])
+            min_index = (start + int(first_idx), int(second_idx))
+    if min_index == (-1, -1):
+        raise ValueError('clusters must not be empty')
+    return min_distance, min_index
+
+
+def calculate_min_normalized_distance(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        offsets: np.ndarray,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Tuple[float, float, Tuple[int, int]]:
+    """
+    Минимальное расстояние между сооружениями двух массивов, разделённое на соответствующий оффсет.
+
+    :param offsets: матрица оффсетов формы (n, m)
+    :return Tuple[float, float, Tuple[int, int]]: безразмерное расстояние, значение оффсета, индексы пары сооружений
+    """
+    min_distance = np.inf
+    min_offset = 0.
+    min_index = (-1, -1)
+    for start, distances in _iter_distance_blocks(first_buildings, second_buildings, chunk_size):
+        block_offsets = offsets[start:start + len(distances)]
+        distances /= block_offsets
+        first_idx, second_idx = np.unravel_index(np.argmin(distances), distances.shape)
+        if distances[first_idx, second_idx] < min_distance:
+            min_distance = float(distances[first_idx, second_idx])
+            min_offset = float(block_offsets[first_idx, second_idx])
+            min_index = (start + int(first_idx), int(second_idx))
+    if min_index == (-1, -1):
+        raise ValueError('clusters must not be empty')
+    return min_distance, min_offset, min_index
+
+
+def is_distance_between_two_clusters_less_than(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition,
+        threshold: float
+) -> bool:
+    """Есть ли пара сооружений двух кластеров, расстояние между которыми меньше `threshold`."""
+    return is_min_distance_less_than(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position),
+        threshold
+    )
+
+
+def is_normalized_distance_between_two_clusters_less_than(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition,
+        threshold: float,
+        building_offset_rules: BuildingOffsetRules
+) -> bool:
+    """
+    Есть ли пара сооружений двух кластеров, расстояние между которыми, разделённое на оффсет, меньше `threshold`.
+    При `threshold` = 1 -- нарушают ли кластеры оффсеты.
+    """
+    return is_min_distance_less_than(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position),
+        threshold,
+        get_offset_matrix(first_cluster, second_cluster, building_offset_rules)
+    )
+
+
+def find_cluster_pairs_closer_than(
+        clusters: List[Cluster],
+        cluster_positions: List[ClusterPosition],
+        cluster_pairs: np.ndarray,
+        threshold: float,
+        building_offset_rules: Optional[BuildingOffsetRules] = None
+) -> np.ndarray:
+    """
+    Маска пар кластеров, между которыми есть пара сооружений с расстоянием (безразмерным, если заданы правила
+    оффсетов) меньше `threshold`.
+
+    Пары кластеров, габариты которых удалены не меньше чем на `threshold` наибольших оффсетов, отбрасываются
+    без расчета расстояний, для остальных проверка прекращается на первой найденной паре сооружений.
+
+    :param cluster_pairs: индексы пар кластеров формы (k, 2)
+    :return np.ndarray: булев массив формы (k,)
+    """
+    # импорт здесь, тк `force.search` сам зависит от этого модуля
+    from .search import get_global_bounds
+    from .search import get_max_offsets
+    from .spatial import LOWER_BOUND_TOLERANCE
+    from .spatial import calculate_bounds_lower_bound
+
+    cluster_pairs = np.asarray(cluster_pairs, dtype=np.int64).reshape(-1, 2)
+    first_max_offsets, second_max_offsets = get_max_offsets(clusters, building_offset_rules)
+    bounds = np.array([get_global_bounds(cluster, position)
+                       for cluster, position in zip(clusters, cluster_positions)]).reshape(-1, 4)
+    first, second = cluster_pairs[:, 0], cluster_pairs[:, 1]
+    gaps = calculate_bounds_lower_bound(bounds[first], bounds[second])
+    max_offsets = np.minimum(first_max_offsets[first], second_max_offsets[second])
+    lower_bounds = np.where(gaps > 0, (gaps - LOWER_BOUND_TOLERANCE) / max_offsets, -np.inf)
+
+    mask = np.zeros(len(cluster_pairs), dtype=bool)
+    buildings: Dict[int, np.ndarray] = {}
+    for pair in np.flatnonzero(lower_bounds < threshold):
+        i, j = int(first[pair]), int(second[pair])
+        for idx in (i, j):
+            if idx not in buildings:
+                buildings[idx] = get_building_array(clusters[idx], cluster_positions[idx])
+        offsets = None
+        if building_offset_rules is not None:
+            offsets = get_offset_matrix(clusters[i], clusters[j], building_offset_rules)
+        mask[pair] = is_min_distance_less_than(buildings[i], buildings[j], threshold, offsets)
+    return mask
+
+
+def is_min_distance_less_than(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        threshold: float,
+        offsets: Optional[np.ndarray] = None,
+        chunk_size: int = DEFAULT_PREDICATE_CHUNK_SIZE
+) -> bool:
+    """
+    Есть ли пара сооружений двух массивов, расстояние между которыми (разделённое на оффсет, если задана матрица
+    `offsets`) меньше `threshold`.
+
+    Сооружения первого массива, габарит которых удалён от габарита второго массива не меньше чем на `threshold`
+    наибольших оффсетов сооружения, отбрасываются. Остальные проверяются по возрастанию этой оценки блоками
+    не более чем по `chunk_size` элементов, проверка прекращается на первом блоке с найденной парой.
+
+    :param offsets: матрица оффсетов формы (n, m)
+    """
+    # импорт здесь, тк `force.spatial` сам зависит от этого модуля
+    from .spatial import LOWER_BOUND_TOLERANCE
+    from .spatial import calculate_bounds_lower_bound
+
+    if not len(first_buildings) or not len(second_buildings):
+        return False
+    second_bounds = get_building_bounds(second_buildings)
+    second_bounds = np.array([second_bounds[:, 0].min(), second_bounds[:, 1].max(),
+                              second_bounds[:, 2].min(), second_bounds[:, 3].max()])
+    gaps = calculate_bounds_lower_bound(get_building_bounds(first_buildings), second_bounds)
+    max_offsets = offsets.max(axis=1) if offsets is not None else 1.
+    lower_bounds = np.where(gaps > 0, (gaps - LOWER_BOUND_TOLERANCE) / max_offsets, -np.inf)
+    order = np.argsort(lower_bounds, kind='stable')
+    order = order[lower_bounds[order] < threshold]
+
+    for start, distances in _iter_distance_blocks(first_buildings[order], second_buildings, chunk_size):
+        if offsets is not None:
+            rows = order[start:start + len(distances)]
+            distances /= offsets[rows]
+        if (distances < threshold).any():
+            return True
+    return False
+
+
+def _iter_distance_blocks(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        chunk_size: int,
+        oriented: bool = False
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Матрица расстояний по блокам строк: индекс первой строки блока и сам блок.
+    При `oriented` блоки считаются `calculate_oriented_distance_matrix`.
+    """
+    if not len(first_buildings) or not len(second_buildings):
+        return
+    if oriented:
+        rows = max(1, chunk_size // len(second_buildings))
+        for start in range(0, len(first_buildings), rows):
+            yield start, calculate_oriented_distance_matrix(first_buildings[start:start + rows], second_buildings)
+        return
+    first_half_width, first_half_length = eval_half_width_and_half_length(first_buildings)
+    second_half_width, second_half_length = eval_half_width_and_half_length(second_buildings)
+    first_radius, second_radius = _eval_radii(first_buildings, second_buildings)
+    rows = max(1, chunk_size // len(second_buildings))
+    for start in range(0, len(first_buildings), rows):
+        stop = start + rows
+        yield start, _calculate_distance_block(
+            first_buildings[start:stop, X], first_buildings[start:stop, Y],
+            first_half_width[start:stop], first_half_length[start:stop],
+            second_buildings[:, X], second_buildings[:, Y], second_half_width, second_half_length,
+            None if first_radius is None else first_radius[start:stop], second_radius
+        )
+
+
+def _calculate_distance_block(
+        first_x: np.ndarray,
+        first_y: np.ndarray,
+        first_half_width: np.ndarray,
+        first_half_length: np.ndarray,
+        second_x: np.ndarray,
+        second_y: np.ndarray,
+        second_half_width: np.ndarray,
+        second_half_length: np.ndarray,
+        first_radius: Optional[np.ndarray] = None,
+        second_radius: Optional[np.ndarray] = None
+) -> np.ndarray:
+    return _calculate_distance(
+        np.abs(first_x[:, None] - second_x[None, :]),
+        np.abs(first_y[:, None] - second_y[None, :]),
+        first_half_width[:, None] + second_half_width[None, :],
+        first_half_length[:, None] + second_half_length[None, :],
+        None if first_radius is None else first_radius[:, None] + second_radius[None, :]
+    )
+
+
+def _calculate_distance(
+        delta_x: np.ndarray,
+        delta_y: np.ndarray,
+        total_half_width: np.ndarray,
+        total_half_length: np.ndarray,
+        total_radius: Optional[np.ndarray] = None
+) -> np.ndarray:
+    # та же кусочная формула, что и в `calculate_distance_between_two_buildings`
+    gap_x = delta_x - total_half_length
+    gap_y = delta_y - total_half_width
+    outside_x = delta_x >= total_half_length
+    outside_y = delta_y >= total_half_width
+    distances = np.where(
+        outside_x,
+        np.where(outside_y, np.sqrt(gap_x ** 2 + gap_y ** 2), gap_x),
+        np.where(outside_y, gap_y, -1.)
+    )
+    if total_radius is None:
+        return distances
+    # для пар с кругами половины сторон круга равны радиусу: расстояние от центра круга до прямоугольника
+    # без кругов за вычетом суммы радиусов, как в `_calculate_distance_with_circle`
+    circle_gap_x = np.maximum(gap_x + total_radius, 0.)
+    circle_gap_y = np.maximum(gap_y + total_radius, 0.)
+    circle_distances = np.sqrt(circle_gap_x ** 2 + circle_gap_y ** 2) - total_radius
+    return np.where(total_radius > 0, np.where(circle_distances < 0, -1., circle_distances), distances)
+
+
+def _calculate_oriented_distance_block(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray
+) -> np.ndarray:
+    first_cos, first_sin = eval_rotation(first_buildings)
+    second_cos, second_sin = eval_rotation(second_buildings)
+    first_half_length = first_buildings[:, LENGTH, None] / 2
+    first_half_width = np.abs(first_buildings[:, WIDTH, None]) / 2
+    second_half_length = second_buildings[None, :, LENGTH] / 2
+    second_half_width = np.abs(second_buildings[None, :, WIDTH]) / 2
+
+    delta_x = second_buildings[None, :, X] - first_buildings[:, X, None]
+    delta_y = second_buildings[None, :, Y] - first_buildings[:, Y, None]
+    # центр второго сооружения в осях первого и центр первого в осях второго,
+    # ось длины повернута по часовой стрелке: (cos, -sin), ось ширины: (sin, cos)
+    first_local_x = delta_x * first_cos[:, None] - delta_y * first_sin[:, None]
+    first_local_y = delta_x * first_sin[:, None] + delta_y * first_cos[:, None]
+    second_local_x = delta_y * second_sin[None, :] - delta_x * second_cos[None, :]
+    second_local_y = -delta_x * second_sin[None, :] - delta_y * second_cos[None, :]
+    # косинус и синус угла между осями сооружений
+    cos = first_cos[:, None] * second_cos[None, :] + first_sin[:, None] * second_sin[None, :]
+    sin = first_cos[:, None] * second_sin[None, :] - first_sin[:, None] * second_cos[None, :]
+
+    # пересечение: проекции прямоугольников пересекаются на всех четырёх осях
+    overlap = (
+        (np.abs(first_local_x) < first_half_length + second_half_length * np.abs(cos)
+         + second_half_width * np.abs(sin))
+        & (np.abs(first_local_y) < first_half_width + second_half_length * np.abs(sin)
+           + second_half_width * np.abs(cos))
+        & (np.abs(second_local_x) < second_half_length + first_half_length * np.abs(cos)
+           + first_half_width * np.abs(sin))
+        & (np.abs(second_local_y) < second_half_width + first_half_length * np.abs(sin)
+           + first_half_width * np.abs(cos))
+    )
+
+    distances = np.full(delta_x.shape, np.inf)
+    for length_sign, width_sign in product((-1., 1.), (-1., 1.)):
+        # вершина второго сооружения в осях первого
+        distances = np.minimum(distances, _calculate_point_to_box_distance(
+            first_local_x + length_sign * second_half_length * cos + width_sign * second_half_width * sin,
+            first_local_y - length_sign * second_half_length * sin + width_sign * second_half_width * cos,
+            first_half_width, first_half_length
+        ))
+        # вершина первого сооружения в осях второго
+        distances = np.minimum(distances, _calculate_point_to_box_distance(
+            second_local_x + length_sign * first_half_length * cos - width_sign * first_half_width * sin,
+            second_local_y + length_sign * first_half_length * sin + width_sign * first_half_width * cos,
+            second_half_width, second_half_length
+        ))
+    distances = np.where(overlap, -1., distances)
+
+    first_circle = is_circle(first_buildings)[:, None]
+    second_circle = is_circle(second_buildings)[None, :]
+    if not first_circle.any() and not second_circle.any():
+        return distances
+    # круг и повернутый прямоугольник: расстояние от центра круга в осях прямоугольника за вычетом радиуса,
+    # пары из двух кругов считаются в `calculate_oriented_distance_matrix` по формуле для углов, кратных 90 градусам
+    circle_distances = np.where(
+        second_circle,
+        _calculate_point_to_box_distance(first_local_x, first_local_y, first_half_width, first_half_length)
+        - second_half_length,
+        _calculate_point_to_box_distance(second_local_x, second_local_y, second_half_width, second_half_length)
+        - first_half_length
+    )
+    circle_distances = np.where(circle_distances < 0, -1., circle_distances)
+    return np.where(first_circle | second_circle, circle_distances, distances)
+
+
+def _calculate_point_to_box_distance(
+        x: np.ndarray,
+        y: np.ndarray,
+        half_width: np.ndarray,
+        half_length: np.ndarray
+) -> np.ndarray:
+    """Расстояние от точки до прямоугольника с центром в начале координат и сторонами вдоль осей."""
+    gap_x = np.maximum(np.abs(x) - half_length, 0.)
+    gap_y = np.maximum(np.abs(y) - half_width, 0.)
+    return np.sqrt(gap_x ** 2 + gap_y ** 2)
+
+
+def is_axis_aligned(buildings: np.ndarray) -> np.ndarray:
+    """Маска сооружений массива, угол поворота которых кратен 90 градусам, и кругов, не зависящих от поворота."""
+    return _is_angle_axis_aligned(buildings[:, ANGLE]) | is_circle(buildings)
+
+
+def _is_angle_axis_aligned(angles: np.ndarray) -> np.ndarray:
+    """Маска углов поворота, кратных 90 градусам."""
+    remainder = angles % 90
+    return np.minimum(remainder, 90 - remainder) < AXIS_ALIGNED_TOLERANCE_DEG
+
+
+def is_circle(buildings: np.ndarray) -> np.ndarray:
+    """Маска кругов массива сооружений."""
+    return buildings[:, WIDTH] < 0
+
+
+def _eval_radii(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray
+) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """Радиусы сооружений двух массивов, у прямоугольников -- 0; если кругов нет, радиусы не нужны."""
+    first_circle, second_circle = is_circle(first_buildings), is_circle(second_buildings)
+    if not first_circle.any() and not second_circle.any():
+        return None, None
+    return (np.where(first_circle, first_buildings[:, LENGTH] / 2, 0.),
+            np.where(second_circle, second_buildings[:, LENGTH] / 2, 0.))
+
+
+def eval_rotation(buildings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Косинусы и синусы углов поворота сооружений массива, для углов, кратных 90 градусам, -- точные значения.
+
+    :return Tuple[np.ndarray, np.ndarray]: косинусы, синусы
+    """
+    angles = np.radians(buildings[:, ANGLE])
+    cos, sin = np.cos(angles), np.sin(angles)
+    # круги считаются выровненными при любом угле, поэтому проверяется сам угол
+    aligned = _is_angle_axis_aligned(buildings[:, ANGLE])
+    return np.where(aligned, np.round(cos), cos), np.where(aligned, np.round(sin), sin)
+
+
+def get_building_bounds(buildings: np.ndarray) -> np.ndarray:
+    """
+    Габариты сооружений массива.
+
+    :return np.ndarray: массив формы (n, 4) со столбцами min_x, max_x, min_y, max_y
+    """
+    half_width, half_length = eval_half_width_and_half_length(buildings)
+    return np.stack([
+        buildings[:, X] - half_length,
+        buildings[:, X] + half_length,
+        buildings[:, Y] - half_width,
+        buildings[:, Y] + half_width,
+    ], axis=1)
+
+
+def eval_half_width_and_half_length(buildings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Половины ширины и длины сооружений массива с учётом поворота.
+
+    :return Tuple[np.ndarray, np.ndarray]: половины ширины (по оси Y), половины длины (по оси X)
+    """
+    half_length = buildings[:, LENGTH] / 2
+    # у круга ширина отрицательная, половины сторон габарита равны радиусу
+    half_width = np.abs(buildings[:, WIDTH]) / 2
+    # если угол поворота здания составляет 90 или 270 градусов
+    # то длина является шириной, а ширина -- длиной
+    rotated = np.abs(buildings[:, ANGLE] % 180 - 90) < 1e-5
+    return np.where(rotated, half_length, half_width), np.where(rotated, half_width, half_length)
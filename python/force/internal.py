@@ -1,11 +1,36 @@
 from dataclasses import dataclass
+from dataclasses import field
 from typing import List
+from typing import Tuple
+from typing import Union
 from uuid import UUID
 
+import numpy as np
+
+from .model import Circle
 from .model import FunctionalAreaType
 from .model import Position
 from .model import Rectangle
 
+# столбцы массива сооружений, с которым работают векторизованные функции;
+# круг записывается с отрицательной шириной: `WIDTH` -- минус диаметр, `LENGTH` -- диаметр
+X, Y, ANGLE, WIDTH, LENGTH = range(5)
+BUILDING_ARRAY_COLUMNS = 5
+
+
+def get_figure_sizes(figure: Union[Circle, Rectangle]) -> Tuple[float, float]:
+    """Значения столбцов `WIDTH` и `LENGTH` массива сооружений для фигуры."""
+    if isinstance(figure, Circle):
+        return -2 * figure.radius_m, 2 * figure.radius_m
+    return figure.width_m, figure.length_m
+
+
+def get_figure(width: float, length: float) -> Union[Circle, Rectangle]:
+    """Фигура по значениям столбцов `WIDTH` и `LENGTH` массива сооружений."""
+    if width < 0:
+        return Circle(radius_m=length / 2)
+    return Rectangle(width_m=width, length_m=length)
+
 
 @dataclass
 class ClusterOffsetRule:
@@ -47,7 +72,7 @@ class ConnectionPointWrapper:
 class BuildingWrapper:
     id: UUID
     label: str
-    figure: Rectangle
+    figure: Union[Circle, Rectangle]
     local_position: Position
     connection_points: List[ConnectionPointWrapper]
 
@@ -59,6 +84,112 @@ class ClusterShape:
     figure: Rectangle
     buildings: List[BuildingWrapper]
 
+    @property
+    def building_ids(self) -> List[UUID]:
+        return [building.id for building in self.buildings]
+
+    @property
+    def local_bounds(self) -> Tuple[float, float, float, float]:
+        """Габарит сооружений кластера в локальных координатах: min_x, max_x, min_y, max_y."""
+        # импорт здесь, тк `force.distance` сам зависит от этого модуля
+        from .distance import get_building_array
+        from .distance import get_building_bounds
+
+        if not self.buildings:
+            return float('inf'), float('-inf'), float('inf'), float('-inf')
+        origin = ClusterPosition(cluster_id=self.cluster_id, x=0., y=0.)
+        bounds = get_building_bounds(get_building_array(self, origin))
+        return bounds[:, 0].min(), bounds[:, 1].max(), bounds[:, 2].min(), bounds[:, 3].max()
+
+
+@dataclass(eq=False)
+class ClusterArray:
+    """Кластер, поля сооружений которого хранятся в массивах (struct of arrays), а не в отдельных объектах.
+
+    Геометрия всех сооружений лежит в одном массиве, глобальные координаты получаются одним сложением
+    с положением кластера. Векторизованные функции расчета расстояний принимают `ClusterArray`
+    наравне с `ClusterShape`.
+
+    Attributes:
+        :cluster_id (UUID): id кластера.
+        :functional_area (FunctionalAreaType): функциональная зона кластера.
+        :figure (Rectangle): фигура кластера.
+        :building_ids (List[UUID]): id сооружений.
+        :buildings (np.ndarray): сооружения в локальных координатах, массив формы (n, 5) со столбцами
+            `X`, `Y`, `ANGLE`, `WIDTH`, `LENGTH`.
+        :labels (List[str]): подписи сооружений.
+        :connection_points (List[List[ConnectionPointWrapper]]): точки подключения сооружений.
+
+    """
+    cluster_id: UUID
+    functional_area: FunctionalAreaType
+    figure: Rectangle
+    building_ids: List[UUID]
+    buildings: np.ndarray
+    labels: List[str] = field(default_factory=list)
+    connection_points: List[List[ConnectionPointWrapper]] = field(default_factory=list)
+
+    @classmethod
+    def from_cluster_shape(cls, cluster: ClusterShape) -> 'ClusterArray':
+        buildings = np.array(
+            [
+                (
+                    building.local_position.offset_x_m,
+                    building.local_position.offset_y_m,
+                    building.local_position.angle_deg,
+                    *get_figure_sizes(building.figure)
+                )
+                for building in cluster.buildings
+            ],
+            dtype=np.float64
+        ).reshape(-1, BUILDING_ARRAY_COLUMNS)
+        return cls(
+            cluster_id=cluster.cluster_id,
+            functional_area=cluster.functional_area,
+            figure=cluster.figure,
+            building_ids=cluster.building_ids,
+            buildings=buildings,
+            labels=[building.label for building in cluster.buildings],
+            connection_points=[building.connection_points for building in cluster.buildings],
+        )
+
+    def to_cluster_shape(self) -> ClusterShape:
+        return ClusterShape(
+            cluster_id=self.cluster_id,
+            functional_area=self.functional_area,
+            figure=self.figure,
+            buildings=[
+                BuildingWrapper(
+                    id=building_id,
+                    label=self.labels[idx] if self.labels else '',
+                    figure=get_figure(float(row[WIDTH]), float(row[LENGTH])),
+                    local_position=Position(offset_x_m=float(row[X]), offset_y_m=float(row[Y]),
+                                            angle_deg=float(row[ANGLE])),
+                    connection_points=self.connection_points[idx] if self.connection_points else []
+                )
+                for idx, (building_id, row) in enumerate(zip(self.building_ids, self.buildings))
+            ]
+        )
+
+    def get_global_buildings(self, cluster_position: 'ClusterPosition') -> np.ndarray:
+        """Сооружения в глобальных координатах: одно сложение с положением кластера без создания объектов."""
+        return self.buildings + np.array([cluster_position.x, cluster_position.y, 0., 0., 0.])
+
+    @property
+    def local_bounds(self) -> Tuple[float, float, float, float]:
+        """Габарит сооружений кластера в локальных координатах: min_x, max_x, min_y, max_y."""
+        # импорт здесь, тк `force.distance` сам зависит от этого модуля
+        from .distance import get_building_bounds
+
+        if not len(self.buildings):
+            return float('inf'), float('-inf'), float('inf'), float('-inf')
+        bounds = get_building_bounds(self.buildings)
+        return bounds[:, 0].min(), bounds[:, 1].max(), bounds[:, 2].min(), bounds[:, 3].max()
+
+
+# кластер для векторизованных функций
+Cluster = Union[ClusterShape, ClusterArray]
+
 
 @dataclass
 class ClusterPosition:
@@ -98,6 +229,7 @@ class ClusterShift:
 
         self.dx += other.dx
         self.dy += other.dy
+        return self
 
 
 @dataclass
@@ -168,3 +300,4 @@ class Shift:
 
         self.dx += other.dx
         self.dy += other.dy
+        return self
@@ -0,0 +1,351 @@
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from .distance import calculate_min_normalized_distance
+from .distance import get_building_array
+from .distance import get_offset_matrix
+from .internal import ANGLE
+from .internal import LENGTH
+from .internal import WIDTH
+from .internal import X
+from .internal import Y
+from .internal import Cluster
+from .internal import ClusterConnection
+from .internal import ClusterPosition
+from .internal import ClusterShift
+from .matrix import ClusterDistanceMatrix
+from .neighbors import DEFAULT_SKIN_M
+from .neighbors import NeighborList
+from .offsets import BuildingOffsetRules
+from .offsets import CompressedOffsetTable
+from .offsets import OffsetTable
+from .quadtree import calculate_long_range_forces
+from .quadtree import calculate_long_range_forces_exact
+from .search import get_max_offsets
+from .spatial import LOWER_BOUND_TOLERANCE
+from .spatial import calculate_bounds_lower_bound
+
+
+@dataclass
+class LayoutSettings:
+    """Параметры раскладки кластеров.
+
+    Attributes:
+        :iterations (int): наибольшее количество итераций.
+        :max_step_m (float): наибольшее смещение кластера за итерацию в метрах.
+        :repulsion_distance (float): безразмерное расстояние, ближе которого кластеры отталкиваются.
+        :repulsion_strength (float): коэффициент силы отталкивания.
+        :attraction_strength (float): коэффициент силы притяжения связанных кластеров.
+        :tolerance_m (float): раскладка останавливается, если все смещения за итерацию меньше этого значения.
+        :long_range_strength (float): коэффициент дальнего отталкивания центров кластеров, убывающего
+            обратно пропорционально расстоянию.
+        :theta (Optional[float]): точность приближенного расчета дальнего отталкивания
+            (см. `force.quadtree.calculate_long_range_forces`), `None` -- точный расчет по всем парам.
+        :skin_m (float): запас к радиусу списка соседних кластеров при заданном `theta` (см. `NeighborList`).
+
+    """
+    iterations: int = 100
+    max_step_m: float = 10.
+    repulsion_distance: float = 1.
+    repulsion_strength: float = 10.
+    attraction_strength: float = 0.01
+    tolerance_m: float = 1e-3
+    long_range_strength: float = 0.
+    theta: Optional[float] = None
+    skin_m: float = DEFAULT_SKIN_M
+
+
+@dataclass
+class LayoutResult:
+    """Результат раскладки кластеров.
+
+    Attributes:
+        :cluster_positions (List[ClusterPosition]): итоговые положения кластеров.
+        :iteration_times_s (List[float]): время каждой итерации в секундах.
+
+    """
+    cluster_positions: List[ClusterPosition]
+    iteration_times_s: List[float] = field(default_factory=list)
+
+
+class ForceLayout:
+    """Силовая раскладка кластеров.
+
+    На каждой итерации кластеры отталкиваются, если безразмерное расстояние между ними меньше
+    `LayoutSettings.repulsion_distance`, и притягиваются по связям пропорционально
+    `ClusterConnection.normalized_connection_cost`, после чего сдвигаются вдоль суммарной силы.
+    Силы и положения хранятся в массивах формы (N, 2).
+
+    Python-реализация обновляет матрицу расстояний только для сдвинутых кластеров (см. `ClusterDistanceMatrix`).
+    При `use_rust=True` матрица расстояний и силы на каждой итерации считаются в `rust_force` параллельно,
+    что выгоднее для площадок с большим количеством кластеров.
+
+    Если задан `LayoutSettings.theta`, матрица расстояний не строится: безразмерные расстояния точно считаются
+    только для пар кластеров, габариты которых ближе наибольшего расстояния отталкивания. Такие пары берутся
+    из списка соседей, который перестраивается только после заметного смещения кластеров, а дальнее отталкивание
+    считается приближенно по квадродереву, так что стоимость итерации растет почти линейно с количеством кластеров.
+
+    Attributes:
+        :clusters (List[Cluster]): кластеры.
+        :positions (np.ndarray): положения кластеров формы (N, 2).
+        :settings (LayoutSettings): параметры раскладки.
+        :neighbors (NeighborList): список соседних кластеров, только при заданном `LayoutSettings.theta`.
+
+    """
+
+    def __init__(
+            self,
+            clusters: List[Cluster],
+            cluster_positions: List[ClusterPosition],
+            cluster_connections: List[ClusterConnection],
+            building_offset_rules: BuildingOffsetRules,
+            settings: Optional[LayoutSettings] = None,
+            use_rust: bool = False
+    ):
+        self.clusters = clusters
+        self.settings = settings if settings is not None else LayoutSettings()
+        positions = {position.cluster_id: position for position in cluster_positions}
+        self.positions = np.array([(positions[c.cluster_id].x, positions[c.cluster_id].y) for c in clusters],
+                                  dtype=np.float64).reshape(-1, 2)
+
+        cluster_indices = {cluster.cluster_id: idx for idx, cluster in enumerate(clusters)}
+        self._connection_indices = np.array(
+            [(cluster_indices[c.first_cluster_id], cluster_indices[c.second_cluster_id]) for c in cluster_connections],
+            dtype=np.int64
+        ).reshape(-1, 2)
+        self._connection_costs = np.array([c.normalized_connection_cost for c in cluster_connections],
+                                          dtype=np.float64)
+        # габариты пересчитываются при каждом обращении к `local_bounds`, поэтому собираются один раз
+        local_bounds = np.array([cluster.local_bounds for cluster in clusters], dtype=np.float64).reshape(-1, 4)
+        self._center_offsets = _get_center_offsets(local_bounds)
+
+        self._use_rust = use_rust
+        if self.settings.theta is not None:
+            if use_rust:
+                raise ValueError('approximate forces are not supported by the rust backend')
+            self._building_offset_rules = building_offset_rules
+            self._local_buildings = [
+                get_building_array(cluster, ClusterPosition(cluster_id=cluster.cluster_id, x=0., y=0.))
+                for cluster in clusters
+            ]
+            self._first_max_offsets, self._second_max_offsets = get_max_offsets(clusters, building_offset_rules)
+            max_offset = max(self._first_max_offsets.max(initial=0.), self._second_max_offsets.max(initial=0.))
+            self.neighbors = NeighborList(
+                local_bounds,
+                self.positions,
+                self.settings.repulsion_distance * max_offset,
+                self.settings.skin_m
+            )
+        elif use_rust:
+            self._rust_clusters = _to_rust_clusters(clusters)
+            self._rust_offset_rules = _to_rust_offset_rules(building_offset_rules)
+        else:
+            self._matrix = ClusterDistanceMatrix(clusters, self.get_cluster_positions(), building_offset_rules)
+
+    def get_cluster_positions(self) -> List[ClusterPosition]:
+        return [ClusterPosition(cluster_id=cluster.cluster_id, x=float(x), y=float(y))
+                for cluster, (x, y) in zip(self.clusters, self.positions)]
+
+    def calculate_forces(self) -> np.ndarray:
+        """Силы, действующие на кластеры в текущем положении, формы (N, 2)."""
+        centers = self.positions + self._center_offsets
+        if self.settings.theta is not None:
+            first, second, distances = self._calculate_near_pair_distances()
+            forces = calculate_pair_repulsion_forces(centers, first, second, distances, self.settings)
+            forces += calculate_long_range_forces(centers, self.settings.long_range_strength, self.settings.theta)
+            add_attraction_forces(forces, centers, self._connection_indices, self._connection_costs, self.settings)
+            return forces
+        if self._use_rust:
+            import rust_force
+
+            distances, _ = rust_force.calculate_normalized_distance_matrix_between_clusters(
+                self._rust_clusters,
+                [rust_force.ClusterPosition(x=float(x), y=float(y)) for x, y in self.positions],
+                self._rust_offset_rules
+            )
+            return rust_force.calculate_cluster_forces(
+                centers, distances, self._connection_indices, self._connection_costs,
+                self.settings.repulsion_distance, self.settings.repulsion_strength,
+                self.settings.attraction_strength, self.settings.long_range_strength
+            )
+        return calculate_cluster_forces(centers, self._matrix.distances, self._connection_indices,
+                                        self._connection_costs, self.settings)
+
+    def step(self) -> List[ClusterShift]:
+        """Одна итерация раскладки.
+
+        :return List[ClusterShift]: сдвиги кластеров, сместившихся за итерацию
+        """
+        shifts = get_shifts(self.calculate_forces(), self.settings.max_step_m)
+        self.positions += shifts
+        moved = np.flatnonzero(np.any(shifts != 0, axis=1))
+        cluster_shifts = [
+            ClusterShift(cluster_id=self.clusters[idx].cluster_id, dx=float(shifts[idx, 0]), dy=float(shifts[idx, 1]))
+            for idx in moved
+        ]
+        if self.settings.theta is None and not self._use_rust:
+            self._matrix.apply_shifts(cluster_shifts)
+        return cluster_shifts
+
+    def _calculate_near_pair_distances(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Безразмерные расстояния для пар кластеров, которые могут отталкиваться: расстояние между габаритами
+        меньше `repulsion_distance`, умноженного на наибольший оффсет между сооружениями пары.
+
+        :return Tuple[np.ndarray, np.ndarray, np.ndarray]: индексы первых и вторых кластеров пар, расстояния
+        """
+        self.neighbors.update(self.positions)
+        first, second = self.neighbors.first_indices, self.neighbors.second_indices
+        bounds = self.neighbors.get_bounds(self.positions)
+        gaps = calculate_bounds_lower_bound(bounds[first], bounds[second])
+        pair_max_offsets = np.minimum(self._first_max_offsets[first], self._second_max_offsets[second])
+        near = gaps - LOWER_BOUND_TOLERANCE < self.settings.repulsion_distance * pair_max_offsets
+        first, second = first[near], second[near]
+
+        buildings = [local_buildings + (x, y, 0., 0., 0.)
+                     for local_buildings, (x, y) in zip(self._local_buildings, self.positions)]
+        distances = np.array([
+            calculate_min_normalized_distance(
+                buildings[i], buildings[j],
+                get_offset_matrix(self.clusters[i], self.clusters[j], self._building_offset_rules)
+            )[0]
+            for i, j in zip(first, second)
+        ], dtype=np.float64)
+        return first, second, distances
+
+    def run(self) -> LayoutResult:
+        """Итерации раскладки до сходимости или исчерпания `LayoutSettings.iterations`."""
+        iteration_times_s = []
+        for _ in range(self.settings.iterations):
+            start = time.perf_counter()
+            cluster_shifts = self.step()
+            iteration_times_s.append(time.perf_counter() - start)
+            if all(np.hypot(s.dx, s.dy) < self.settings.tolerance_m for s in cluster_shifts):
+                break
+        return LayoutResult(cluster_positions=self.get_cluster_positions(), iteration_times_s=iteration_times_s)
+
+
+def calculate_cluster_forces(
+        centers: np.ndarray,
+        distances: np.ndarray,
+        connection_indices: np.ndarray,
+        connection_costs: np.ndarray,
+        settings: LayoutSettings
+) -> np.ndarray:
+    """
+    Силы, действующие на кластеры.
+
+    Кластеры отталкиваются вдоль линии, соединяющей центры, с силой `repulsion_strength`, умноженной на недостающее
+    до `repulsion_distance` безразмерное расстояние, и с силой дальнего отталкивания `long_range_strength / r`.
+    Связанные кластеры притягиваются с силой, пропорциональной стоимости связи и расстоянию между центрами.
+
+    :param centers: центры кластеров формы (N, 2)
+    :param distances: безразмерные расстояния между кластерами формы (N, N), на диагонали -- бесконечность
+    :param connection_indices: индексы связанных кластеров формы (k, 2)
+    :param connection_costs: нормированные стоимости связей формы (k,)
+    :return np.ndarray: силы формы (N, 2)
+    """
+    deltas = centers[:, None, :] - centers[None, :, :]
+    lengths = np.hypot(deltas[..., 0], deltas[..., 1])
+    magnitudes = settings.repulsion_strength * np.maximum(0., settings.repulsion_distance - distances)
+    # у совпадающих центров нет направления
+    scales = np.divide(magnitudes, lengths, out=np.zeros_like(lengths), where=lengths > 0)
+    forces = (deltas * scales[..., None]).sum(axis=1)
+    forces += calculate_long_range_forces_exact(centers, settings.long_range_strength)
+    add_attraction_forces(forces, centers, connection_indices, connection_costs, settings)
+    return forces
+
+
+def calculate_pair_repulsion_forces(
+        centers: np.ndarray,
+        first_indices: np.ndarray,
+        second_indices: np.ndarray,
+        distances: np.ndarray,
+        settings: LayoutSettings
+) -> np.ndarray:
+    """
+    Силы отталкивания кластеров по списку пар, как в `calculate_cluster_forces`, без дальнего отталкивания.
+    Каждая пара задается один раз и действует на оба кластера.
+
+    :param distances: безразмерные расстояния между кластерами пар формы (k,)
+    :return np.ndarray: силы формы (N, 2)
+    """
+    deltas = centers[first_indices] - centers[second_indices]
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+    magnitudes = settings.repulsion_strength * np.maximum(0., settings.repulsion_distance - distances)
+    scales = np.divide(magnitudes, lengths, out=np.zeros_like(lengths), where=lengths > 0)
+    forces = np.zeros_like(centers, dtype=np.float64)
+    np.add.at(forces, first_indices, deltas * scales[:, None])
+    np.add.at(forces, second_indices, -deltas * scales[:, None])
+    return forces
+
+
+def add_attraction_forces(
+        forces: np.ndarray,
+        centers: np.ndarray,
+        connection_indices: np.ndarray,
+        connection_costs: np.ndarray,
+        settings: LayoutSettings
+) -> None:
+    """Добавляет к силам притяжение связанных кластеров."""
+    first, second = connection_indices[:, 0], connection_indices[:, 1]
+    pulls = settings.attraction_strength * connection_costs[:, None] * (centers[second] - centers[first])
+    np.add.at(forces, first, pulls)
+    np.add.at(forces, second, -pulls)
+
+
+def get_shifts(forces: np.ndarray, max_step_m: float) -> np.ndarray:
+    """Сдвиги кластеров вдоль сил, ограниченные по длине `max_step_m`."""
+    lengths = np.hypot(forces[:, 0], forces[:, 1])
+    scales = np.minimum(1., np.divide(max_step_m, lengths, out=np.ones_like(lengths), where=lengths > 0))
+    return forces * scales[:, None]
+
+
+def _get_center_offsets(local_bounds: np.ndarray) -> np.ndarray:
+    """Центры габаритов кластеров относительно их положений, для пустых кластеров -- сами положения."""
+    centers = np.stack([local_bounds[:, 0] + local_bounds[:, 1], local_bounds[:, 2] + local_bounds[:, 3]], axis=1) / 2
+    # у пустого кластера габарит (inf, -inf, inf, -inf), сумма границ -- nan
+    return np.where(np.isfinite(centers), centers, 0.)
+
+
+def _to_rust_clusters(clusters: List[Cluster]) -> list:
+    import rust_force
+
+    rust_clusters = []
+    for cluster in clusters:
+        buildings = get_building_array(cluster, ClusterPosition(cluster_id=cluster.cluster_id, x=0., y=0.))
+        rust_clusters.append([
+            rust_force.Building(
+                id=str(building_id),
+                rectangle=rust_force.Rectangle(width_m=row[WIDTH], length_m=row[LENGTH]) if row[WIDTH] >= 0 else None,
+                circle=rust_force.Circle(radius_m=row[LENGTH] / 2) if row[WIDTH] < 0 else None,
+                position=rust_force.Position(offset_x_m=row[X], offset_y_m=row[Y], angle_deg=row[ANGLE])
+            )
+            for building_id, row in zip(cluster.building_ids, buildings.tolist())
+        ])
+    return rust_clusters
+
+
+def _to_rust_offset_rules(building_offset_rules: BuildingOffsetRules):
+    import rust_force
+
+    if isinstance(building_offset_rules, OffsetTable):
+        building_ids = [str(building_id) for building_id in building_offset_rules.building_ids]
+        return rust_force.OffsetRules.from_array(building_ids, building_offset_rules.offsets)
+    if isinstance(building_offset_rules, CompressedOffsetTable):
+        return rust_force.OffsetRules.from_compressed(
+            [str(building_id) for building_id in building_offset_rules.building_ids],
+            building_offset_rules.building_types,
+            building_offset_rules.type_offsets,
+            building_offset_rules.exception_indices,
+            building_offset_rules.exception_offsets
+        )
+    return rust_force.OffsetRules({
+        (str(first_id), str(second_id)): offset for (first_id, second_id), offset in building_offset_rules.items()
+    })
@@ -0,0 +1,189 @@
+import json
+from dataclasses import fields
+from typing import Any
+from typing import Dict
+from typing import Union
+from uuid import UUID
+
+from shapely.geometry import shape
+
+from .model import Building
+from .model import BuildingCluster
+from .model import BuildingClusterWithPositions
+from .model import BuildingConnection
+from .model import BuildingOffsetRule
+from .model import Circle
+from .model import ConnectionPoint
+from .model import ConnectionType
+from .model import ExternalPoint
+from .model import FunctionalAreaType
+from .model import InputData
+from .model import Position
+from .model import Rectangle
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ZERO_UUID = UUID('00000000-0000-0000-0000-000000000000')
+# признак отсутствующего в JSON поля геометрии
+_MISSING = object()
+
+
+class _LazyGeometry:
+    """Примесь, откладывающая построение `shapely`-геометрии до первого обращения к полю.
+
+    До обращения в объекте хранится исходный `GeoJSON`-словарь. Объекты сравниваются с исходными
+    классами модели по значениям полей.
+
+    """
+    _model: type
+    _geometry_field: str
+
+    @classmethod
+    def _create(cls, geometry: Any, **kwargs):
+        obj = cls.__new__(cls)
+        obj.__dict__.update(kwargs)
+        obj.__dict__['_raw_geometry'] = geometry
+        return obj
+
+    def __getattr__(self, name):
+        # вызывается, только если атрибут не найден обычным образом
+        if name != self._geometry_field or '_raw_geometry' not in self.__dict__:
+            raise AttributeError(name)
+        raw = self.__dict__.pop('_raw_geometry')
+        if raw is _MISSING:
+            value = next(f for f in fields(self._model) if f.name == name).default_factory()
+        else:
+            value = None if raw is None else shape(raw)
+        self.__dict__[name] = value
+        return value
+
+    def __eq__(self, other):
+        if not isinstance(other, self._model):
+            return NotImplemented
+        return all(getattr(self, f.name) == getattr(other, f.name) for f in fields(self._model))
+
+    @property
+    def is_geometry_decoded(self) -> bool:
+        return '_raw_geometry' not in self.__dict__
+
+
+class LazyConnectionPoint(_LazyGeometry, ConnectionPoint):
+    _model = ConnectionPoint
+    _geometry_field = 'point_m'
+
+
+class LazyExternalPoint(_LazyGeometry, ExternalPoint):
+    _model = ExternalPoint
+    _geometry_field = 'point_m'
+
+
+class LazyInputData(_LazyGeometry, InputData):
+    _model = InputData
+    _geometry_field = 'development_area_m'
+
+
+def load_input_data(data: Union[str, bytes]) -> InputData:
+    """
+    Быстрая загрузка входных данных из JSON.
+
+    Результат совпадает с `InputData.schema().loads(data)`, но объекты модели строятся напрямую, без
+    `marshmallow`, а геометрия (`GeoJSON`) декодируется в `shapely`-объекты только при первом обращении
+    к полю. Для разбора используется `orjson`, если он установлен, иначе стандартный `json`.
+
+    Варианты `Union`-полей выбираются по полю `__type`, а если его нет -- по набору ключей.
+
+    :param data: JSON-строка
+    :return InputData: входные данные
+    """
+    raw = orjson.loads(data) if orjson is not None else json.loads(data)
+    return LazyInputData._create(
+        raw.get('development_area_m', _MISSING),
+        connection_types=[_load_connection_type(item) for item in raw.get('connection_types', [])],
+        buildings=[_load_building(item) for item in raw.get('buildings', [])],
+        building_clusters=[_load_building_cluster(item) for item in raw.get('building_clusters', [])],
+        building_offset_rules=[
+            BuildingOffsetRule(
+                first_building_id=_load_uuid(item, 'first_building_id'),
+                second_building_id=_load_uuid(item, 'second_building_id'),
+                offset_m=float(item.get('offset_m', 0.))
+            )
+            for item in raw.get('building_offset_rules', [])
+        ],
+        building_connections=[
+            BuildingConnection(
+                id=_load_uuid(item, 'id'),
+                source_connection_point_id=_load_uuid(item, 'source_connection_point_id'),
+                target_connection_point_id=_load_uuid(item, 'target_connection_point_id'),
+                connection_type_id=_load_uuid(item, 'connection_type_id')
+            )
+            for item in raw.get('building_connections', [])
+        ],
+        external_points=[
+            LazyExternalPoint._create(
+                item.get('point_m', _MISSING),
+                id=_load_uuid(item, 'id'),
+                connection_point_type_id=_load_uuid(item, 'connection_point_type_id')
+            )
+            for item in raw.get('external_points', [])
+        ],
+        wind_rose_angle_deg=float(raw.get('wind_rose_angle_deg', 0.))
+    )
+
+
+def load_input_data_file(path: str) -> InputData:
+    with open(path, 'rb') as file:
+        return load_input_data(file.read())
+
+
+def _load_uuid(item: Dict[str, Any], key: str) -> UUID:
+    value = item.get(key)
+    return ZERO_UUID if value is None else UUID(value)
+
+
+def _load_connection_type(item: Dict[str, Any]) -> ConnectionType:
+    return ConnectionType(id=_load_uuid(item, 'id'), name=item.get('name', ''), cost=float(item.get('cost', 0.)))
+
+
+def _load_building(item: Dict[str, Any]) -> Building:
+    return Building(
+        id=_load_uuid(item, 'id'),
+        figure=_load_figure(item.get('figure', {})),
+        functional_area=FunctionalAreaType(item.get('functional_area', FunctionalAreaType.ONE)),
+        connection_points=[
+            LazyConnectionPoint._create(
+                point.get('point_m', _MISSING),
+                id=_load_uuid(point, 'id'),
+                building_id=_load_uuid(point, 'building_id')
+            )
+            for point in item.get('connection_points', [])
+        ],
+        label=item.get('label', '')
+    )
+
+
+def _load_figure(item: Dict[str, Any]) -> Union[Circle, Rectangle]:
+    figure_type = item.get('__type')
+    if figure_type == 'Rectangle' or figure_type is None and ('width_m' in item or 'length_m' in item):
+        return Rectangle(width_m=float(item.get('width_m', 0.)), length_m=float(item.get('length_m', 0.)))
+    return Circle(radius_m=float(item.get('radius_m', 0.)))
+
+
+def _load_building_cluster(item: Dict[str, Any]) -> Union[BuildingCluster, BuildingClusterWithPositions]:
+    cluster_type = item.get('__type')
+    if cluster_type == 'BuildingClusterWithPositions' or cluster_type is None and 'positions' in item:
+        return BuildingClusterWithPositions(
+            id=_load_uuid(item, 'id'),
+            positions=[
+                Position(
+                    building_id=_load_uuid(position, 'building_id'),
+                    offset_x_m=float(position.get('offset_x_m', 0.)),
+                    offset_y_m=float(position.get('offset_y_m', 0.)),
+                    angle_deg=float(position.get('angle_deg', 0.))
+                )
+                for position in item.get('positions', [])
+            ]
+        )
+    return BuildingCluster(id=_load_uuid(item, 'id'), building_ids=[UUID(i) for i in item.get('building_ids', [])])
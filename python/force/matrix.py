@@ -0,0 +1,133 @@
+from typing import Dict
+from typing import List
+from typing import Tuple
+from uuid import UUID
+
+import numpy as np
+
+from .distance import X
+from .distance import Y
+from .distance import calculate_min_normalized_distance
+from .distance import calculate_normalized_distance_matrix_between_clusters
+from .distance import get_building_array
+from .distance import get_offset_matrix
+from .internal import Cluster
+from .internal import ClusterPosition
+from .internal import ClusterShift
+from .offsets import BuildingOffsetRules
+
+
+class ClusterDistanceMatrix:
+    """Матрица безразмерных расстояний между всеми парами кластеров, обновляемая по сдвигам кластеров.
+
+    После сдвига пересчитываются только строки и столбцы сдвинутых кластеров, поэтому стоимость шага
+    пропорциональна количеству сдвинутых кластеров, а не N². Для каждой строки хранится её минимум, что позволяет
+    поддерживать глобальный минимум без просмотра всей матрицы. Значения совпадают с
+    `calculate_normalized_distance_matrix_between_clusters`.
+
+    Attributes:
+        :clusters (List[Cluster]): кластеры.
+        :positions (List[ClusterPosition]): текущие положения кластеров в том же порядке.
+        :distances (np.ndarray): матрица безразмерных расстояний формы (N, N), на диагонали -- бесконечность.
+        :offsets (np.ndarray): матрица оффсетов для минимальных расстояний формы (N, N).
+
+    """
+
+    def __init__(
+            self,
+            clusters: List[Cluster],
+            cluster_positions: List[ClusterPosition],
+            building_offset_rules: BuildingOffsetRules
+    ):
+        self.clusters = clusters
+        self.positions = [ClusterPosition(cluster_id=p.cluster_id, x=p.x, y=p.y) for p in cluster_positions]
+        self._building_offset_rules = building_offset_rules
+        self._cluster_indices: Dict[UUID, int] = {cluster.cluster_id: idx for idx, cluster in enumerate(clusters)}
+        self._local_buildings = [
+            get_building_array(cluster, ClusterPosition(cluster_id=cluster.cluster_id, x=0., y=0.))
+            for cluster in clusters
+        ]
+        self._buildings = [self._get_global_buildings(idx) for idx in range(len(clusters))]
+
+        self.distances, self.offsets = calculate_normalized_distance_matrix_between_clusters(
+            clusters, self.positions, building_offset_rules)
+        self._row_argmin = np.argmin(self.distances, axis=1) if len(clusters) else np.empty(0, dtype=np.int64)
+        self._row_min = self.distances[np.arange(len(clusters)), self._row_argmin]
+
+    @property
+    def min_distance(self) -> float:
+        """Минимальное безразмерное расстояние между кластерами."""
+        return float(self._row_min[self._get_min_row()])
+
+    @property
+    def min_offset(self) -> float:
+        """Оффсет для минимального безразмерного расстояния."""
+        row = self._get_min_row()
+        return float(self.offsets[row, self._row_argmin[row]])
+
+    @property
+    def closest_clusters(self) -> Tuple[UUID, UUID]:
+        """id пары кластеров с минимальным безразмерным расстоянием."""
+        row = self._get_min_row()
+        return self.clusters[row].cluster_id, self.clusters[self._row_argmin[row]].cluster_id
+
+    def apply_shifts(self, shifts: List[ClusterShift]) -> None:
+        """Сдвигает кластеры и пересчитывает строки и столбцы сдвинутых кластеров."""
+        moved = []
+        for shift in shifts:
+            idx = self._cluster_indices[shift.cluster_id]
+            self.positions[idx].x += shift.dx
+            self.positions[idx].y += shift.dy
+            if idx not in moved:
+                moved.append(idx)
+        if not moved:
+            return
+
+        for idx in moved:
+            self._buildings[idx] = self._get_global_buildings(idx)
+
+        is_moved = np.zeros(len(self.clusters), dtype=bool)
+        for idx in moved:
+            for other in range(len(self.clusters)):
+                # пары из двух сдвинутых кластеров пересчитываются один раз
+                if other == idx or is_moved[other]:
+                    continue
+                first, second = min(idx, other), max(idx, other)
+                distance, offset, _ = calculate_min_normalized_distance(
+                    self._buildings[first],
+                    self._buildings[second],
+                    get_offset_matrix(self.clusters[first], self.clusters[second], self._building_offset_rules)
+                )
+                self.distances[first, second] = self.distances[second, first] = distance
+                self.offsets[first, second] = self.offsets[second, first] = offset
+            is_moved[idx] = True
+
+        self._update_row_minimums(is_moved)
+
+    def _update_row_minimums(self, is_moved: np.ndarray) -> None:
+        moved = np.flatnonzero(is_moved)
+        # для несдвинутых строк изменились только столбцы сдвинутых кластеров
+        moved_columns = self.distances[:, moved]
+        column_argmin = moved[np.argmin(moved_columns, axis=1)]
+        column_min = moved_columns.min(axis=1)
+        improved = (column_min < self._row_min) | ((column_min == self._row_min) & (column_argmin < self._row_argmin))
+        self._row_min = np.where(improved, column_min, self._row_min)
+        self._row_argmin = np.where(improved, column_argmin, self._row_argmin)
+
+        # строки сдвинутых кластеров и строки, минимум которых был в сдвинутом столбце и мог вырасти
+        stale = is_moved | (is_moved[self._row_argmin] & ~improved &
+                            (self.distances[np.arange(len(self.clusters)), self._row_argmin] != self._row_min))
+        for row in np.flatnonzero(stale):
+            self._row_argmin[row] = np.argmin(self.distances[row])
+            self._row_min[row] = self.distances[row, self._row_argmin[row]]
+
+    def _get_min_row(self) -> int:
+        if not len(self.clusters):
+            raise ValueError('matrix is empty')
+        return int(np.argmin(self._row_min))
+
+    def _get_global_buildings(self, idx: int) -> np.ndarray:
+        buildings = self._local_buildings[idx].copy()
+        buildings[:, X] += self.positions[idx].x
+        buildings[:, Y] += self.positions[idx].y
+        return buildings
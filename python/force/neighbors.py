@@ -0,0 +1,80 @@
+from typing import List
+
+import numpy as np
+
+from .internal import Cluster
+from .internal import ClusterPosition
+from .spatial import find_close_bounds_pairs
+
+# запас к радиусу списка соседей по умолчанию, м
+DEFAULT_SKIN_M = 10.
+
+
+class NeighborList:
+    """Список пар соседних кластеров (Verlet list).
+
+    В список попадают пары кластеров, расстояние между габаритами которых не больше `cutoff_m + skin_m`.
+    Пока ни один кластер не сместился от положения при построении больше чем на `skin_m / 2`, список содержит
+    все пары, расстояние между габаритами которых не больше `cutoff_m`, и не перестраивается. Между
+    перестроениями проверка стоит O(N).
+
+    Attributes:
+        :local_bounds (np.ndarray): габариты кластеров в локальных координатах формы (N, 4).
+        :cutoff_m (float): радиус взаимодействия.
+        :skin_m (float): запас к радиусу взаимодействия.
+        :first_indices (np.ndarray): индексы первых кластеров пар.
+        :second_indices (np.ndarray): индексы вторых кластеров пар, больше индексов первых.
+        :rebuild_count (int): количество построений списка.
+
+    """
+
+    def __init__(self, local_bounds: np.ndarray, positions: np.ndarray, cutoff_m: float,
+                 skin_m: float = DEFAULT_SKIN_M):
+        self.local_bounds = local_bounds
+        self.cutoff_m = cutoff_m
+        self.skin_m = skin_m
+        self.first_indices = np.empty(0, dtype=np.int64)
+        self.second_indices = np.empty(0, dtype=np.int64)
+        self.rebuild_count = 0
+        self._build_positions = positions.copy()
+        self.rebuild(positions)
+
+    @classmethod
+    def from_clusters(
+            cls,
+            clusters: List[Cluster],
+            cluster_positions: List[ClusterPosition],
+            cutoff_m: float,
+            skin_m: float = DEFAULT_SKIN_M
+    ) -> 'NeighborList':
+        positions = {position.cluster_id: position for position in cluster_positions}
+        return cls(
+            np.array([cluster.local_bounds for cluster in clusters], dtype=np.float64).reshape(-1, 4),
+            np.array([(positions[c.cluster_id].x, positions[c.cluster_id].y) for c in clusters],
+                     dtype=np.float64).reshape(-1, 2),
+            cutoff_m,
+            skin_m
+        )
+
+    def get_bounds(self, positions: np.ndarray) -> np.ndarray:
+        """Габариты кластеров в глобальных координатах: min_x, max_x, min_y, max_y."""
+        return self.local_bounds + np.repeat(positions, 2, axis=1)
+
+    def rebuild(self, positions: np.ndarray) -> None:
+        self.first_indices, self.second_indices = find_close_bounds_pairs(self.get_bounds(positions),
+                                                                          self.cutoff_m + self.skin_m)
+        self._build_positions = positions.copy()
+        self.rebuild_count += 1
+
+    def update(self, positions: np.ndarray) -> bool:
+        """
+        Перестраивает список, если какой-либо кластер сместился больше чем на `skin_m / 2`.
+
+        :param positions: текущие положения кластеров формы (N, 2)
+        :return bool: был ли список перестроен
+        """
+        displacements = positions - self._build_positions
+        if not len(positions) or (displacements ** 2).sum(axis=1).max() <= (self.skin_m / 2) ** 2:
+            return False
+        self.rebuild(positions)
+        return True
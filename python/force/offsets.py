@@ -0,0 +1,277 @@
+import os
+from functools import cached_property
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from uuid import UUID
+
+import numpy as np
+
+from .model import Building
+from .model import BuildingOffsetRule
+
+
+class OffsetTable:
+    """Плотная таблица оффсетов между сооружениями.
+
+    id сооружений один раз заменяются целыми индексами, после чего оффсет пары сооружений читается из матрицы
+    по индексам без хеширования `(UUID, UUID)`. Отсутствующим правилам соответствует `nan`.
+
+    Attributes:
+        :building_ids (List[UUID]): id сооружений в порядке индексов.
+        :building_indices (Dict[UUID, int]): индекс сооружения по id.
+        :offsets (np.ndarray): матрица оффсетов формы (N, N).
+
+    """
+
+    def __init__(self, building_ids: List[UUID], offsets: np.ndarray):
+        if offsets.shape != (len(building_ids), len(building_ids)):
+            raise ValueError('offsets must be a square matrix matching building ids')
+        self.building_ids = building_ids
+        self.building_indices: Dict[UUID, int] = {building_id: idx for idx, building_id in enumerate(building_ids)}
+        self.offsets = offsets
+
+    @classmethod
+    def from_rules(cls, building_offset_rules: Dict[Tuple[UUID, UUID], float]) -> 'OffsetTable':
+        building_indices: Dict[UUID, int] = {}
+        for first_building_id, second_building_id in building_offset_rules:
+            building_indices.setdefault(first_building_id, len(building_indices))
+            building_indices.setdefault(second_building_id, len(building_indices))
+
+        offsets = np.full((len(building_indices), len(building_indices)), np.nan)
+        first_indices = np.fromiter((building_indices[first_id] for first_id, _ in building_offset_rules),
+                                    dtype=np.int64, count=len(building_offset_rules))
+        second_indices = np.fromiter((building_indices[second_id] for _, second_id in building_offset_rules),
+                                     dtype=np.int64, count=len(building_offset_rules))
+        offsets[first_indices, second_indices] = np.fromiter(building_offset_rules.values(), dtype=np.float64,
+                                                             count=len(building_offset_rules))
+        return cls(list(building_indices), offsets)
+
+    @classmethod
+    def from_offset_rules(cls, building_offset_rules: List[BuildingOffsetRule]) -> 'OffsetTable':
+        return cls.from_rules({
+            (rule.first_building_id, rule.second_building_id): rule.offset_m
+            for rule in building_offset_rules
+        })
+
+    def get_indices(self, building_ids: Iterable[UUID]) -> np.ndarray:
+        """Индексы сооружений в таблице."""
+        return np.array([self.building_indices[building_id] for building_id in building_ids], dtype=np.int64)
+
+    def get_offset_matrix(self, first_indices: np.ndarray, second_indices: np.ndarray) -> np.ndarray:
+        """
+        Матрица оффсетов между двумя наборами сооружений.
+
+        :return np.ndarray: матрица формы (n, m)
+        """
+        offsets = self.offsets[np.ix_(first_indices, second_indices)]
+        if np.isnan(offsets).any():
+            first_idx, second_idx = np.argwhere(np.isnan(offsets))[0]
+            raise KeyError((self.building_ids[first_indices[first_idx]], self.building_ids[second_indices[second_idx]]))
+        return offsets
+
+    def get_building_max_offsets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Наибольшие оффсеты каждого сооружения, когда оно первое и когда второе в паре."""
+        # сооружения без правил дают nan, которые не влияют на максимум
+        return np.nanmax(self.offsets, axis=1, initial=0.), np.nanmax(self.offsets, axis=0, initial=0.)
+
+
+class CompressedOffsetTable:
+    """Сжатая симметричная таблица оффсетов между сооружениями.
+
+    Оффсеты между сооружениями в основном определяются их типами (например, функциональными зонами), поэтому
+    вместо матрицы N×N хранится матрица оффсетов по умолчанию для пар типов T×T и разреженный список исключений
+    для пар сооружений, оффсет которых отличается от оффсета по умолчанию. Оффсет пары не зависит от порядка
+    сооружений в ней. Парам типов, для которых нет ни одного правила, соответствует `nan`.
+
+    Все данные таблицы -- массивы `numpy`, поэтому таблица записывается в каталог `.npy`-файлов
+    и открывается через `mmap` (см. `save` и `load`).
+
+    Attributes:
+        :building_ids (List[UUID]): id сооружений в порядке индексов.
+        :building_indices (Dict[UUID, int]): индекс сооружения по id.
+        :building_types (np.ndarray): индексы типов сооружений формы (N,).
+        :type_offsets (np.ndarray): симметричная матрица оффсетов по умолчанию для пар типов формы (T, T).
+        :exception_indices (np.ndarray): индексы сооружений пар-исключений формы (K, 2), первый не больше
+            второго, пары упорядочены по возрастанию.
+        :exception_offsets (np.ndarray): оффсеты пар-исключений формы (K,).
+
+    """
+
+    def __init__(
+            self,
+            building_ids: List[UUID],
+            building_types: np.ndarray,
+            type_offsets: np.ndarray,
+            exception_indices: np.ndarray,
+            exception_offsets: np.ndarray
+    ):
+        if building_types.shape != (len(building_ids),):
+            raise ValueError('building types must match building ids')
+        if type_offsets.ndim != 2 or type_offsets.shape[0] != type_offsets.shape[1]:
+            raise ValueError('type offsets must be a square matrix')
+        if len(building_types) and not 0 <= building_types.min() <= building_types.max() < len(type_offsets):
+            raise ValueError('building type is out of range of type offsets')
+        if exception_indices.shape != (len(exception_offsets), 2):
+            raise ValueError('exception indices must have shape (K, 2) matching exception offsets')
+        self.building_ids = building_ids
+        self.building_indices: Dict[UUID, int] = {building_id: idx for idx, building_id in enumerate(building_ids)}
+        self.building_types = building_types
+        self.type_offsets = type_offsets
+        self.exception_indices = exception_indices
+        self.exception_offsets = exception_offsets
+        self._exception_keys = self._get_keys(exception_indices[:, 0], exception_indices[:, 1])
+        if np.any(np.diff(self._exception_keys) <= 0):
+            raise ValueError('exception pairs must be sorted, unique and have first index not greater than second')
+
+    @classmethod
+    def from_rules(
+            cls,
+            building_offset_rules: Dict[Tuple[UUID, UUID], float],
+            building_types: Dict[UUID, int]
+    ) -> 'CompressedOffsetTable':
+        """
+        Сжимает правила оффсетов. Оффсетом по умолчанию для пары типов становится самый частый оффсет среди
+        правил для сооружений этих типов, остальные правила сохраняются как исключения.
+
+        :param building_offset_rules: оффсеты по упорядоченным парам id сооружений, правила для обоих порядков
+            сооружений пары должны совпадать
+        :param building_types: индексы типов сооружений по id, начиная с 0
+        """
+        building_ids = list(building_types)
+        building_indices = {building_id: idx for idx, building_id in enumerate(building_ids)}
+        types = np.fromiter(building_types.values(), dtype=np.int64, count=len(building_types))
+        type_count = int(types.max()) + 1 if len(types) else 0
+
+        first = np.fromiter((building_indices[first_id] for first_id, _ in building_offset_rules),
+                            dtype=np.int64, count=len(building_offset_rules))
+        second = np.fromiter((building_indices[second_id] for _, second_id in building_offset_rules),
+                             dtype=np.int64, count=len(building_offset_rules))
+        values = np.fromiter(building_offset_rules.values(), dtype=np.float64, count=len(building_offset_rules))
+        first, second = np.minimum(first, second), np.maximum(first, second)
+        keys = first * len(building_ids) + second
+
+        # правила пары сооружений в обоих порядках оказываются рядом
+        order = np.lexsort((values, keys))
+        first, second, values, keys = first[order], second[order], values[order], keys[order]
+        same_pair = keys[1:] == keys[:-1]
+        conflicts = np.flatnonzero(same_pair & (values[1:] != values[:-1]))
+        if len(conflicts):
+            pair = (building_ids[first[conflicts[0]]], building_ids[second[conflicts[0]]])
+            raise ValueError(f'offset rules for buildings {pair} depend on the order of buildings')
+        unique = np.concatenate([[True], ~same_pair])[:len(keys)]
+        first, second, values = first[unique], second[unique], values[unique]
+
+        first_types, second_types = types[first], types[second]
+        type_keys = np.minimum(first_types, second_types) * type_count + np.maximum(first_types, second_types)
+        type_offsets = np.full((type_count, type_count), np.nan)
+        if len(values):
+            # серии одинаковых оффсетов внутри пары типов
+            order = np.lexsort((values, type_keys))
+            sorted_type_keys, sorted_values = type_keys[order], values[order]
+            starts = np.flatnonzero(np.concatenate([
+                [True], (sorted_type_keys[1:] != sorted_type_keys[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+            ]))
+            counts = np.diff(np.append(starts, len(sorted_values)))
+            # самая длинная серия каждой пары типов, при равной длине -- с меньшим оффсетом
+            runs = starts[np.lexsort((-counts, sorted_type_keys[starts]))]
+            runs = runs[np.concatenate([[True], sorted_type_keys[runs[1:]] != sorted_type_keys[runs[:-1]]])]
+            first_type, second_type = np.divmod(sorted_type_keys[runs], type_count)
+            type_offsets[first_type, second_type] = sorted_values[runs]
+            type_offsets[second_type, first_type] = sorted_values[runs]
+
+        is_exception = values != type_offsets[first_types, second_types]
+        return cls(building_ids, types, type_offsets, np.stack([first, second], axis=1)[is_exception].reshape(-1, 2),
+                   values[is_exception])
+
+    @classmethod
+    def from_offset_rules(
+            cls,
+            building_offset_rules: List[BuildingOffsetRule],
+            buildings: List[Building]
+    ) -> 'CompressedOffsetTable':
+        """Сжатая таблица, типами сооружений в которой являются функциональные зоны."""
+        return cls.from_rules(
+            {(rule.first_building_id, rule.second_building_id): rule.offset_m for rule in building_offset_rules},
+            {building.id: int(building.functional_area) - 1 for building in buildings}
+        )
+
+    def get_indices(self, building_ids: Iterable[UUID]) -> np.ndarray:
+        """Индексы сооружений в таблице."""
+        return np.array([self.building_indices[building_id] for building_id in building_ids], dtype=np.int64)
+
+    def get_offset(self, first_idx: int, second_idx: int) -> float:
+        """Оффсет пары сооружений по индексам за O(1)."""
+        offset = self._exceptions.get((min(first_idx, second_idx), max(first_idx, second_idx)))
+        if offset is None:
+            offset = float(self.type_offsets[self.building_types[first_idx], self.building_types[second_idx]])
+        if offset != offset:
+            raise KeyError((self.building_ids[first_idx], self.building_ids[second_idx]))
+        return offset
+
+    def get_offset_matrix(self, first_indices: np.ndarray, second_indices: np.ndarray) -> np.ndarray:
+        """
+        Матрица оффсетов между двумя наборами сооружений.
+
+        :return np.ndarray: матрица формы (n, m)
+        """
+        offsets = self.type_offsets[np.ix_(self.building_types[first_indices], self.building_types[second_indices])]
+        if len(self._exception_keys):
+            keys = self._get_keys(np.minimum.outer(first_indices, second_indices),
+                                  np.maximum.outer(first_indices, second_indices))
+            positions = np.minimum(np.searchsorted(self._exception_keys, keys), len(self._exception_keys) - 1)
+            offsets = np.where(self._exception_keys[positions] == keys, self.exception_offsets[positions], offsets)
+        if np.isnan(offsets).any():
+            first_idx, second_idx = np.argwhere(np.isnan(offsets))[0]
+            raise KeyError((self.building_ids[first_indices[first_idx]], self.building_ids[second_indices[second_idx]]))
+        return offsets
+
+    def get_building_max_offsets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Наибольшие оффсеты каждого сооружения, когда оно первое и когда второе в паре."""
+        present_types = np.zeros(len(self.type_offsets), dtype=bool)
+        present_types[self.building_types] = True
+        type_max = np.nanmax(self.type_offsets[:, present_types], axis=1, initial=0.)
+        max_offsets = type_max[self.building_types]
+        np.maximum.at(max_offsets, self.exception_indices[:, 0], self.exception_offsets)
+        np.maximum.at(max_offsets, self.exception_indices[:, 1], self.exception_offsets)
+        return max_offsets, max_offsets
+
+    def save(self, path: str) -> None:
+        """Записывает таблицу в каталог `.npy`-файлов."""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            'building_ids': np.frombuffer(b''.join(building_id.bytes for building_id in self.building_ids),
+                                          dtype=np.uint8).reshape(-1, 16),
+            'building_types': self.building_types,
+            'type_offsets': self.type_offsets,
+            'exception_indices': self.exception_indices,
+            'exception_offsets': self.exception_offsets,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array, allow_pickle=False)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'r') -> 'CompressedOffsetTable':
+        """Открывает таблицу, записанную `save`; массивы по умолчанию отображаются в память."""
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in ('building_ids', 'building_types', 'type_offsets', 'exception_indices', 'exception_offsets')
+        }
+        data = arrays.pop('building_ids').tobytes()
+        return cls([UUID(bytes=data[i:i + 16]) for i in range(0, len(data), 16)], **arrays)
+
+    @cached_property
+    def _exceptions(self) -> Dict[Tuple[int, int], float]:
+        return dict(zip(map(tuple, self.exception_indices.tolist()), self.exception_offsets.tolist()))
+
+    def _get_keys(self, first_indices: np.ndarray, second_indices: np.ndarray) -> np.ndarray:
+        return first_indices.astype(np.int64) * len(self.building_ids) + second_indices
+
+
+# таблицы оффсетов, подготовленные для векторизованного расчета
+OFFSET_TABLE_TYPES = (OffsetTable, CompressedOffsetTable)
+# правила оффсетов: словарь по паре id сооружений или подготовленная таблица
+BuildingOffsetRules = Union[Dict[Tuple[UUID, UUID], float], OffsetTable, CompressedOffsetTable]
@@ -0,0 +1,120 @@
+from math import ceil
+from math import log
+
+import numpy as np
+
+# параметр точности приближения по умолчанию: отношение размера ячейки к расстоянию до неё
+DEFAULT_THETA = 0.5
+# среднее количество кластеров в листовой ячейке дерева
+DEFAULT_LEAF_SIZE = 8
+# количество кластеров, для которых точные силы считаются за один шаг
+DEFAULT_ROWS_PER_STEP = 512
+
+
+def calculate_long_range_forces(
+        centers: np.ndarray,
+        strength: float,
+        theta: float = DEFAULT_THETA,
+        leaf_size: int = DEFAULT_LEAF_SIZE
+) -> np.ndarray:
+    """
+    Приближенные силы дальнего отталкивания кластеров методом Барнса -- Хата.
+
+    Каждый кластер отталкивается от центра каждого другого кластера с силой `strength / r`. Центры раскладываются
+    по квадродереву; ячейка, размер которой меньше `theta`, умноженного на расстояние от кластера до её центра
+    масс, действует на кластер как одно тело с массой, равной количеству кластеров в ней. Остальные ячейки
+    раскрываются до листьев, внутри которых силы считаются точно. При `theta = 0` результат совпадает
+    с `calculate_long_range_forces_exact` с точностью до порядка суммирования.
+
+    Дерево обходится для всех кластеров одновременно, уровень за уровнем.
+
+    :param centers: центры кластеров формы (N, 2)
+    :return np.ndarray: силы формы (N, 2)
+    """
+    forces = np.zeros_like(centers, dtype=np.float64)
+    if len(centers) < 2 or strength == 0:
+        return forces
+    origin = centers.min(axis=0)
+    size = float((centers.max(axis=0) - origin).max())
+    if size == 0:
+        # у совпадающих центров нет направления
+        return forces
+    depth = max(1, ceil(log(len(centers) / leaf_size, 4))) if len(centers) > leaf_size else 1
+
+    level_cells = [_get_cells(centers, origin, size, 1 << level) for level in range(depth + 1)]
+    targets = np.arange(len(centers))
+    cells = np.zeros(len(centers), dtype=np.int64)
+    for level in range(depth):
+        side = 1 << level
+        counts = np.bincount(level_cells[level], minlength=side * side)
+        cell_centers = np.stack([
+            np.bincount(level_cells[level], weights=centers[:, 0], minlength=side * side),
+            np.bincount(level_cells[level], weights=centers[:, 1], minlength=side * side),
+        ], axis=1) / np.maximum(counts, 1)[:, None]
+        deltas = centers[targets] - cell_centers[cells]
+        lengths_sq = (deltas ** 2).sum(axis=1)
+        # ячейку, содержащую сам кластер, всегда раскрываем
+        accepted = (level_cells[level][targets] != cells) & ((size / side) ** 2 < theta ** 2 * lengths_sq)
+        np.add.at(forces, targets[accepted],
+                  deltas[accepted] * (strength * counts[cells[accepted]] / lengths_sq[accepted])[:, None])
+
+        cell_x, cell_y = np.divmod(cells[~accepted], side)
+        children = np.stack([
+            (2 * cell_x + dx) * (2 * side) + (2 * cell_y + dy) for dx in (0, 1) for dy in (0, 1)
+        ], axis=1).ravel()
+        targets = np.repeat(targets[~accepted], 4)
+        non_empty = np.isin(children, level_cells[level + 1])
+        targets, cells = targets[non_empty], children[non_empty]
+
+    _add_leaf_forces(forces, centers, targets, cells, level_cells[depth], strength)
+    return forces
+
+
+def calculate_long_range_forces_exact(
+        centers: np.ndarray,
+        strength: float,
+        rows_per_step: int = DEFAULT_ROWS_PER_STEP
+) -> np.ndarray:
+    """
+    Точные силы дальнего отталкивания кластеров: сумма `strength / r` вдоль линии, соединяющей центры.
+
+    :param centers: центры кластеров формы (N, 2)
+    :return np.ndarray: силы формы (N, 2)
+    """
+    forces = np.zeros_like(centers, dtype=np.float64)
+    if strength == 0:
+        return forces
+    for start in range(0, len(centers), rows_per_step):
+        deltas = centers[start:start + rows_per_step, None, :] - centers[None, :, :]
+        lengths_sq = (deltas ** 2).sum(axis=2)
+        scales = np.divide(strength, lengths_sq, out=np.zeros_like(lengths_sq), where=lengths_sq > 0)
+        forces[start:start + rows_per_step] = (deltas * scales[..., None]).sum(axis=1)
+    return forces
+
+
+def _add_leaf_forces(
+        forces: np.ndarray,
+        centers: np.ndarray,
+        targets: np.ndarray,
+        cells: np.ndarray,
+        center_cells: np.ndarray,
+        strength: float
+) -> None:
+    """Точные силы от всех кластеров листовых ячеек `cells` на кластеры `targets`."""
+    order = np.argsort(center_cells, kind='stable')
+    starts = np.searchsorted(center_cells[order], cells, side='left')
+    counts = np.searchsorted(center_cells[order], cells, side='right') - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    sources = order[np.repeat(starts, counts) + offsets]
+    targets = np.repeat(targets, counts)
+
+    deltas = centers[targets] - centers[sources]
+    lengths_sq = (deltas ** 2).sum(axis=1)
+    scales = np.divide(strength, lengths_sq, out=np.zeros_like(lengths_sq), where=lengths_sq > 0)
+    np.add.at(forces, targets, deltas * scales[:, None])
+
+
+def _get_cells(centers: np.ndarray, origin: np.ndarray, size: float, side: int) -> np.ndarray:
+    """Номера ячеек уровня со стороной `side` ячеек, содержащих центры."""
+    cell_xy = np.minimum(((centers - origin) / size * side).astype(np.int64), side - 1)
+    return cell_xy[:, 0] * side + cell_xy[:, 1]
@@ -0,0 +1,384 @@
+import heapq
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from uuid import UUID
+
+import numpy as np
+
+from .distance import calculate_distance_matrix
+from .distance import get_building_array
+from .distance import get_building_bounds
+from .distance import get_offset_matrix
+from .internal import Cluster
+from .internal import ClusterPosition
+from .offsets import OFFSET_TABLE_TYPES
+from .offsets import BuildingOffsetRules
+from .spatial import LOWER_BOUND_TOLERANCE
+from .spatial import calculate_bounds_lower_bound
+
+# количество сооружений первого кластера, для которых расстояния считаются за один шаг
+DEFAULT_ROWS_PER_STEP = 64
+
+
+@dataclass
+class PruningStats:
+    """Статистика отсечений при поиске минимального расстояния.
+
+    Attributes:
+        :cluster_pairs (int): количество рассмотренных пар кластеров.
+        :cluster_pairs_pruned (int): количество пар кластеров, отброшенных по габаритам кластеров.
+        :buildings_pruned (int): количество сооружений, для которых не считались расстояния до второго кластера.
+
+    """
+    cluster_pairs: int = 0
+    cluster_pairs_pruned: int = 0
+    buildings_pruned: int = 0
+
+
+@dataclass
+class ClosestClusters:
+    """Пара кластеров с минимальным безразмерным расстоянием.
+
+    Attributes:
+        :first_cluster_id (UUID): id первого кластера.
+        :second_cluster_id (UUID): id второго кластера.
+        :distance (float): безразмерное расстояние (расстояние, если правила оффсетов не заданы).
+        :offset_m (float): значение оффсета для найденной пары сооружений.
+        :stats (PruningStats): статистика отсечений.
+
+    """
+    first_cluster_id: UUID
+    second_cluster_id: UUID
+    distance: float
+    offset_m: float
+    stats: PruningStats = field(default_factory=PruningStats)
+
+
+@dataclass
+class BuildingPair:
+    """Пара сооружений из разных кластеров.
+
+    Attributes:
+        :first_cluster_id (UUID): id кластера первого сооружения.
+        :second_cluster_id (UUID): id кластера второго сооружения.
+        :first_building_id (UUID): id первого сооружения.
+        :second_building_id (UUID): id второго сооружения.
+        :distance (float): безразмерное расстояние (расстояние, если правила оффсетов не заданы).
+        :offset_m (float): значение оффсета для пары сооружений.
+
+    """
+    first_cluster_id: UUID
+    second_cluster_id: UUID
+    first_building_id: UUID
+    second_building_id: UUID
+    distance: float
+    offset_m: float
+
+
+def calculate_normalized_distance_between_two_clusters_pruned(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition,
+        building_offset_rules: BuildingOffsetRules,
+        stats: Optional[PruningStats] = None
+) -> Tuple[float, float]:
+    """
+    Аналог `calculate_normalized_distance_between_two_clusters` с отсечением сооружений первого кластера,
+    которые по своему габариту не могут улучшить найденный минимум.
+
+    :return Tuple[float, float]: безразмерное расстояние, значение оффсета
+    """
+    distance, offset, _ = _find_min_normalized_distance(
+        get_building_array(first_cluster, first_cluster_position),
+        get_building_array(second_cluster, second_cluster_position),
+        get_offset_matrix(first_cluster, second_cluster, building_offset_rules),
+        get_global_bounds(second_cluster, second_cluster_position),
+        np.inf,
+        stats if stats is not None else PruningStats()
+    )
+    if np.isinf(distance):
+        raise ValueError('clusters must not be empty')
+    return distance, offset
+
+
+def find_closest_clusters(
+        clusters: List[Cluster],
+        cluster_positions: List[ClusterPosition],
+        building_offset_rules: Optional[BuildingOffsetRules] = None
+) -> ClosestClusters:
+    """
+    Поиск пары кластеров с минимальным безразмерным расстоянием методом ветвей и границ.
+
+    Нижняя оценка для пары кластеров -- расстояние между их габаритами, делённое на наибольший оффсет,
+    который может встретиться между их сооружениями. Пары перебираются по возрастанию оценки, перебор
+    прекращается, как только оценка превышает найденный минимум. Без правил оффсетов ищется минимальное расстояние.
+    """
+    positions = {position.cluster_id: position for position in cluster_positions}
+    first_indices, second_indices, pair_lower_bounds, bounds = _get_cluster_pair_lower_bounds(
+        clusters, positions, building_offset_rules
+    )
+    order = np.argsort(pair_lower_bounds, kind='stable')
+
+    stats = PruningStats()
+    result = ClosestClusters(first_cluster_id=UUID(int=0), second_cluster_id=UUID(int=0), distance=np.inf,
+                             offset_m=0., stats=stats)
+    for step, pair in enumerate(order):
+        if pair_lower_bounds[pair] > result.distance:
+            stats.cluster_pairs_pruned += len(order) - step
+            break
+        stats.cluster_pairs += 1
+        first_cluster, second_cluster = clusters[first_indices[pair]], clusters[second_indices[pair]]
+        first_position, second_position = positions[first_cluster.cluster_id], positions[second_cluster.cluster_id]
+        distance, offset, _ = _find_min_normalized_distance(
+            get_building_array(first_cluster, first_position),
+            get_building_array(second_cluster, second_position),
+            _get_offset_matrix_or_ones(first_cluster, second_cluster, building_offset_rules),
+            bounds[second_indices[pair]],
+            result.distance,
+            stats
+        )
+        if distance < result.distance:
+            result.first_cluster_id = first_cluster.cluster_id
+            result.second_cluster_id = second_cluster.cluster_id
+            result.distance = distance
+            result.offset_m = offset
+    return result
+
+
+def find_closest_building_pairs(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition,
+        building_offset_rules: Optional[BuildingOffsetRules] = None,
+        k: int = 1
+) -> List[BuildingPair]:
+    """`k` ближайших пар сооружений двух кластеров, см. `find_closest_building_pairs_between_clusters`."""
+    return find_closest_building_pairs_between_clusters([first_cluster, second_cluster],
+                                                        [first_cluster_position, second_cluster_position],
+                                                        building_offset_rules, k)
+
+
+def find_closest_building_pairs_between_clusters(
+        clusters: List[Cluster],
+        cluster_positions: List[ClusterPosition],
+        building_offset_rules: Optional[BuildingOffsetRules] = None,
+        k: int = 1,
+        stats: Optional[PruningStats] = None
+) -> List[BuildingPair]:
+    """
+    `k` ближайших по безразмерному расстоянию пар сооружений из разных кластеров.
+
+    Найденные пары хранятся в куче размера `k`, на вершине которой худшая из них. Пары кластеров и сооружения
+    первого кластера перебираются по возрастанию нижней оценки, как в `find_closest_clusters`, и отбрасываются,
+    как только оценка превышает расстояние худшей пары в куче. При равных расстояниях порядок пар совпадает
+    с порядком полного перебора: по индексам кластеров, затем по индексам сооружений.
+
+    :return List[BuildingPair]: пары по возрастанию расстояния
+    """
+    if k < 1:
+        raise ValueError('k must be positive')
+    stats = stats if stats is not None else PruningStats()
+    positions = {position.cluster_id: position for position in cluster_positions}
+    first_indices, second_indices, pair_lower_bounds, bounds = _get_cluster_pair_lower_bounds(
+        clusters, positions, building_offset_rules
+    )
+    order = np.argsort(pair_lower_bounds, kind='stable')
+
+    # элементы кучи: (-расстояние, -номер пары кластеров, -номер пары сооружений, оффсет),
+    # на вершине -- худшая пара
+    heap: List[Tuple[float, int, int, float]] = []
+    for step, pair in enumerate(order):
+        if pair_lower_bounds[pair] > _get_heap_threshold(heap, k):
+            stats.cluster_pairs_pruned += len(order) - step
+            break
+        stats.cluster_pairs += 1
+        first_cluster, second_cluster = clusters[first_indices[pair]], clusters[second_indices[pair]]
+        first_position, second_position = positions[first_cluster.cluster_id], positions[second_cluster.cluster_id]
+        _add_closest_building_pairs(
+            heap, k, int(pair),
+            get_building_array(first_cluster, first_position),
+            get_building_array(second_cluster, second_position),
+            _get_offset_matrix_or_ones(first_cluster, second_cluster, building_offset_rules),
+            bounds[second_indices[pair]],
+            stats
+        )
+
+    result = []
+    for distance, pair, key, offset in sorted(heap, reverse=True):
+        first_cluster, second_cluster = clusters[first_indices[-pair]], clusters[second_indices[-pair]]
+        first_idx, second_idx = divmod(-key, len(second_cluster.buildings))
+        result.append(BuildingPair(
+            first_cluster_id=first_cluster.cluster_id,
+            second_cluster_id=second_cluster.cluster_id,
+            first_building_id=first_cluster.building_ids[first_idx],
+            second_building_id=second_cluster.building_ids[second_idx],
+            distance=-distance,
+            offset_m=offset
+        ))
+    return result
+
+
+def get_global_bounds(cluster: Cluster, cluster_position: ClusterPosition) -> np.ndarray:
+    """Габарит кластера в глобальных координатах: min_x, max_x, min_y, max_y."""
+    return np.array(cluster.local_bounds) + np.array([cluster_position.x, cluster_position.x,
+                                                      cluster_position.y, cluster_position.y])
+
+
+def _get_cluster_pair_lower_bounds(
+        clusters: List[Cluster],
+        positions: Dict[UUID, ClusterPosition],
+        building_offset_rules: Optional[BuildingOffsetRules]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Нижние оценки безразмерного расстояния для пар кластеров: расстояние между габаритами кластеров,
+    делённое на наибольший оффсет, который может встретиться между их сооружениями.
+
+    :return Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: индексы первых и вторых кластеров пар `i < j`,
+        оценки, габариты кластеров в глобальных координатах формы (N, 4)
+    """
+    first_max_offsets, second_max_offsets = get_max_offsets(clusters, building_offset_rules)
+
+    bounds = np.array([get_global_bounds(cluster, positions[cluster.cluster_id]) for cluster in clusters])
+    gaps = calculate_bounds_lower_bound(bounds[:, None, :], bounds[None, :, :])
+    max_offsets = np.minimum(first_max_offsets[:, None], second_max_offsets[None, :])
+    # при пересечении габаритов сооружения могут пересекаться, оценка снизу отсутствует
+    lower_bounds = np.where(gaps > 0, (gaps - LOWER_BOUND_TOLERANCE) / max_offsets, -np.inf)
+
+    first_indices, second_indices = np.triu_indices(len(clusters), k=1)
+    return first_indices, second_indices, lower_bounds[first_indices, second_indices], bounds
+
+
+def _get_heap_threshold(heap: List[Tuple[float, int, int, float]], k: int) -> float:
+    """Расстояние худшей пары в заполненной куче, пока куча не заполнена -- бесконечность."""
+    return -heap[0][0] if len(heap) >= k else np.inf
+
+
+def _add_closest_building_pairs(
+        heap: List[Tuple[float, int, int, float]],
+        k: int,
+        pair: int,
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        offsets: np.ndarray,
+        second_bounds: np.ndarray,
+        stats: PruningStats,
+        rows_per_step: int = DEFAULT_ROWS_PER_STEP
+) -> None:
+    """Добавляет в кучу размера `k` пары сооружений двух кластеров, которые могут в неё попасть."""
+    if not len(first_buildings) or not len(second_buildings):
+        return
+    gaps = calculate_bounds_lower_bound(get_building_bounds(first_buildings), second_bounds)
+    lower_bounds = np.where(gaps > 0, (gaps - LOWER_BOUND_TOLERANCE) / offsets.max(axis=1), -np.inf)
+    order = np.argsort(lower_bounds, kind='stable')
+
+    for start in range(0, len(order), rows_per_step):
+        rows = order[start:start + rows_per_step]
+        threshold = _get_heap_threshold(heap, k)
+        if lower_bounds[rows[0]] > threshold:
+            stats.buildings_pruned += len(order) - start
+            break
+        distances = (calculate_distance_matrix(first_buildings[rows], second_buildings) / offsets[rows]).ravel()
+        candidates = np.flatnonzero(distances <= threshold)
+        if len(candidates) > k:
+            # пары, расстояние которых равно k-му, остаются: среди них решает порядок перебора
+            candidates = candidates[distances[candidates] <= np.partition(distances[candidates], k - 1)[k - 1]]
+        row_idx, second_idx = np.divmod(candidates, len(second_buildings))
+        keys = rows[row_idx] * len(second_buildings) + second_idx
+        for distance, key in zip(distances[candidates].tolist(), keys.tolist()):
+            item = (-distance, -pair, -key, float(offsets.flat[key]))
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item[:3] > heap[0][:3]:
+                heapq.heapreplace(heap, item)
+
+
+def _find_min_normalized_distance(
+        first_buildings: np.ndarray,
+        second_buildings: np.ndarray,
+        offsets: np.ndarray,
+        second_bounds: np.ndarray,
+        upper_bound: float,
+        stats: PruningStats,
+        rows_per_step: int = DEFAULT_ROWS_PER_STEP
+) -> Tuple[float, float, int]:
+    """
+    Минимальное безразмерное расстояние, меньшее `upper_bound`.
+
+    Сооружения первого кластера перебираются по возрастанию нижней оценки: расстояния от габарита сооружения
+    до габарита второго кластера, делённого на наибольший оффсет сооружения. При равных расстояниях выбирается
+    пара с меньшим индексом, как при полном переборе.
+
+    :return Tuple[float, float, int]: безразмерное расстояние, оффсет, индекс пары в матрице (n, m) или -1,
+        если `upper_bound` не улучшен
+    """
+    if not len(first_buildings) or not len(second_buildings):
+        return np.inf, 0., -1
+    gaps = calculate_bounds_lower_bound(get_building_bounds(first_buildings), second_bounds)
+    lower_bounds = np.where(gaps > 0, (gaps - LOWER_BOUND_TOLERANCE) / offsets.max(axis=1), -np.inf)
+    order = np.argsort(lower_bounds, kind='stable')
+
+    min_distance = upper_bound
+    min_offset = 0.
+    min_key = -1
+    for start in range(0, len(order), rows_per_step):
+        rows = order[start:start + rows_per_step]
+        if lower_bounds[rows[0]] > min_distance:
+            stats.buildings_pruned += len(order) - start
+            break
+        distances = calculate_distance_matrix(first_buildings[rows], second_buildings) / offsets[rows]
+        distance = distances.min()
+        if distance > min_distance or (distance == min_distance and min_key == -1):
+            continue
+        row_idx, second_idx = np.nonzero(distances == distance)
+        keys = rows[row_idx] * len(second_buildings) + second_idx
+        key = int(keys.min())
+        if distance < min_distance or key < min_key:
+            min_distance = float(distance)
+            min_offset = float(offsets.flat[key])
+            min_key = key
+    return min_distance, min_offset, min_key
+
+
+def _get_offset_matrix_or_ones(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        building_offset_rules: Optional[BuildingOffsetRules]
+) -> np.ndarray:
+    if building_offset_rules is None:
+        return np.ones((len(first_cluster.buildings), len(second_cluster.buildings)))
+    return get_offset_matrix(first_cluster, second_cluster, building_offset_rules)
+
+
+def get_max_offsets(
+        clusters: List[Cluster],
+        building_offset_rules: Optional[BuildingOffsetRules]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Наибольшие оффсеты сооружений каждого кластера, когда кластер первый и когда второй в паре."""
+    if building_offset_rules is None:
+        return np.ones(len(clusters)), np.ones(len(clusters))
+    if isinstance(building_offset_rules, OFFSET_TABLE_TYPES):
+        first_building_max, second_building_max = building_offset_rules.get_building_max_offsets()
+        return (
+            np.array([first_building_max[building_offset_rules.get_indices(cluster.building_ids)].max(
+                initial=0.) for cluster in clusters]),
+            np.array([second_building_max[building_offset_rules.get_indices(cluster.building_ids)].max(
+                initial=0.) for cluster in clusters]),
+        )
+
+    first_max_offsets: Dict[UUID, float] = {}
+    second_max_offsets: Dict[UUID, float] = {}
+    for (first_building_id, second_building_id), offset in building_offset_rules.items():
+        first_max_offsets[first_building_id] = max(first_max_offsets.get(first_building_id, 0.), offset)
+        second_max_offsets[second_building_id] = max(second_max_offsets.get(second_building_id, 0.), offset)
+    return (
+        np.array([max((first_max_offsets.get(building_id, 0.) for building_id in cluster.building_ids),
+                      default=0.) for cluster in clusters]),
+        np.array([max((second_max_offsets.get(building_id, 0.) for building_id in cluster.building_ids),
+                      default=0.) for cluster in clusters]),
+    )
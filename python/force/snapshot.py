@@ -0,0 +1,364 @@
+import json
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from uuid import UUID
+
+import numpy as np
+from shapely.geometry import Point
+from shapely.geometry import mapping
+from shapely.geometry import shape
+
+from .model import Building
+from .model import BuildingCluster
+from .model import BuildingClusterWithPositions
+from .model import BuildingConnection
+from .model import BuildingOffsetRule
+from .model import Circle
+from .model import ConnectionPoint
+from .model import ConnectionType
+from .model import ExternalPoint
+from .model import FunctionalAreaType
+from .model import InputData
+from .model import Position
+from .model import Rectangle
+from .model import Solution
+
+SNAPSHOT_FORMAT = 'force-snapshot'
+SNAPSHOT_VERSION = 2
+HEADER_FILE = 'header.json'
+# столбцы массива положений: координаты центра и угол поворота
+X, Y, ANGLE = range(3)
+# виды фигур сооружений; размеры круга хранятся как габарит: диаметр по обеим осям
+CIRCLE, RECTANGLE = range(2)
+# виды кластеров
+PLAIN_CLUSTER, CLUSTER_WITH_POSITIONS = range(2)
+
+
+class Snapshot:
+    """Бинарный снимок `InputData` или `Solution`.
+
+    Снимок -- каталог с заголовком `header.json` и типизированными массивами в формате `.npy`. Массивы
+    открываются через `mmap`, поэтому процессы, читающие один снимок, разделяют страницы файлов, а время
+    открытия не зависит от размера площадки. Идентификаторы хранятся как байты UUID в массивах формы (N, 16),
+    ссылки между сущностями -- как индексы строк.
+
+    Массивы `InputData`:
+        :building_ids, building_functional_areas, building_figure_kinds, building_figure_sizes (ширина, длина),
+            building_labels, building_label_offsets: параметры сооружений.
+        :connection_point_ids, connection_point_building_ids, connection_point_coordinates,
+            connection_point_has_coordinates, connection_point_offsets: точки подключения, записанные подряд
+            по сооружениям; точки `i`-го сооружения -- строки
+            `connection_point_offsets[i]:connection_point_offsets[i + 1]`.
+            У пустых точек (`Point()`) координаты -- NaN, признак наличия координат -- `False`.
+        :connection_type_ids, connection_type_costs, connection_type_names, connection_type_name_offsets:
+            типы соединений.
+        Строки записываются подряд в кодировке UTF-8 в массив байтов, `i`-я строка -- байты
+        `offsets[i]:offsets[i + 1]`, поэтому заголовок не растет с размером площадки.
+        :offset_rule_building_indices, offset_rule_offsets: правила расстояний между сооружениями.
+        :connection_ids, connection_point_indices, connection_type_indices: соединения сооружений.
+        :cluster_ids, cluster_kinds, cluster_offsets, cluster_building_indices, cluster_positions: кластеры.
+        :external_point_ids, external_point_coordinates, external_point_has_coordinates, external_point_type_ids:
+            внешние точки.
+
+    Массивы `Solution`:
+        :position_building_ids, positions: положения сооружений.
+
+    Attributes:
+        :path (str): путь к каталогу снимка.
+        :header (dict): заголовок снимка.
+        :arrays (Dict[str, np.ndarray]): массивы снимка.
+
+    """
+
+    def __init__(self, path: str, header: dict, arrays: Dict[str, np.ndarray]):
+        self.path = path
+        self.header = header
+        self.arrays = arrays
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    @property
+    def kind(self) -> str:
+        return self.header['kind']
+
+    def to_input_data(self) -> InputData:
+        if self.kind != 'input_data':
+            raise ValueError(f'Snapshot {self.path} contains {self.kind}, not input_data')
+        building_ids = _to_uuids(self['building_ids'])
+        point_ids = _to_uuids(self['connection_point_ids'])
+        point_offsets = self['connection_point_offsets'].tolist()
+        point_coordinates = self['connection_point_coordinates'].tolist()
+        point_has_coordinates = self['connection_point_has_coordinates'].tolist()
+        type_ids = _to_uuids(self['connection_type_ids'])
+        point_building_ids = _to_uuids(self['connection_point_building_ids'])
+
+        buildings = [
+            Building(
+                id=building_id,
+                figure=_to_figure(kind, size),
+                functional_area=FunctionalAreaType(functional_area),
+                connection_points=[
+                    ConnectionPoint(id=point_ids[j], building_id=point_building_ids[j],
+                                    point_m=_to_point(point_coordinates[j], point_has_coordinates[j]))
+                    for j in range(point_offsets[i], point_offsets[i + 1])
+                ],
+                label=label
+            )
+            for i, (building_id, kind, size, functional_area, label) in enumerate(zip(
+                building_ids, self['building_figure_kinds'].tolist(), self['building_figure_sizes'].tolist(),
+                self['building_functional_areas'].tolist(),
+                _to_strings(self['building_labels'], self['building_label_offsets'])
+            ))
+        ]
+
+        cluster_offsets = self['cluster_offsets'].tolist()
+        cluster_building_indices = self['cluster_building_indices'].tolist()
+        cluster_positions = self['cluster_positions'].tolist()
+        building_clusters = []
+        for i, (cluster_id, kind) in enumerate(zip(_to_uuids(self['cluster_ids']), self['cluster_kinds'].tolist())):
+            members = range(cluster_offsets[i], cluster_offsets[i + 1])
+            if kind == CLUSTER_WITH_POSITIONS:
+                building_clusters.append(BuildingClusterWithPositions(id=cluster_id, positions=[
+                    _to_position(building_ids[cluster_building_indices[j]], cluster_positions[j]) for j in members
+                ]))
+            else:
+                building_clusters.append(BuildingCluster(
+                    id=cluster_id, building_ids=[building_ids[cluster_building_indices[j]] for j in members]
+                ))
+
+        return InputData(
+            development_area_m=shape(self.header['development_area_m']),
+            connection_types=[
+                ConnectionType(id=type_id, name=name, cost=cost)
+                for type_id, name, cost in zip(type_ids,
+                                               _to_strings(self['connection_type_names'],
+                                                           self['connection_type_name_offsets']),
+                                               self['connection_type_costs'].tolist())
+            ],
+            buildings=buildings,
+            building_clusters=building_clusters,
+            building_offset_rules=[
+                BuildingOffsetRule(first_building_id=building_ids[first], second_building_id=building_ids[second],
+                                   offset_m=offset)
+                for (first, second), offset in zip(self['offset_rule_building_indices'].tolist(),
+                                                   self['offset_rule_offsets'].tolist())
+            ],
+            building_connections=[
+                BuildingConnection(id=connection_id, source_connection_point_id=point_ids[source],
+                                   target_connection_point_id=point_ids[target],
+                                   connection_type_id=type_ids[type_index])
+                for connection_id, (source, target), type_index in zip(_to_uuids(self['connection_ids']),
+                                                                       self['connection_point_indices'].tolist(),
+                                                                       self['connection_type_indices'].tolist())
+            ],
+            external_points=[
+                ExternalPoint(id=point_id, point_m=_to_point(coordinates, has_coordinates),
+                              connection_point_type_id=type_id)
+                for point_id, coordinates, has_coordinates, type_id in zip(
+                    _to_uuids(self['external_point_ids']), self['external_point_coordinates'].tolist(),
+                    self['external_point_has_coordinates'].tolist(), _to_uuids(self['external_point_type_ids'])
+                )
+            ],
+            wind_rose_angle_deg=self.header['wind_rose_angle_deg']
+        )
+
+    def to_solution(self) -> Solution:
+        if self.kind != 'solution':
+            raise ValueError(f'Snapshot {self.path} contains {self.kind}, not solution')
+        return Solution(positions=[
+            _to_position(building_id, position)
+            for building_id, position in zip(_to_uuids(self['position_building_ids']), self['positions'].tolist())
+        ])
+
+
+def write_input_data_snapshot(data: InputData, path: str) -> None:
+    """
+    Записывает входные данные в бинарный снимок.
+
+    Правила расстояний, соединения и кластеры должны ссылаться на сооружения, точки подключения и типы
+    соединений из тех же входных данных.
+
+    :param data: входные данные
+    :param path: путь к каталогу снимка, создается при необходимости
+    """
+    building_indices = {building.id: i for i, building in enumerate(data.buildings)}
+    points = [point for building in data.buildings for point in building.connection_points]
+    point_indices = {point.id: i for i, point in enumerate(points)}
+    type_indices = {connection_type.id: i for i, connection_type in enumerate(data.connection_types)}
+
+    cluster_building_ids: List[UUID] = []
+    cluster_positions: List[List[float]] = []
+    for cluster in data.building_clusters:
+        if isinstance(cluster, BuildingClusterWithPositions):
+            cluster_building_ids.extend(position.building_id for position in cluster.positions)
+            cluster_positions.extend(_from_position(position) for position in cluster.positions)
+        else:
+            cluster_building_ids.extend(cluster.building_ids)
+            cluster_positions.extend([0., 0., 0.] for _ in cluster.building_ids)
+
+    header = {
+        'development_area_m': mapping(data.development_area_m),
+        'wind_rose_angle_deg': data.wind_rose_angle_deg,
+    }
+    building_labels, building_label_offsets = _from_strings(building.label for building in data.buildings)
+    connection_type_names, connection_type_name_offsets = _from_strings(
+        connection_type.name for connection_type in data.connection_types)
+    arrays = {
+        'building_ids': _from_uuids(building.id for building in data.buildings),
+        'building_functional_areas': np.array([b.functional_area for b in data.buildings], dtype=np.int8),
+        'building_figure_kinds': np.array([RECTANGLE if isinstance(b.figure, Rectangle) else CIRCLE
+                                           for b in data.buildings], dtype=np.int8),
+        'building_figure_sizes': _to_array([_from_figure(b.figure) for b in data.buildings], 2),
+        'building_labels': building_labels,
+        'building_label_offsets': building_label_offsets,
+        'connection_point_ids': _from_uuids(point.id for point in points),
+        'connection_point_building_ids': _from_uuids(point.building_id for point in points),
+        'connection_point_coordinates': _to_array([_from_point(p.point_m) for p in points], 2),
+        'connection_point_has_coordinates': np.array([not p.point_m.is_empty for p in points], dtype=bool),
+        'connection_point_offsets': np.cumsum([0] + [len(b.connection_points) for b in data.buildings],
+                                              dtype=np.int64),
+        'connection_type_ids': _from_uuids(connection_type.id for connection_type in data.connection_types),
+        'connection_type_costs': _to_array([t.cost for t in data.connection_types]),
+        'connection_type_names': connection_type_names,
+        'connection_type_name_offsets': connection_type_name_offsets,
+        'offset_rule_building_indices': _to_indices([
+            (_get_index(building_indices, rule.first_building_id, 'building'),
+             _get_index(building_indices, rule.second_building_id, 'building'))
+            for rule in data.building_offset_rules
+        ], 2),
+        'offset_rule_offsets': _to_array([rule.offset_m for rule in data.building_offset_rules]),
+        'connection_ids': _from_uuids(connection.id for connection in data.building_connections),
+        'connection_point_indices': _to_indices([
+            (_get_index(point_indices, c.source_connection_point_id, 'connection point'),
+             _get_index(point_indices, c.target_connection_point_id, 'connection point'))
+            for c in data.building_connections
+        ], 2),
+        'connection_type_indices': _to_indices([
+            _get_index(type_indices, c.connection_type_id, 'connection type') for c in data.building_connections
+        ]),
+        'cluster_ids': _from_uuids(cluster.id for cluster in data.building_clusters),
+        'cluster_kinds': np.array([CLUSTER_WITH_POSITIONS if isinstance(c, BuildingClusterWithPositions)
+                                   else PLAIN_CLUSTER for c in data.building_clusters], dtype=np.int8),
+        'cluster_offsets': np.cumsum([0] + [
+            len(c.positions) if isinstance(c, BuildingClusterWithPositions) else len(c.building_ids)
+            for c in data.building_clusters
+        ], dtype=np.int64),
+        'cluster_building_indices': _to_indices([
+            _get_index(building_indices, building_id, 'building') for building_id in cluster_building_ids
+        ]),
+        'cluster_positions': _to_array(cluster_positions, 3),
+        'external_point_ids': _from_uuids(point.id for point in data.external_points),
+        'external_point_coordinates': _to_array([_from_point(p.point_m) for p in data.external_points], 2),
+        'external_point_has_coordinates': np.array([not p.point_m.is_empty for p in data.external_points],
+                                                   dtype=bool),
+        'external_point_type_ids': _from_uuids(point.connection_point_type_id for point in data.external_points),
+    }
+    _write_snapshot(path, 'input_data', header, arrays)
+
+
+def write_solution_snapshot(solution: Solution, path: str) -> None:
+    _write_snapshot(path, 'solution', {}, {
+        'position_building_ids': _from_uuids(position.building_id for position in solution.positions),
+        'positions': _to_array([_from_position(position) for position in solution.positions], 3),
+    })
+
+
+def read_snapshot(path: str, mmap_mode: Optional[str] = 'r') -> Snapshot:
+    """
+    Открывает бинарный снимок.
+
+    :param path: путь к каталогу снимка
+    :param mmap_mode: режим `np.load`; `None` -- прочитать массивы в память
+    :return Snapshot: снимок
+    """
+    with open(os.path.join(path, HEADER_FILE)) as file:
+        header = json.load(file)
+    if header.get('format') != SNAPSHOT_FORMAT or header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f'Unsupported snapshot {path}: {header.get("format")} {header.get("version")}')
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in header['arrays']}
+    return Snapshot(path, header, arrays)
+
+
+def _write_snapshot(path: str, kind: str, header: dict, arrays: Dict[str, np.ndarray]) -> None:
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array, allow_pickle=False)
+    # заголовок пишется последним: снимок без заголовка не открывается
+    with open(os.path.join(path, HEADER_FILE), 'w') as file:
+        json.dump({'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION, 'kind': kind,
+                   'arrays': list(arrays), **header}, file, ensure_ascii=False)
+
+
+def _from_uuids(ids) -> np.ndarray:
+    return np.frombuffer(b''.join(uuid.bytes for uuid in ids), dtype=np.uint8).reshape(-1, 16)
+
+
+def _to_uuids(array: np.ndarray) -> List[UUID]:
+    data = array.tobytes()
+    return [UUID(bytes=data[i:i + 16]) for i in range(0, len(data), 16)]
+
+
+def _from_strings(strings) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.cumsum([0] + [len(data) for data in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _to_strings(array: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = array.tobytes()
+    offsets = offsets.tolist()
+    return [data[start:stop].decode('utf-8') for start, stop in zip(offsets, offsets[1:])]
+
+
+def _to_array(values: list, columns: Optional[int] = None) -> np.ndarray:
+    array = np.array(values, dtype=np.float64)
+    return array if columns is None else array.reshape(-1, columns)
+
+
+def _to_indices(values: list, columns: Optional[int] = None) -> np.ndarray:
+    array = np.array(values, dtype=np.int64)
+    return array if columns is None else array.reshape(-1, columns)
+
+
+def _get_index(indices: Dict[UUID, int], key: UUID, name: str) -> int:
+    try:
+        return indices[key]
+    except KeyError:
+        raise ValueError(f'Unknown {name} id {key}') from None
+
+
+def _from_figure(figure) -> List[float]:
+    if isinstance(figure, Rectangle):
+        return [figure.width_m, figure.length_m]
+    return [2 * figure.radius_m, 2 * figure.radius_m]
+
+
+def _to_figure(kind: int, size: List[float]):
+    if kind == RECTANGLE:
+        return Rectangle(width_m=size[0], length_m=size[1])
+    return Circle(radius_m=size[0] / 2)
+
+
+def _from_point(point: Point) -> List[float]:
+    # у пустой точки нет координат, `point.x` выбрасывает исключение
+    if point.is_empty:
+        return [np.nan, np.nan]
+    return [point.x, point.y]
+
+
+def _to_point(coordinates: List[float], has_coordinates: bool) -> Point:
+    return Point(coordinates) if has_coordinates else Point()
+
+
+def _from_position(position: Position) -> List[float]:
+    return [position.offset_x_m, position.offset_y_m, position.angle_deg]
+
+
+def _to_position(building_id: UUID, position: List[float]) -> Position:
+    return Position(building_id=building_id, offset_x_m=position[X], offset_y_m=position[Y],
+                    angle_deg=position[ANGLE])
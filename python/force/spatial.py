@@ -0,0 +1,228 @@
+from math import ceil
+from math import sqrt
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from .distance import X
+from .distance import Y
+from .distance import calculate_distance_matrix
+from .distance import calculate_paired_distances
+from .distance import get_building_array
+from .distance import get_building_bounds
+from .internal import Cluster
+from .internal import ClusterPosition
+
+# среднее количество сооружений в ячейке сетки
+DEFAULT_BUCKET_SIZE = 32
+# запас на погрешность округления при сравнении нижней оценки с найденным минимумом, м
+LOWER_BOUND_TOLERANCE = 1e-7
+
+
+class GridIndex:
+    """Равномерная сетка над габаритами сооружений кластера.
+
+    Сооружения раскладываются по ячейкам по положению центра, для каждой ячейки хранится общий габарит
+    (axis-aligned bounding box) её сооружений. Индекс строится в локальных координатах кластера и не зависит
+    от его положения.
+
+    Attributes:
+        :buildings (np.ndarray): массив сооружений в локальных координатах (см. `get_building_array`).
+        :cell_members (List[np.ndarray]): индексы сооружений каждой ячейки по возрастанию.
+        :cell_bounds (np.ndarray): габариты ячеек формы (k, 4): min_x, max_x, min_y, max_y.
+
+    """
+
+    def __init__(self, buildings: np.ndarray, bucket_size: int = DEFAULT_BUCKET_SIZE):
+        self.buildings = buildings
+        self.cell_members: List[np.ndarray] = []
+        self.cell_bounds = np.empty((0, 4))
+        if not len(buildings):
+            return
+
+        bounds = get_building_bounds(buildings)
+
+        side = ceil(sqrt(ceil(len(buildings) / bucket_size)))
+        cell_x = _get_cell_coordinate(buildings[:, X], side)
+        cell_y = _get_cell_coordinate(buildings[:, Y], side)
+        order = np.argsort(cell_x * side + cell_y, kind='stable')
+        _, starts = np.unique((cell_x * side + cell_y)[order], return_index=True)
+
+        self.cell_members = np.split(order, starts[1:])
+        self.cell_bounds = np.stack([
+            np.minimum.reduceat(bounds[order, 0], starts),
+            np.maximum.reduceat(bounds[order, 1], starts),
+            np.minimum.reduceat(bounds[order, 2], starts),
+            np.maximum.reduceat(bounds[order, 3], starts),
+        ], axis=1)
+
+    @classmethod
+    def from_cluster(cls, cluster: Cluster, bucket_size: int = DEFAULT_BUCKET_SIZE) -> 'GridIndex':
+        origin = ClusterPosition(cluster_id=cluster.cluster_id, x=0., y=0.)
+        return cls(get_building_array(cluster, origin), bucket_size)
+
+    def get_global_buildings(self, members: np.ndarray, cluster_position: ClusterPosition) -> np.ndarray:
+        buildings = self.buildings[members]
+        buildings[:, X] += cluster_position.x
+        buildings[:, Y] += cluster_position.y
+        return buildings
+
+    def get_global_cell_bounds(self, cluster_position: ClusterPosition) -> np.ndarray:
+        return self.cell_bounds + np.array([cluster_position.x, cluster_position.x, cluster_position.y,
+                                            cluster_position.y])
+
+
+def calculate_distance_between_two_clusters_indexed(
+        first_cluster: Cluster,
+        second_cluster: Cluster,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition
+) -> float:
+    """Аналог `calculate_distance_between_two_clusters`, использующий `GridIndex` для отсечения пар ячеек."""
+    distance, _ = calculate_min_distance_indexed(
+        GridIndex.from_cluster(first_cluster),
+        GridIndex.from_cluster(second_cluster),
+        first_cluster_position,
+        second_cluster_position
+    )
+    return distance
+
+
+def calculate_min_distance_indexed(
+        first_index: GridIndex,
+        second_index: GridIndex,
+        first_cluster_position: ClusterPosition,
+        second_cluster_position: ClusterPosition
+) -> Tuple[float, Tuple[int, int]]:
+    """
+    Минимальное расстояние между сооружениями двух кластеров.
+
+    Пары ячеек перебираются по возрастанию нижней оценки расстояния между их габаритами, перебор прекращается,
+    как только оценка превышает найденный минимум. Значение совпадает с полным перебором, при равных расстояниях
+    может быть возвращена другая пара сооружений.
+
+    :return Tuple[float, Tuple[int, int]]: расстояние, индексы пары сооружений
+    """
+    lower_bounds = calculate_bounds_lower_bound(
+        first_index.get_global_cell_bounds(first_cluster_position)[:, None, :],
+        second_index.get_global_cell_bounds(second_cluster_position)[None, :, :]
+    )
+
+    min_distance = np.inf
+    min_index = (-1, -1)
+    for flat in np.argsort(lower_bounds, axis=None, kind='stable'):
+        first_cell, second_cell = divmod(int(flat), lower_bounds.shape[1])
+        if lower_bounds[first_cell, second_cell] - LOWER_BOUND_TOLERANCE > min_distance:
+            break
+        first_members = first_index.cell_members[first_cell]
+        second_members = second_index.cell_members[second_cell]
+        distances = calculate_distance_matrix(
+            first_index.get_global_buildings(first_members, first_cluster_position),
+            second_index.get_global_buildings(second_members, second_cluster_position)
+        )
+        first_idx, second_idx = np.unravel_index(np.argmin(distances), distances.shape)
+        if distances[first_idx, second_idx] < min_distance:
+            min_distance = float(distances[first_idx, second_idx])
+            min_index = (int(first_members[first_idx]), int(second_members[second_idx]))
+
+    if min_index == (-1, -1):
+        raise ValueError('clusters must not be empty')
+    return min_distance, min_index
+
+
+def calculate_bounds_lower_bound(first_bounds: np.ndarray, second_bounds: np.ndarray) -> np.ndarray:
+    """Расстояние между габаритами (min_x, max_x, min_y, max_y), для пересекающихся габаритов равно 0."""
+    gap_x = np.maximum(0., np.maximum(first_bounds[..., 0] - second_bounds[..., 1],
+                                      second_bounds[..., 0] - first_bounds[..., 1]))
+    gap_y = np.maximum(0., np.maximum(first_bounds[..., 2] - second_bounds[..., 3],
+                                      second_bounds[..., 2] - first_bounds[..., 3]))
+    return np.sqrt(gap_x ** 2 + gap_y ** 2)
+
+
+def find_close_bounds_pairs(bounds: np.ndarray, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пары габаритов (min_x, max_x, min_y, max_y), расстояние между которыми не больше `cutoff`.
+
+    Габариты сортируются по min_x, кандидатами в пару для габарита служат следующие за ним габариты, пока их min_x
+    не больше его max_x + `cutoff` (sweep and prune по оси x), после чего кандидаты проверяются по расстоянию.
+
+    :return Tuple[np.ndarray, np.ndarray]: индексы первых и вторых габаритов пар, первый индекс меньше второго,
+        пары упорядочены по возрастанию индексов
+    """
+    order = np.argsort(bounds[:, 0], kind='stable')
+    ends = np.searchsorted(bounds[order, 0], bounds[order, 1] + cutoff, side='right')
+    counts = np.maximum(ends - np.arange(1, len(bounds) + 1), 0)
+    first_positions = np.repeat(np.arange(len(bounds)), counts)
+    second_positions = first_positions + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    first, second = order[first_positions], order[second_positions]
+    first, second = np.minimum(first, second), np.maximum(first, second)
+    close = calculate_bounds_lower_bound(bounds[first], bounds[second]) <= cutoff
+    first, second = first[close], second[close]
+    pair_order = np.lexsort((second, first))
+    return first[pair_order], second[pair_order]
+
+
+def find_overlapping_buildings(
+        buildings: np.ndarray,
+        cell_size: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Все пары пересекающихся сооружений площадки -- пары, расстояние между которыми
+    по `calculate_distance_between_two_buildings` равно -1.
+
+    Габариты сооружений раскладываются по равномерной сетке, каждое сооружение попадает во все ячейки, которые
+    покрывает его габарит. Пара проверяется только в ячейке, содержащей левый нижний угол пересечения габаритов,
+    поэтому каждая пара рассматривается один раз. Размер ячейки по умолчанию -- медиана большей стороны габаритов,
+    при нём количество кандидатов пропорционально количеству сооружений и пересечений.
+
+    :param buildings: массив сооружений в глобальных координатах формы (n, 5)
+    :param cell_size: размер ячейки сетки, м
+    :return Tuple[np.ndarray, np.ndarray]: индексы первых и вторых сооружений пар, первый индекс меньше второго,
+        пары упорядочены по возрастанию индексов
+    """
+    if len(buildings) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    bounds = get_building_bounds(buildings)
+    if cell_size is None:
+        cell_size = float(np.median(np.maximum(bounds[:, 1] - bounds[:, 0], bounds[:, 3] - bounds[:, 2])))
+    if not cell_size > 0:
+        # у вырожденных сооружений нет размера, все они попадают в ячейки своих центров
+        cell_size = 1.
+    mins, maxs = bounds[:, [0, 2]], bounds[:, [1, 3]]
+    origin = mins.min(axis=0)
+    # габариты расширяются на погрешность, чтобы угол пересечения попадал в ячейки обоих сооружений
+    low = np.floor((mins - LOWER_BOUND_TOLERANCE - origin) / cell_size).astype(np.int64) + 1
+    high = np.floor((maxs + LOWER_BOUND_TOLERANCE - origin) / cell_size).astype(np.int64) + 1
+    row_length = int(high[:, 0].max()) + 1
+
+    sizes = high - low + 1
+    counts = sizes[:, 0] * sizes[:, 1]
+    members = np.repeat(np.arange(len(buildings)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keys = (low[members, 1] + local // sizes[members, 0]) * row_length + low[members, 0] + local % sizes[members, 0]
+    order = np.argsort(keys, kind='stable')
+    keys, members = keys[order], members[order]
+
+    # все пары сооружений внутри каждой ячейки
+    counts = np.searchsorted(keys, keys, side='right') - np.arange(1, len(keys) + 1)
+    first_positions = np.repeat(np.arange(len(keys)), counts)
+    second_positions = first_positions + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    first, second = members[first_positions], members[second_positions]
+    corners = np.floor((np.maximum(mins[first], mins[second]) - origin) / cell_size).astype(np.int64) + 1
+    in_corner_cell = corners[:, 1] * row_length + corners[:, 0] == keys[first_positions]
+    first, second = first[in_corner_cell], second[in_corner_cell]
+
+    overlapping = calculate_paired_distances(buildings[first], buildings[second]) == -1.
+    first, second = first[overlapping], second[overlapping]
+    pair_order = np.lexsort((second, first))
+    return first[pair_order], second[pair_order]
+
+
+def _get_cell_coordinate(values: np.ndarray, side: int) -> np.ndarray:
+    span = values.max() - values.min()
+    if span == 0:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - values.min()) / span * side).astype(np.int64), side - 1)
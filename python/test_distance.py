@@ -0,0 +1,778 @@
+import random
+from math import sqrt
+from itertools import product
+from typing import Dict
+from typing import Tuple
+from uuid import UUID
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from shapely import affinity
+from shapely.geometry import Point
+from shapely.geometry import Polygon
+from shapely.geometry import box
+
+from force.area import SiteEvaluator
+from force.area import get_building_connection_types
+
+from force.distance import calculate_distance_between_two_buildings
+from force.distance import calculate_distance_between_two_clusters
+from force.distance import calculate_distance_between_two_clusters_vectorized
+from force.distance import calculate_distance_between_two_oriented_buildings
+from force.distance import calculate_distance_matrix
+from force.distance import calculate_distance_matrix_between_clusters
+from force.distance import calculate_min_distance
+from force.distance import calculate_min_normalized_distance
+from force.distance import calculate_normalized_distance_between_two_clusters
+from force.distance import calculate_normalized_distance_between_two_clusters_vectorized
+from force.distance import calculate_normalized_distance_matrix_between_clusters
+from force.distance import calculate_oriented_distance_between_two_clusters_vectorized
+from force.distance import calculate_oriented_distance_matrix
+from force.distance import eval_rotation
+from force.distance import find_cluster_pairs_closer_than
+from force.distance import get_building_array
+from force.distance import is_distance_between_two_clusters_less_than
+from force.distance import is_min_distance_less_than
+from force.distance import is_normalized_distance_between_two_clusters_less_than
+from force.internal import LENGTH
+from force.internal import WIDTH
+from force.internal import BuildingWrapper
+from force.internal import ClusterArray
+from force.internal import ClusterPosition
+from force.internal import ClusterShape
+from force.internal import ClusterShift
+from force.matrix import ClusterDistanceMatrix
+from force.model import Building
+from force.model import BuildingConnection
+from force.model import Circle
+from force.model import ConnectionPoint
+from force.model import ExternalPoint
+from force.model import FunctionalAreaType
+from force.model import Position
+from force.model import Rectangle
+from force.offsets import CompressedOffsetTable
+from force.offsets import OffsetTable
+from force.search import PruningStats
+from force.search import find_closest_building_pairs
+from force.search import find_closest_building_pairs_between_clusters
+from force.search import calculate_normalized_distance_between_two_clusters_pruned
+from force.search import find_closest_clusters
+from force.spatial import GridIndex
+from force.spatial import calculate_distance_between_two_clusters_indexed
+from force.spatial import calculate_min_distance_indexed
+from force.spatial import find_overlapping_buildings
+
+building_count = 60
+n_first_cluster = 25
+
+first_cluster_id = UUID('10000000-0000-0000-0000-000000000000')
+second_cluster_id = UUID('20000000-0000-0000-0000-000000000000')
+
+python_positions = [
+    Position(
+        offset_x_m=random.randint(0, 300),
+        offset_y_m=random.randint(0, 300),
+        angle_deg=random.choice([0, 90, 180, 270, 45])
+    )
+    for i in range(building_count)
+]
+
+python_figures = [
+    Rectangle(
+        width_m=random.randint(5, 30),
+        length_m=random.randint(5, 30),
+    )
+    for i in range(building_count)
+]
+
+python_buildings = [BuildingWrapper(
+    id=uuid4(),
+    label='',
+    local_position=python_positions[i],
+    figure=python_figures[i],
+    connection_points=[])
+    for i in range(building_count)]
+
+python_first_cluster = ClusterShape(
+    cluster_id=first_cluster_id,
+    buildings=python_buildings[:n_first_cluster],
+    functional_area=FunctionalAreaType.ONE,
+    figure=python_figures[0]
+)
+
+python_second_cluster = ClusterShape(
+    cluster_id=second_cluster_id,
+    buildings=python_buildings[n_first_cluster:],
+    functional_area=FunctionalAreaType.ONE,
+    figure=python_figures[0]
+)
+
+python_first_cluster_position = ClusterPosition(cluster_id=first_cluster_id, x=random.randint(0, 100),
+                                                y=random.randint(0, 100))
+python_second_cluster_position = ClusterPosition(cluster_id=second_cluster_id, x=random.randint(0, 100),
+                                                 y=random.randint(0, 100))
+
+building_offset_rules: Dict[Tuple[UUID, UUID], float] = {}
+for b1, b2 in product(python_buildings, python_buildings):
+    if b1.id != b2.id:
+        offset = random.randint(1, 100)
+        building_offset_rules[(b1.id, b2.id)] = offset
+        building_offset_rules[(b2.id, b1.id)] = offset
+
+first_buildings = get_building_array(python_first_cluster, python_first_cluster_position)
+second_buildings = get_building_array(python_second_cluster, python_second_cluster_position)
+
+
+def test_equals_distance_matrix():
+    """
+    check for equals distance matrix and distance between buildings
+    """
+    distances = calculate_distance_matrix(first_buildings, second_buildings)
+    for i, j in product(range(n_first_cluster), range(building_count - n_first_cluster)):
+        first_building = python_first_cluster.buildings[i]
+        second_building = python_second_cluster.buildings[j]
+        first_position = Position(offset_x_m=first_building.local_position.offset_x_m + python_first_cluster_position.x,
+                                  offset_y_m=first_building.local_position.offset_y_m + python_first_cluster_position.y,
+                                  angle_deg=first_building.local_position.angle_deg)
+        second_position = Position(
+            offset_x_m=second_building.local_position.offset_x_m + python_second_cluster_position.x,
+            offset_y_m=second_building.local_position.offset_y_m + python_second_cluster_position.y,
+            angle_deg=second_building.local_position.angle_deg)
+        assert distances[i, j] == calculate_distance_between_two_buildings(
+            first_building.figure, second_building.figure, first_position, second_position)
+
+
+def test_equals_distance_clusters_vectorized():
+    """
+    check for equals distance between clusters in python and numpy
+    """
+    python_result = calculate_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+    numpy_result = calculate_distance_between_two_clusters_vectorized(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+    assert numpy_result == python_result
+
+
+def test_equals_normalized_distance_clusters_vectorized():
+    """
+    check for equals normalized distance between clusters in python and numpy
+    """
+    python_result = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    numpy_result = calculate_normalized_distance_between_two_clusters_vectorized(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    assert numpy_result == python_result
+
+
+def test_equals_normalized_distance_clusters_offset_table():
+    """
+    check for equals normalized distance between clusters with offset dict and dense offset table
+    """
+    offset_table = OffsetTable.from_rules(building_offset_rules)
+    python_result = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    numpy_result = calculate_normalized_distance_between_two_clusters_vectorized(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        offset_table)
+    assert numpy_result == python_result
+    assert find_closest_clusters([python_first_cluster, python_second_cluster],
+                                 [python_first_cluster_position, python_second_cluster_position],
+                                 offset_table).distance == python_result[0]
+
+    first_indices = offset_table.get_indices(building.id for building in python_first_cluster.buildings)
+    with pytest.raises(KeyError):
+        offset_table.get_offset_matrix(first_indices, first_indices)
+
+
+def test_distance_matrix_between_clusters():
+    """
+    check that all-pairs cluster matrices match pairwise python results
+    """
+    clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 15], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 15)
+    ]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=150. * i, y=50. * i)
+                 for i, cluster in enumerate(clusters)]
+    distances = calculate_distance_matrix_between_clusters(clusters, positions)
+    normalized_distances, offsets = calculate_normalized_distance_matrix_between_clusters(
+        clusters, positions, OffsetTable.from_rules(building_offset_rules))
+    assert np.isinf(np.diag(distances)).all()
+    for i, j in product(range(len(clusters)), range(len(clusters))):
+        if i >= j:
+            continue
+        assert distances[i, j] == distances[j, i] == calculate_distance_between_two_clusters(
+            clusters[i], clusters[j], positions[i], positions[j])
+        assert (normalized_distances[i, j], offsets[i, j]) == calculate_normalized_distance_between_two_clusters(
+            clusters[i], clusters[j], positions[i], positions[j], building_offset_rules)
+
+
+def test_chunked_min_distance():
+    """
+    check that chunked evaluation gives the same minimum as the full distance matrix
+    """
+    distances = calculate_distance_matrix(first_buildings, second_buildings)
+    offsets = np.random.randint(1, 100, size=distances.shape).astype(np.float64)
+    normalized = distances / offsets
+
+    min_distance, (i, j) = calculate_min_distance(first_buildings, second_buildings, chunk_size=7)
+    assert min_distance == distances.min()
+    assert (i, j) == np.unravel_index(np.argmin(distances), distances.shape)
+
+    min_distance, min_offset, (i, j) = calculate_min_normalized_distance(
+        first_buildings, second_buildings, offsets, chunk_size=7)
+    assert min_distance == normalized.min()
+    assert min_offset == offsets[i, j]
+    assert (i, j) == np.unravel_index(np.argmin(normalized), normalized.shape)
+
+
+def test_equals_distance_clusters_indexed():
+    """
+    check for equals distance between clusters in python and grid index
+    """
+    python_result = calculate_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+    indexed_result = calculate_distance_between_two_clusters_indexed(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+    assert indexed_result == python_result
+
+
+def test_min_distance_indexed():
+    """
+    check that grid index gives the same minimum and pair as the full scan for separated and overlapping clusters
+    """
+    first_index = GridIndex.from_cluster(python_first_cluster, bucket_size=4)
+    second_index = GridIndex.from_cluster(python_second_cluster, bucket_size=4)
+    for second_x in (python_second_cluster_position.x, 500., 2000.):
+        second_position = ClusterPosition(cluster_id=second_cluster_id, x=second_x, y=python_second_cluster_position.y)
+        second_buildings_moved = get_building_array(python_second_cluster, second_position)
+        expected, _ = calculate_min_distance(first_buildings, second_buildings_moved)
+        distance, (i, j) = calculate_min_distance_indexed(first_index, second_index, python_first_cluster_position,
+                                                          second_position)
+        assert distance == expected
+        assert calculate_distance_matrix(first_buildings, second_buildings_moved)[i, j] == distance
+
+
+def test_equals_normalized_distance_clusters_pruned():
+    """
+    check for equals normalized distance between clusters in python and branch-and-bound
+    """
+    for second_x in (python_second_cluster_position.x, 500., 2000.):
+        second_position = ClusterPosition(cluster_id=second_cluster_id, x=second_x, y=python_second_cluster_position.y)
+        python_result = calculate_normalized_distance_between_two_clusters(
+            python_first_cluster, python_second_cluster, python_first_cluster_position, second_position,
+            building_offset_rules)
+        pruned_result = calculate_normalized_distance_between_two_clusters_pruned(
+            python_first_cluster, python_second_cluster, python_first_cluster_position, second_position,
+            building_offset_rules)
+        assert pruned_result == python_result
+
+
+def test_find_closest_clusters():
+    """
+    check that branch-and-bound search over many clusters finds the brute force minimum and prunes far pairs
+    """
+    clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 10], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 10)
+    ]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=1000. * i, y=(i % 2) * 100.)
+                 for i, cluster in enumerate(clusters)]
+
+    expected = min(
+        (calculate_normalized_distance_between_two_clusters(clusters[i], clusters[j], positions[i], positions[j],
+                                                            building_offset_rules), i, j)
+        for i in range(len(clusters)) for j in range(i + 1, len(clusters))
+    )
+    result = find_closest_clusters(clusters, positions, building_offset_rules)
+    assert (result.distance, result.offset_m) == expected[0]
+    assert (result.first_cluster_id, result.second_cluster_id) == (clusters[expected[1]].cluster_id,
+                                                                   clusters[expected[2]].cluster_id)
+    assert result.stats.cluster_pairs_pruned > 0
+    assert result.stats.cluster_pairs + result.stats.cluster_pairs_pruned == len(clusters) * (len(clusters) - 1) // 2
+
+    result = find_closest_clusters(clusters, positions)
+    assert result.distance == min(
+        calculate_distance_between_two_clusters(clusters[i], clusters[j], positions[i], positions[j])
+        for i in range(len(clusters)) for j in range(i + 1, len(clusters))
+    )
+
+
+def test_pruning_stats():
+    """
+    check that buildings of a long cluster far from the second cluster are pruned
+    """
+    long_buildings = [
+        BuildingWrapper(id=uuid4(), label='', figure=Rectangle(width_m=10., length_m=10.),
+                        local_position=Position(offset_x_m=20. * i, offset_y_m=0.), connection_points=[])
+        for i in range(300)
+    ]
+    long_cluster = ClusterShape(cluster_id=uuid4(), buildings=long_buildings, functional_area=FunctionalAreaType.ONE,
+                                figure=python_figures[0])
+    long_cluster_position = ClusterPosition(cluster_id=long_cluster.cluster_id, x=0., y=0.)
+    second_position = ClusterPosition(cluster_id=second_cluster_id, x=7000., y=0.)
+    offset_rules = {(first.id, second.id): 10. for first, second in product(long_buildings, python_buildings)}
+
+    stats = PruningStats()
+    pruned_result = calculate_normalized_distance_between_two_clusters_pruned(
+        long_cluster, python_second_cluster, long_cluster_position, second_position, offset_rules, stats)
+    assert pruned_result == calculate_normalized_distance_between_two_clusters(
+        long_cluster, python_second_cluster, long_cluster_position, second_position, offset_rules)
+    assert stats.buildings_pruned > 0
+
+
+def test_incremental_distance_matrix():
+    """
+    check that the matrix updated by cluster shifts equals the matrix recomputed from scratch
+    """
+    clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 6], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 6)
+    ]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=200. * i, y=0.) for i, cluster in enumerate(clusters)]
+    matrix = ClusterDistanceMatrix(clusters, positions, building_offset_rules)
+
+    for _ in range(5):
+        moved = random.sample(clusters, 3)
+        shifts = [ClusterShift(cluster_id=cluster.cluster_id, dx=random.uniform(-150, 150), dy=random.uniform(-50, 50))
+                  for cluster in moved]
+        # repeated shifts of the same cluster in one batch are summed up
+        shifts.append(ClusterShift(cluster_id=moved[0].cluster_id, dx=10., dy=-10.))
+        matrix.apply_shifts(shifts)
+
+        distances, offsets = calculate_normalized_distance_matrix_between_clusters(clusters, matrix.positions,
+                                                                                   building_offset_rules)
+        assert np.array_equal(matrix.distances, distances)
+        assert np.array_equal(matrix.offsets, offsets)
+        first, second = np.unravel_index(np.argmin(distances), distances.shape)
+        assert matrix.min_distance == distances[first, second]
+        assert matrix.min_offset == offsets[first, second]
+        assert matrix.closest_clusters == (clusters[first].cluster_id, clusters[second].cluster_id)
+
+
+def test_cluster_array():
+    """
+    check that ClusterArray converts to and from ClusterShape and gives the same distances
+    """
+    first_array = ClusterArray.from_cluster_shape(python_first_cluster)
+    second_array = ClusterArray.from_cluster_shape(python_second_cluster)
+    assert first_array.to_cluster_shape() == python_first_cluster
+    assert np.array_equal(first_array.get_global_buildings(python_first_cluster_position), first_buildings)
+    assert first_array.local_bounds == python_first_cluster.local_bounds
+
+    assert calculate_normalized_distance_between_two_clusters_vectorized(
+        first_array, second_array, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules) == calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    assert calculate_normalized_distance_between_two_clusters_pruned(
+        first_array, second_array, python_first_cluster_position, python_second_cluster_position,
+        OffsetTable.from_rules(building_offset_rules)) == calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    assert calculate_distance_between_two_clusters_indexed(
+        first_array, second_array, python_first_cluster_position, python_second_cluster_position
+    ) == calculate_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+
+    positions = [python_first_cluster_position, python_second_cluster_position]
+    assert np.array_equal(
+        calculate_normalized_distance_matrix_between_clusters([first_array, second_array], positions,
+                                                              building_offset_rules)[0],
+        calculate_normalized_distance_matrix_between_clusters([python_first_cluster, python_second_cluster],
+                                                              positions, building_offset_rules)[0])
+    result = find_closest_clusters([first_array, second_array], positions, building_offset_rules)
+    assert (result.distance, result.offset_m) == calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+
+
+def test_local_bounds_follow_building_changes():
+    """
+    check that cluster local bounds are recomputed after the buildings of the cluster change
+    """
+    building = BuildingWrapper(id=uuid4(), label='', figure=Rectangle(width_m=2., length_m=4.),
+                               local_position=Position(offset_x_m=0., offset_y_m=0.), connection_points=[])
+    cluster = ClusterShape(cluster_id=uuid4(), functional_area=FunctionalAreaType.ONE, figure=python_figures[0],
+                           buildings=[building])
+    assert cluster.local_bounds == (-2., 2., -1., 1.)
+    building.local_position.offset_x_m = 10.
+    assert cluster.local_bounds == (8., 12., -1., 1.)
+
+    cluster_array = ClusterArray.from_cluster_shape(cluster)
+    cluster_array.buildings[0, LENGTH] = 8.
+    assert cluster_array.local_bounds == (6., 14., -1., 1.)
+
+
+def test_circle_buildings():
+    """
+    check that circles give exact distances and the same results in scalar, vectorized and indexed functions
+    """
+    circle, square = Circle(radius_m=2.), Rectangle(width_m=2., length_m=4.)
+    assert calculate_distance_between_two_buildings(
+        circle, Circle(radius_m=1.), Position(offset_x_m=0., offset_y_m=0.), Position(offset_x_m=10., offset_y_m=0.)
+    ) == 7.
+    assert calculate_distance_between_two_buildings(
+        circle, square, Position(offset_x_m=0., offset_y_m=0.), Position(offset_x_m=5., offset_y_m=4.)
+    ) == pytest.approx(sqrt(18) - 2)
+    assert calculate_distance_between_two_buildings(
+        square, circle, Position(offset_x_m=3., offset_y_m=1., angle_deg=90.), Position(offset_x_m=0., offset_y_m=0.)
+    ) == 0.
+    assert calculate_distance_between_two_buildings(
+        square, circle, Position(offset_x_m=3., offset_y_m=1.), Position(offset_x_m=0., offset_y_m=0.)
+    ) == -1.
+    # круг считается выровненным при любом угле, но его поворот не округляется
+    cos, sin = eval_rotation(np.array([[0., 0., 45., -4., 4.], [0., 0., 90., -4., 4.]]))
+    assert cos == pytest.approx([sqrt(0.5), 0.]) and sin == pytest.approx([sqrt(0.5), 1.])
+    assert cos[1] == 0.
+
+    clusters = [
+        ClusterShape(
+            cluster_id=cluster.cluster_id, functional_area=cluster.functional_area, figure=cluster.figure,
+            buildings=[
+                BuildingWrapper(id=building.id, label='', local_position=building.local_position,
+                                figure=Circle(radius_m=building.figure.width_m / 2) if i % 3 else building.figure,
+                                connection_points=[])
+                for i, building in enumerate(cluster.buildings)
+            ]
+        )
+        for cluster in (python_first_cluster, python_second_cluster)
+    ]
+    positions = [python_first_cluster_position, python_second_cluster_position]
+    assert ClusterArray.from_cluster_shape(clusters[0]).to_cluster_shape() == clusters[0]
+    distance = calculate_distance_between_two_clusters(*clusters, *positions)
+    assert calculate_distance_between_two_clusters_vectorized(*clusters, *positions) == distance
+    assert calculate_distance_between_two_clusters_indexed(*clusters, *positions) == distance
+    assert calculate_oriented_distance_between_two_clusters_vectorized(*clusters, *positions) <= distance
+    normalized = calculate_normalized_distance_between_two_clusters(*clusters, *positions, building_offset_rules)
+    assert calculate_normalized_distance_between_two_clusters_vectorized(
+        *clusters, *positions, building_offset_rules) == normalized
+    assert calculate_normalized_distance_between_two_clusters_pruned(
+        *clusters, *positions, OffsetTable.from_rules(building_offset_rules)) == normalized
+
+
+# benchmarks
+def test_distance_clusters_vectorized(benchmark):
+    benchmark(calculate_distance_between_two_clusters_vectorized,
+              python_first_cluster, python_second_cluster,
+              python_first_cluster_position, python_second_cluster_position)
+
+
+def test_distance_normalized_clusters_vectorized(benchmark):
+    benchmark(calculate_normalized_distance_between_two_clusters_vectorized,
+              python_first_cluster, python_second_cluster,
+              python_first_cluster_position, python_second_cluster_position,
+              building_offset_rules)
+
+
+def test_distance_clusters_indexed(benchmark):
+    benchmark(calculate_distance_between_two_clusters_indexed,
+              python_first_cluster, python_second_cluster,
+              python_first_cluster_position, python_second_cluster_position)
+
+
+def test_building_array_cluster_shape(benchmark):
+    benchmark(get_building_array, python_second_cluster, python_second_cluster_position)
+
+
+def test_building_array_cluster_array(benchmark):
+    benchmark(get_building_array, ClusterArray.from_cluster_shape(python_second_cluster),
+              python_second_cluster_position)
+
+
+def test_compressed_offset_table(tmp_path):
+    """
+    check that the compressed offset table keeps type defaults and exceptions and matches the dense table
+    """
+    building_types = {building.id: i % 3 for i, building in enumerate(python_buildings)}
+    type_offsets = [[10., 20., 30.], [20., 40., 50.], [30., 50., 60.]]
+    rules = {(b1.id, b2.id): type_offsets[building_types[b1.id]][building_types[b2.id]]
+             for b1, b2 in product(python_buildings, python_buildings)}
+    for b1, b2 in zip(python_buildings[::7], python_buildings[1::7]):
+        rules[(b1.id, b2.id)] = rules[(b2.id, b1.id)] = 7.
+
+    table = CompressedOffsetTable.from_rules(rules, building_types)
+    assert table.type_offsets.tolist() == type_offsets
+    assert len(table.exception_offsets) == len(python_buildings[1::7])
+    dense_table = OffsetTable.from_rules(rules)
+    all_ids = [building.id for building in python_buildings]
+    expected = dense_table.get_offset_matrix(dense_table.get_indices(all_ids), dense_table.get_indices(all_ids))
+    assert np.array_equal(table.get_offset_matrix(table.get_indices(all_ids), table.get_indices(all_ids)), expected)
+    assert table.get_offset(1, 0) == table.get_offset(0, 1) == 7.
+    assert table.get_offset(2, 3) == 30.
+    assert table.get_building_max_offsets()[0].tolist() == expected.max(axis=1).tolist()
+
+    table.save(str(tmp_path))
+    loaded = CompressedOffsetTable.load(str(tmp_path))
+    assert isinstance(loaded.type_offsets, np.memmap)
+    assert loaded.building_ids == table.building_ids
+    assert calculate_normalized_distance_between_two_clusters_vectorized(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        loaded) == calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        rules)
+
+    rules[(all_ids[0], all_ids[1])] = 8.
+    with pytest.raises(ValueError):
+        CompressedOffsetTable.from_rules(rules, building_types)
+
+
+def test_closest_building_pairs():
+    """
+    check that the k closest building pairs equal sorted brute force results across clusters
+    """
+    clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 15], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 15)
+    ]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=200. * i, y=30. * i)
+                 for i, cluster in enumerate(clusters)]
+    expected = []
+    for i, j in product(range(len(clusters)), range(len(clusters))):
+        if i >= j:
+            continue
+        distances = calculate_distance_matrix(get_building_array(clusters[i], positions[i]),
+                                              get_building_array(clusters[j], positions[j]))
+        for (a, first), (b, second) in product(enumerate(clusters[i].buildings), enumerate(clusters[j].buildings)):
+            offset = building_offset_rules[(first.id, second.id)]
+            expected.append((distances[a, b] / offset, first.id, second.id, offset))
+    expected.sort(key=lambda item: item[0])
+
+    for k in (1, 10, 200):
+        stats = PruningStats()
+        pairs = find_closest_building_pairs_between_clusters(clusters, positions, building_offset_rules, k, stats)
+        assert [(p.distance, p.first_building_id, p.second_building_id, p.offset_m) for p in pairs] == expected[:k]
+    assert stats.cluster_pairs + stats.cluster_pairs_pruned == len(clusters) * (len(clusters) - 1) // 2
+
+    pairs = find_closest_building_pairs(python_first_cluster, python_second_cluster, python_first_cluster_position,
+                                        python_second_cluster_position, OffsetTable.from_rules(building_offset_rules),
+                                        k=3)
+    assert (pairs[0].distance, pairs[0].offset_m) == calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    assert pairs[0].distance <= pairs[1].distance <= pairs[2].distance
+    with pytest.raises(ValueError):
+        find_closest_building_pairs_between_clusters(clusters, positions, k=0)
+
+
+def test_closer_than_threshold():
+    """
+    check that threshold predicates agree with the exact minimum distances for single and batched cluster pairs
+    """
+    distance = calculate_distance_between_two_clusters(python_first_cluster, python_second_cluster,
+                                                       python_first_cluster_position, python_second_cluster_position)
+    normalized, _ = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    for threshold in (-2., 0., 0.5, 1., 10., distance, normalized, np.nextafter(distance, np.inf), np.inf):
+        assert is_distance_between_two_clusters_less_than(
+            python_first_cluster, python_second_cluster, python_first_cluster_position,
+            python_second_cluster_position, threshold) == (distance < threshold)
+        assert is_normalized_distance_between_two_clusters_less_than(
+            python_first_cluster, python_second_cluster, python_first_cluster_position,
+            python_second_cluster_position, threshold, building_offset_rules) == (normalized < threshold)
+    assert not is_min_distance_less_than(first_buildings[:0], second_buildings, np.inf)
+
+    clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 10], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 10)
+    ]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=200. * i, y=(i % 2) * 100.)
+                 for i, cluster in enumerate(clusters)]
+    pairs = np.array(list(zip(*np.triu_indices(len(clusters), k=1))))
+    distances, _ = calculate_normalized_distance_matrix_between_clusters(clusters, positions, building_offset_rules)
+    for threshold in (0., 1., 3.):
+        mask = find_cluster_pairs_closer_than(clusters, positions, pairs, threshold, building_offset_rules)
+        assert mask.tolist() == (distances[pairs[:, 0], pairs[:, 1]] < threshold).tolist()
+    distances = calculate_distance_matrix_between_clusters(clusters, positions)
+    mask = find_cluster_pairs_closer_than(clusters, positions, pairs, 50.)
+    assert mask.tolist() == (distances[pairs[:, 0], pairs[:, 1]] < 50.).tolist()
+    assert find_cluster_pairs_closer_than(clusters, positions, np.empty((0, 2)), 1.).shape == (0,)
+
+
+@pytest.mark.parametrize('method', ['exact', 'predicate'])
+def test_site_feasibility(benchmark, method):
+    buildings = make_site_buildings(4000, 400.)
+    if method == 'exact':
+        benchmark(lambda: calculate_min_distance(buildings[:2000], buildings[2000:])[0] < 10.)
+    else:
+        benchmark(is_min_distance_less_than, buildings[:2000], buildings[2000:], 10.)
+
+
+def make_oriented_buildings(angles: np.ndarray, size_m: float = 60.) -> np.ndarray:
+    rng = np.random.default_rng(len(angles))
+    return np.stack([
+        rng.uniform(0, size_m, len(angles)),
+        rng.uniform(0, size_m, len(angles)),
+        angles,
+        rng.uniform(2, 20, len(angles)),
+        rng.uniform(2, 20, len(angles)),
+    ], axis=1)
+
+
+def test_oriented_distance_matrix():
+    """
+    check that oriented distances equal shapely distances between rotated polygons and the axis-aligned formula
+    """
+    def to_polygon(building):
+        x, y, angle, width, length = building
+        # поворот по часовой стрелке, в shapely положительный угол -- против часовой
+        return affinity.rotate(box(x - length / 2, y - width / 2, x + length / 2, y + width / 2), -angle,
+                               origin=(x, y))
+
+    first = make_oriented_buildings(np.random.default_rng(1).uniform(0, 360, 40))
+    second = make_oriented_buildings(np.array([0., 90., 30., 180., 270., 45., 135.5, -90., -270.] * 4))
+    distances = calculate_oriented_distance_matrix(first, second)
+    for i, j in product(range(len(first)), range(len(second))):
+        first_polygon, second_polygon = to_polygon(first[i]), to_polygon(second[j])
+        if first_polygon.intersection(second_polygon).area > 1e-9:
+            assert distances[i, j] == -1.
+        else:
+            assert distances[i, j] == pytest.approx(first_polygon.distance(second_polygon), abs=1e-9)
+    assert (distances == -1.).any()
+
+    aligned = make_oriented_buildings(np.array([0., 90., 180., 270., 360., -90., -270.] * 6))
+    assert np.array_equal(calculate_oriented_distance_matrix(aligned, aligned[::-1]),
+                          calculate_distance_matrix(aligned, aligned[::-1]))
+    assert np.array_equal(calculate_oriented_distance_matrix(first, aligned)[:, 0],
+                          calculate_oriented_distance_matrix(first, aligned[:1])[:, 0])
+
+    min_distance, (i, j) = calculate_min_distance(first, second, chunk_size=100, oriented=True)
+    assert min_distance == distances.min() == distances[i, j]
+    first_position = Position(offset_x_m=first[0, 0], offset_y_m=first[0, 1], angle_deg=first[0, 2])
+    second_position = Position(offset_x_m=second[2, 0], offset_y_m=second[2, 1], angle_deg=second[2, 2])
+    assert calculate_distance_between_two_oriented_buildings(
+        Rectangle(width_m=first[0, 3], length_m=first[0, 4]), Rectangle(width_m=second[2, 3], length_m=second[2, 4]),
+        first_position, second_position
+    ) == distances[0, 2]
+    assert calculate_oriented_distance_between_two_clusters_vectorized(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position
+    ) == calculate_min_distance(first_buildings, second_buildings, oriented=True)[0]
+
+
+@pytest.mark.parametrize('angles', ['axis_aligned', 'oriented'])
+def test_oriented_distance_matrix_speed(benchmark, angles):
+    choices = [0., 90., 180., 270.] if angles == 'axis_aligned' else [0., 30., 45., 90.]
+    buildings = make_oriented_buildings(np.random.default_rng(2).choice(choices, 1000), 1000.)
+    benchmark(calculate_oriented_distance_matrix, buildings, buildings)
+
+
+def make_site_buildings(count: int, size_m: float = 1000.) -> np.ndarray:
+    rng = np.random.default_rng(count)
+    return np.stack([
+        rng.uniform(0, size_m, count),
+        rng.uniform(0, size_m, count),
+        rng.choice([0., 90., 45.], count),
+        rng.uniform(5, 30, count),
+        rng.uniform(5, 30, count),
+    ], axis=1)
+
+
+def test_find_overlapping_buildings():
+    """
+    check that grid overlap detection finds exactly the pairs with distance -1
+    """
+    for buildings in (make_site_buildings(500), make_site_buildings(300, 100.), first_buildings):
+        distances = calculate_distance_matrix(buildings, buildings)
+        expected_first, expected_second = np.nonzero(np.triu(distances == -1, 1))
+        for cell_size in (None, 3., 500.):
+            first, second = find_overlapping_buildings(buildings, cell_size)
+            assert first.tolist() == expected_first.tolist() and second.tolist() == expected_second.tolist()
+
+    # касающиеся сооружения не пересекаются
+    touching = np.array([[0., 0., 0., 10., 10.], [10., 0., 0., 10., 10.], [5., 5., 0., 10., 10.]])
+    assert [pair.tolist() for pair in find_overlapping_buildings(touching)] == [[0, 1], [2, 2]]
+    assert [len(pair) for pair in find_overlapping_buildings(touching[:1])] == [0, 0]
+
+
+@pytest.mark.parametrize('method', ['matrix', 'grid'])
+def test_site_overlaps(benchmark, method):
+    buildings = make_site_buildings(3000, 2000.)
+    if method == 'matrix':
+        benchmark(lambda: np.nonzero(np.triu(calculate_distance_matrix(buildings, buildings) == -1, 1)))
+    else:
+        benchmark(find_overlapping_buildings, buildings)
+
+
+site_area = Polygon([(0., 0.), (300., 0.), (300., 200.), (150., 260.), (0., 200.)],
+                    [[(100., 80.), (180., 80.), (180., 140.), (100., 140.)]])
+
+
+def test_site_area_check():
+    """
+    check containment and boundary distances of rotated rectangles and circles against shapely
+    """
+    rng = np.random.default_rng(3)
+    buildings = make_oriented_buildings(rng.uniform(0, 360, 500), 300.)
+    buildings[::3, WIDTH] = -buildings[::3, LENGTH]
+    evaluator = SiteEvaluator(site_area, [])
+
+    contained, distances = evaluator.check_buildings(buildings, chunk_size=1000)
+    for building, is_contained, distance in zip(buildings, contained, distances):
+        x, y, angle, width, length = building
+        if width < 0:
+            center_distance = site_area.boundary.distance(Point(x, y))
+            assert is_contained == (site_area.contains(Point(x, y)) and center_distance >= length / 2)
+            assert distance == pytest.approx(max(center_distance - length / 2, 0.), abs=1e-9)
+        else:
+            polygon = affinity.rotate(box(x - length / 2, y - width / 2, x + length / 2, y + width / 2), -angle,
+                                      origin=(x, y))
+            assert is_contained == site_area.covers(polygon)
+            assert distance == pytest.approx(site_area.boundary.distance(polygon), abs=1e-9)
+    assert 0 < contained.sum() < len(buildings)
+
+    # касание границы области допускается, заход в отверстие -- нет
+    flush = np.array([[10., 5., 0., 10., 20.], [5., 10., 90., 10., 20.], [5., 5., 0., -10., 10.],
+                      [105., 75., 0., 10., 20.], [105., 76., 0., 10., 20.]])
+    contained, distances = evaluator.check_buildings(flush)
+    assert contained.tolist() == [True, True, True, True, False]
+    assert distances.tolist() == [0.] * 5
+    assert not SiteEvaluator(Polygon(), []).check_buildings(flush)[0].any()
+
+
+def test_site_external_points():
+    """
+    check nearest external point distances for buildings with matching connection types
+    """
+    first_type, second_type = uuid4(), uuid4()
+    external_points = [ExternalPoint(id=uuid4(), point_m=Point(x, 0.), connection_point_type_id=type_id)
+                       for x, type_id in ((-20., first_type), (50., second_type), (100., first_type))]
+    buildings = [Building(id=uuid4(), connection_points=[ConnectionPoint(id=uuid4())]) for _ in range(3)]
+    connections = [
+        BuildingConnection(id=uuid4(), source_connection_point_id=buildings[0].connection_points[0].id,
+                           target_connection_point_id=buildings[1].connection_points[0].id,
+                           connection_type_id=first_type),
+        BuildingConnection(id=uuid4(), source_connection_point_id=buildings[1].connection_points[0].id,
+                           target_connection_point_id=uuid4(), connection_type_id=second_type),
+    ]
+    building_types = get_building_connection_types(buildings, connections)
+    assert building_types == [{first_type}, {first_type, second_type}, set()]
+
+    evaluator = SiteEvaluator(site_area, external_points)
+    building_array = np.array([[60., 10., 90., 10., 20.], [60., 10., 0., 10., 20.], [0., 0., 0., -4., 4.]])
+    distances, indices = evaluator.calculate_external_point_distances(
+        building_array, evaluator.get_external_point_mask(building_types))
+    assert distances.tolist() == pytest.approx([35., 5., np.inf])
+    assert indices.tolist() == [2, 1, -1]
+
+
+@pytest.mark.parametrize('method', ['shapely', 'vectorized'])
+def test_site_area_check_speed(benchmark, method):
+    buildings = make_oriented_buildings(np.random.default_rng(4).uniform(0, 360, 2000), 300.)
+    if method == 'shapely':
+        benchmark(lambda: [
+            site_area.covers(affinity.rotate(box(x - length / 2, y - width / 2, x + length / 2, y + width / 2),
+                                             -angle, origin=(x, y)))
+            for x, y, angle, width, length in buildings
+        ])
+    else:
+        benchmark(SiteEvaluator(site_area, []).check_buildings, buildings)
@@ -0,0 +1,263 @@
+from itertools import product
+from math import sqrt
+from typing import List
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from force.connections import ConnectionCostEvaluator
+from force.connections import get_connection_wrappers
+from force.distance import calculate_normalized_distance_matrix_between_clusters
+from force.internal import BuildingWrapper
+from force.internal import ClusterArray
+from force.internal import ClusterConnection
+from force.internal import ClusterPosition
+from force.internal import ClusterShape
+from force.internal import ClusterShift
+from force.internal import ConnectionPointPosition
+from force.internal import ConnectionPointWrapper
+from force.internal import ConnectionWrapper
+from force.layout import ForceLayout
+from force.layout import LayoutSettings
+from force.layout import calculate_cluster_forces
+from force.layout import calculate_pair_repulsion_forces
+from force.model import BuildingConnection
+from force.model import Circle
+from force.model import ConnectionType
+from force.model import FunctionalAreaType
+from force.model import Position
+from force.model import Rectangle
+from force.neighbors import NeighborList
+from force.quadtree import calculate_long_range_forces
+from force.quadtree import calculate_long_range_forces_exact
+from force.spatial import calculate_bounds_lower_bound
+
+
+def make_clusters(cluster_count: int, buildings_per_cluster: int = 4) -> List[ClusterShape]:
+    return [
+        ClusterShape(
+            cluster_id=uuid4(),
+            functional_area=FunctionalAreaType.ONE,
+            figure=Rectangle(width_m=40., length_m=40.),
+            buildings=[
+                BuildingWrapper(id=uuid4(), label='', figure=Rectangle(width_m=10., length_m=10.),
+                                local_position=Position(offset_x_m=15. * (i % 2), offset_y_m=15. * (i // 2)),
+                                connection_points=[])
+                for i in range(buildings_per_cluster)
+            ]
+        )
+        for _ in range(cluster_count)
+    ]
+
+
+def make_connection_point(building: BuildingWrapper, x: float, y: float) -> ConnectionPointWrapper:
+    point_id = uuid4()
+    point = ConnectionPointWrapper(id=point_id, building_id=building.id,
+                                   local_position=ConnectionPointPosition(connection_point_id=point_id, x=x, y=y))
+    building.connection_points.append(point)
+    return point
+
+
+def make_offset_rules(clusters: List[ClusterShape], offset_m: float = 20.):
+    buildings = [building for cluster in clusters for building in cluster.buildings]
+    return {(first.id, second.id): offset_m for first, second in product(buildings, buildings)}
+
+
+def test_overlapping_clusters_are_separated():
+    """
+    check that overlapping clusters are pushed apart until the normalized distance reaches the repulsion distance
+    """
+    clusters = make_clusters(3)
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=float(i), y=0.) for i, cluster in enumerate(clusters)]
+    offset_rules = make_offset_rules(clusters)
+    settings = LayoutSettings(iterations=300, max_step_m=2.)
+
+    result = ForceLayout(clusters, positions, [], offset_rules, settings).run()
+    distances, _ = calculate_normalized_distance_matrix_between_clusters(clusters, result.cluster_positions,
+                                                                         offset_rules)
+    assert distances.min() >= settings.repulsion_distance - 0.05
+    assert 0 < len(result.iteration_times_s) <= settings.iterations
+
+
+def test_connected_clusters_attract():
+    """
+    check that connected clusters far from each other move closer and unconnected ones stay in place
+    """
+    clusters = make_clusters(3)
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=500. * i, y=0.) for i, cluster in enumerate(clusters)]
+    connections = [ClusterConnection(first_cluster_id=clusters[0].cluster_id, second_cluster_id=clusters[1].cluster_id,
+                                     normalized_connection_cost=1.)]
+    layout = ForceLayout(clusters, positions, connections, make_offset_rules(clusters), LayoutSettings(iterations=1))
+
+    shifts = layout.step()
+    assert [shift.cluster_id for shift in shifts] == [clusters[0].cluster_id, clusters[1].cluster_id]
+    assert shifts[0].dx > 0 and shifts[1].dx < 0
+    assert layout.positions[2].tolist() == [1000., 0.]
+
+
+def test_cluster_forces():
+    """
+    check repulsion direction and magnitude and symmetric attraction
+    """
+    settings = LayoutSettings(repulsion_strength=2., attraction_strength=0.5)
+    centers = np.array([[0., 0.], [3., 4.], [100., 0.]])
+    distances = np.array([[np.inf, 0.5, 5.], [0.5, np.inf, 5.], [5., 5., np.inf]])
+    forces = calculate_cluster_forces(centers, distances, np.array([[0, 2]]), np.array([0.01]), settings)
+    assert forces == pytest.approx(np.array([[-0.6 + 0.5, -0.8], [0.6, 0.8], [-0.5, 0.]]))
+    assert forces.sum(axis=0) == pytest.approx([0., 0.])
+
+
+def test_long_range_forces_approximation():
+    """
+    check that the quadtree approximation is exact for theta = 0 and close to the exact forces otherwise
+    """
+    centers = np.random.uniform(0, 1000, (500, 2))
+    exact_forces = calculate_long_range_forces_exact(centers, 1.)
+    assert calculate_long_range_forces(centers, 1., theta=0.) == pytest.approx(exact_forces)
+    errors = np.linalg.norm(calculate_long_range_forces(centers, 1., theta=0.5) - exact_forces, axis=1)
+    assert np.median(errors / np.linalg.norm(exact_forces, axis=1)) < 0.01
+
+
+def test_approximate_layout_forces():
+    """
+    check that the approximate layout mode finds all repelling pairs and with theta = 0 equals the exact mode
+    """
+    clusters = make_clusters(30)
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=25. * (i % 6), y=30. * (i // 6))
+                 for i, cluster in enumerate(clusters)]
+    offset_rules = make_offset_rules(clusters)
+    settings = LayoutSettings(long_range_strength=5.)
+    exact_layout = ForceLayout(clusters, positions, [], offset_rules, settings)
+    approximate_settings = LayoutSettings(long_range_strength=5., theta=0.)
+    approximate_layout = ForceLayout(clusters, positions, [], offset_rules, approximate_settings)
+
+    first, second, distances = approximate_layout._calculate_near_pair_distances()
+    matrix_distances, _ = calculate_normalized_distance_matrix_between_clusters(clusters, positions, offset_rules)
+    repelling = np.argwhere(np.triu(matrix_distances < settings.repulsion_distance, 1))
+    assert len(repelling) > 0
+    assert set(map(tuple, repelling)) <= set(zip(first, second))
+    assert np.array_equal(distances, matrix_distances[first, second])
+
+    assert approximate_layout.calculate_forces() == pytest.approx(exact_layout.calculate_forces())
+    for _ in range(10):
+        exact_layout.step()
+        approximate_layout.step()
+    assert approximate_layout.positions == pytest.approx(exact_layout.positions)
+    assert approximate_layout.neighbors.rebuild_count < 10
+    centers = np.random.uniform(0, 100, (30, 2))
+    assert calculate_pair_repulsion_forces(centers, first, second, distances, settings) == pytest.approx(
+        calculate_cluster_forces(centers, matrix_distances, np.empty((0, 2), dtype=np.int64), np.empty(0),
+                                 LayoutSettings()))
+
+
+def test_connection_costs():
+    """
+    check connection costs of rotated buildings for single and batched cluster positions
+    """
+    first, second = make_clusters(2, buildings_per_cluster=2)
+    first.buildings[1].local_position = Position(offset_x_m=10., offset_y_m=0., angle_deg=90.)
+    first_point = make_connection_point(first.buildings[1], 5., 0.)
+    second_point = make_connection_point(second.buildings[0], 0., 2.)
+    connection_type = ConnectionType(id=uuid4(), cost=2.)
+    connections = get_connection_wrappers(
+        [BuildingConnection(id=uuid4(), source_connection_point_id=first_point.id,
+                            target_connection_point_id=second_point.id, connection_type_id=connection_type.id)],
+        [connection_type]
+    )
+    positions = [ClusterPosition(cluster_id=first.cluster_id, x=0., y=0.),
+                 ClusterPosition(cluster_id=second.cluster_id, x=10., y=10.)]
+
+    evaluator = ConnectionCostEvaluator([first, ClusterArray.from_cluster_shape(second)], positions, connections)
+    # after rotation the first point is at (10, -5) and the second one at (10, 12)
+    assert evaluator.costs == pytest.approx([34.])
+    assert evaluator.total_cost == pytest.approx(34.)
+    assert evaluator.point_clusters.tolist() == [0, 1]
+    assert evaluator.point_buildings.tolist() == [1, 0]
+    batch = np.array([[[0., 0.], [10., 10.]], [[0., 0.], [-2., -3.]], [[3., 4.], [13., 14.]]])
+    assert evaluator.calculate_total_cost(batch) == pytest.approx([34., 2 * np.hypot(12., 4.), 34.])
+
+    # a circle building is rotated like a rectangle: at 45 degrees the point (2, 0) moves to (sqrt(2), -sqrt(2))
+    second.buildings[1].figure = Circle(radius_m=5.)
+    second.buildings[1].local_position = Position(offset_x_m=15., offset_y_m=0., angle_deg=45.)
+    circle_point = make_connection_point(second.buildings[1], 2., 0.)
+    circle_connection = ConnectionWrapper(id=uuid4(), first_connection_point_id=first_point.id,
+                                          second_connection_point_id=circle_point.id, connection_cost=1.)
+    evaluator = ConnectionCostEvaluator([first, second], positions, [circle_connection])
+    assert evaluator.costs == pytest.approx([np.hypot(15. + sqrt(2.), 15. - sqrt(2.))])
+
+
+def test_incremental_connection_costs():
+    """
+    check that costs updated by cluster shifts equal costs recomputed from scratch
+    """
+    rng = np.random.default_rng(0)
+    clusters = make_clusters(20)
+    points = [make_connection_point(building, *rng.uniform(-5, 5, 2))
+              for cluster in clusters for building in cluster.buildings]
+    for cluster in clusters:
+        for building in cluster.buildings:
+            building.local_position.angle_deg = float(rng.uniform(0, 360))
+    connections = [ConnectionWrapper(id=uuid4(), first_connection_point_id=points[i].id,
+                                     second_connection_point_id=points[j].id, connection_cost=float(cost))
+                   for i, j, cost in zip(rng.integers(0, len(points), 100), rng.integers(0, len(points), 100),
+                                         rng.uniform(1, 10, 100))]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=50. * i, y=0.) for i, cluster in enumerate(clusters)]
+    evaluator = ConnectionCostEvaluator(clusters, positions, connections)
+
+    for _ in range(10):
+        moved = rng.choice(len(clusters), 4, replace=False)
+        shifts = [ClusterShift(cluster_id=clusters[idx].cluster_id, dx=float(dx), dy=float(dy))
+                  for idx, (dx, dy) in zip(moved, rng.uniform(-20, 20, (4, 2)))]
+        shifts.append(ClusterShift(cluster_id=clusters[moved[0]].cluster_id, dx=1., dy=-1.))
+        evaluator.apply_shifts(shifts)
+
+        expected = ConnectionCostEvaluator(clusters, evaluator.positions, connections)
+        assert evaluator.costs == pytest.approx(expected.costs)
+        assert evaluator.total_cost == pytest.approx(expected.total_cost)
+
+
+def test_neighbor_list():
+    """
+    check that the neighbor list keeps all pairs within the cutoff and is rebuilt only after a large displacement
+    """
+    rng = np.random.default_rng(13)
+    clusters = make_clusters(200)
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=x, y=y)
+                 for cluster, (x, y) in zip(clusters, rng.uniform(0, 1000, (len(clusters), 2)).tolist())]
+    neighbors = NeighborList.from_clusters(clusters, positions, cutoff_m=30., skin_m=10.)
+    current_positions = np.array([(p.x, p.y) for p in positions])
+    for _ in range(20):
+        current_positions += rng.uniform(-1., 1., current_positions.shape)
+        neighbors.update(current_positions)
+        bounds = neighbors.get_bounds(current_positions)
+        gaps = calculate_bounds_lower_bound(bounds[:, None, :], bounds[None, :, :])
+        assert set(map(tuple, np.argwhere(np.triu(gaps <= 30., 1)))) <= set(zip(neighbors.first_indices,
+                                                                                 neighbors.second_indices))
+    assert 1 < neighbors.rebuild_count < 20
+
+    assert not neighbors.update(current_positions)
+    current_positions[0] += 5.1
+    assert neighbors.update(current_positions)
+
+
+@pytest.mark.parametrize('cluster_count, theta', [(10, None), (40, None), (40, 0.5), (200, 0.5)])
+def test_layout_iteration(benchmark, cluster_count, theta):
+    clusters = make_clusters(cluster_count)
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=10. * i, y=0.) for i, cluster in enumerate(clusters)]
+    settings = LayoutSettings(max_step_m=1., long_range_strength=1., theta=theta)
+    layout = ForceLayout(clusters, positions, [], make_offset_rules(clusters), settings)
+    benchmark(layout.step)
+
+
+@pytest.mark.parametrize('theta', [None, 0.5, 1.])
+def test_long_range_forces(benchmark, theta):
+    centers = np.random.default_rng(0).uniform(0, 10000, (3000, 2))
+    exact_forces = calculate_long_range_forces_exact(centers, 1.)
+    if theta is None:
+        forces = benchmark(calculate_long_range_forces_exact, centers, 1.)
+    else:
+        forces = benchmark(calculate_long_range_forces, centers, 1., theta)
+    errors = np.linalg.norm(forces - exact_forces, axis=1) / np.linalg.norm(exact_forces, axis=1)
+    benchmark.extra_info['max_relative_error'] = float(errors.max())
+    benchmark.extra_info['median_relative_error'] = float(np.median(errors))
@@ -0,0 +1,145 @@
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from shapely.geometry import Point
+from shapely.geometry import Polygon
+
+from force.loader import load_input_data
+from force.model import Building
+from force.model import BuildingCluster
+from force.model import BuildingClusterWithPositions
+from force.model import BuildingConnection
+from force.model import BuildingOffsetRule
+from force.model import Circle
+from force.model import ConnectionPoint
+from force.model import ConnectionType
+from force.model import ExternalPoint
+from force.model import FunctionalAreaType
+from force.model import InputData
+from force.model import Position
+from force.model import Rectangle
+from force.model import Solution
+from force.snapshot import read_snapshot
+from force.snapshot import write_input_data_snapshot
+from force.snapshot import write_solution_snapshot
+
+
+def make_input_data(building_count: int) -> InputData:
+    connection_type = ConnectionType(id=uuid4(), name='pipe', cost=2.5)
+    buildings = [
+        Building(
+            id=uuid4(),
+            figure=Rectangle(width_m=10., length_m=20.) if i % 3 else Circle(radius_m=5.),
+            functional_area=FunctionalAreaType(i % 4 + 1),
+            connection_points=[ConnectionPoint(id=uuid4(), point_m=Point(1., -2.)) for _ in range(2)],
+            label=f'building {i}'
+        )
+        for i in range(building_count)
+    ]
+    for building in buildings:
+        for point in building.connection_points:
+            point.building_id = building.id
+    return InputData(
+        development_area_m=Polygon([(0, 0), (0, 1000), (1000, 1000), (1000, 0)]),
+        connection_types=[connection_type],
+        buildings=buildings,
+        building_clusters=[
+            BuildingCluster(id=uuid4(), building_ids=[b.id for b in buildings[:building_count // 2]]),
+            BuildingClusterWithPositions(id=uuid4(), positions=[
+                Position(building_id=b.id, offset_x_m=1., offset_y_m=2., angle_deg=90.)
+                for b in buildings[building_count // 2:]
+            ])
+        ],
+        building_offset_rules=[
+            BuildingOffsetRule(first_building_id=first.id, second_building_id=second.id, offset_m=8.)
+            for first, second in zip(buildings, buildings[1:])
+        ],
+        building_connections=[
+            BuildingConnection(id=uuid4(), source_connection_point_id=first.connection_points[0].id,
+                               target_connection_point_id=second.connection_points[1].id,
+                               connection_type_id=connection_type.id)
+            for first, second in zip(buildings, buildings[1:])
+        ],
+        external_points=[ExternalPoint(id=uuid4(), point_m=Point(0., 500.), connection_point_type_id=uuid4())],
+        wind_rose_angle_deg=45.
+    )
+
+
+def test_load_input_data():
+    """
+    check that the fast loader gives the same data as the schema loader and decodes geometry on access
+    """
+    data = make_input_data(30)
+    js = InputData.schema().dumps(data)
+
+    loaded = load_input_data(js)
+    assert not loaded.is_geometry_decoded
+    assert not loaded.buildings[0].connection_points[0].is_geometry_decoded
+    assert loaded == InputData.schema().loads(js)
+    assert loaded == data
+    assert loaded.is_geometry_decoded
+    assert isinstance(loaded.buildings[1].connection_points[0].point_m, Point)
+    assert isinstance(loaded.buildings[1].figure, Rectangle)
+    assert isinstance(loaded.building_clusters[1], BuildingClusterWithPositions)
+
+
+def test_load_input_data_defaults():
+    """
+    check that missing fields get default values and union types are detected by keys without `__type`
+    """
+    loaded = load_input_data('{"buildings": [{"figure": {"width_m": 3}}, {"figure": {"radius_m": 2}}], '
+                             '"building_clusters": [{"positions": []}], "external_points": [{}]}')
+    assert loaded.development_area_m == Polygon()
+    assert loaded.buildings == [Building(figure=Rectangle(width_m=3.)), Building(figure=Circle(radius_m=2.))]
+    assert loaded.building_clusters == [BuildingClusterWithPositions()]
+    assert loaded.external_points == [ExternalPoint()]
+
+
+@pytest.mark.parametrize('loader', ['schema', 'fast'])
+def test_load_large_input_data(benchmark, loader):
+    js = InputData.schema().dumps(make_input_data(1000))
+    if loader == 'schema':
+        benchmark(InputData.schema().loads, js)
+    else:
+        benchmark(load_input_data, js)
+
+
+def test_snapshot(tmp_path):
+    """
+    check that input data and solution survive a round trip through memory-mapped snapshots
+    """
+    data = make_input_data(30)
+    data.buildings[0].label = 'Насосная №1'
+    data.connection_types[0].name = ''
+    write_input_data_snapshot(data, str(tmp_path / 'input'))
+    snapshot = read_snapshot(str(tmp_path / 'input'))
+    # строки хранятся в массивах, размер заголовка не зависит от количества сооружений
+    assert set(snapshot.header) == {'format', 'version', 'kind', 'arrays', 'development_area_m',
+                                    'wind_rose_angle_deg'}
+    assert isinstance(snapshot['building_figure_sizes'], np.memmap)
+    assert snapshot['offset_rule_building_indices'].tolist() == [[i, i + 1] for i in range(29)]
+    assert snapshot.to_input_data() == data
+    with pytest.raises(ValueError):
+        snapshot.to_solution()
+
+    # точки без координат остаются пустыми
+    data = InputData(buildings=[Building(connection_points=[ConnectionPoint()])], external_points=[ExternalPoint()])
+    write_input_data_snapshot(data, str(tmp_path / 'empty_points'))
+    assert read_snapshot(str(tmp_path / 'empty_points')).to_input_data() == data
+
+    solution = Solution(positions=[Position(building_id=uuid4(), offset_x_m=i, offset_y_m=-i, angle_deg=90.)
+                                   for i in range(10)])
+    write_solution_snapshot(solution, str(tmp_path / 'solution'))
+    assert read_snapshot(str(tmp_path / 'solution'), mmap_mode=None).to_solution() == solution
+
+
+@pytest.mark.parametrize('loader', ['json', 'snapshot'])
+def test_open_large_snapshot(benchmark, tmp_path, loader):
+    data = make_input_data(1000)
+    write_input_data_snapshot(data, str(tmp_path))
+    js = InputData.schema().dumps(data)
+    if loader == 'json':
+        benchmark(load_input_data, js)
+    else:
+        benchmark(read_snapshot, str(tmp_path))
@@ -1,20 +1,39 @@
 import json
 import random
+from concurrent.futures import ThreadPoolExecutor
 from itertools import product
 from typing import Dict, Tuple
 from uuid import UUID
 from uuid import uuid4
 
+import numpy as np
+import pytest
 import rust_force
 
 from force.distance import calculate_distance_between_two_buildings, calculate_distance_between_two_clusters
+from force.distance import calculate_distance_matrix_between_clusters
+from force.distance import calculate_min_distance
 from force.distance import calculate_normalized_distance_between_two_clusters
+from force.distance import calculate_normalized_distance_matrix_between_clusters
+from force.distance import calculate_oriented_distance_matrix
+from force.distance import get_building_array
+from force.distance import find_cluster_pairs_closer_than
+from force.distance import is_distance_between_two_clusters_less_than
+from force.distance import is_normalized_distance_between_two_clusters_less_than
 from force.internal import BuildingWrapper
 from force.internal import ClusterPosition
 from force.internal import ClusterShape
+from force.layout import ForceLayout
+from force.layout import LayoutSettings
+from force.layout import calculate_cluster_forces
+from force.model import Circle
 from force.model import FunctionalAreaType
 from force.model import Position
 from force.model import Rectangle
+from force.offsets import CompressedOffsetTable
+from force.offsets import OffsetTable
+from force.search import find_closest_building_pairs
+from force.spatial import find_overlapping_buildings
 
 building_count = 12
 n_first_cluster = 5
@@ -117,6 +136,76 @@ def test_equals_normalized_distance_clusters():
     assert rust_result == python_result
 
 
+def test_equals_normalized_distance_clusters_offset_rules():
+    """
+    check for equals normalized distance between clusters in python and rust with runtime offset rules
+    """
+    python_result = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    offset_rules = rust_force.OffsetRules({(str(b1), str(b2)): offset
+                                           for (b1, b2), offset in building_offset_rules.items()})
+    rust_result = rust_force.calculate_normalized_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position, offset_rules)
+    assert rust_result == python_result
+
+    offset_table = OffsetTable.from_rules(building_offset_rules)
+    offset_rules = rust_force.OffsetRules.from_array([str(b) for b in offset_table.building_ids],
+                                                     offset_table.offsets)
+    assert offset_rules.building_count == len(offset_table.building_ids)
+    rust_result = rust_force.calculate_normalized_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position, offset_rules)
+    assert rust_result == python_result
+
+
+def test_equals_normalized_distance_clusters_compressed_offset_rules():
+    """
+    check for equals normalized distance between clusters in python and rust with compressed offset rules
+    """
+    offset_table = CompressedOffsetTable.from_rules(building_offset_rules,
+                                                    {b.id: i % 4 for i, b in enumerate(python_buildings)})
+    offset_rules = rust_force.OffsetRules.from_compressed(
+        [str(b) for b in offset_table.building_ids], offset_table.building_types, offset_table.type_offsets,
+        offset_table.exception_indices, offset_table.exception_offsets)
+    python_result = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    rust_result = rust_force.calculate_normalized_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position, offset_rules)
+    assert rust_result == python_result
+
+
+def test_equals_distance_clusters_rust_array():
+    """
+    check for equals distance between clusters in python and rust with numpy array inputs
+    """
+    first_array = rust_force.buildings_to_array(rust_buildings[:n_first_cluster])
+    second_array = rust_force.buildings_to_array(rust_buildings[n_first_cluster:])
+    assert first_array.shape == (n_first_cluster, 5)
+
+    python_result = calculate_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position)
+    rust_result = rust_force.calculate_distance_between_two_clusters_array(
+        first_array, second_array, rust_first_cluster_position, rust_second_cluster_position)
+    assert rust_result == python_result
+
+    offset_table = OffsetTable.from_rules(building_offset_rules)
+    offset_rules = rust_force.OffsetRules.from_array([str(b) for b in offset_table.building_ids],
+                                                     offset_table.offsets)
+    python_result = calculate_normalized_distance_between_two_clusters(
+        python_first_cluster, python_second_cluster, python_first_cluster_position, python_second_cluster_position,
+        building_offset_rules)
+    rust_result = rust_force.calculate_normalized_distance_between_two_clusters_array(
+        first_array, second_array,
+        offset_rules.get_indices([b.id for b in rust_buildings[:n_first_cluster]]),
+        offset_rules.get_indices([b.id for b in rust_buildings[n_first_cluster:]]),
+        rust_first_cluster_position, rust_second_cluster_position, offset_rules)
+    assert rust_result == python_result
+
+
 def test_equals_distance_buildings():
     """
     check for equals distance between buildings in python and rust
@@ -157,7 +246,325 @@ def test_equals_distance_clusters_rust():
     assert rust_result == rust_result_parallel
 
 
+def test_equals_distance_clusters_rust_indexed():
+    """
+    check for equals distance between clusters in indexed rust and rust
+    """
+    rust_result = rust_force.calculate_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position)
+    rust_result_indexed = rust_force.calculate_distance_between_two_clusters_indexed(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position)
+    assert rust_result == rust_result_indexed
+
+
+def test_equals_distance_clusters_rust_adaptive():
+    """
+    check for equals distance between clusters in adaptive rust and rust for serial and parallel dispatch
+    """
+    rust_result = rust_force.calculate_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position)
+    rust_normalized_result = rust_force.calculate_normalized_distance_between_two_clusters(
+        rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position)
+    default_threshold = rust_force.get_parallel_threshold()
+    try:
+        for threshold in (0, default_threshold):
+            rust_force.set_parallel_threshold(threshold)
+            assert rust_force.calculate_distance_between_two_clusters_adaptive(
+                rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+                rust_second_cluster_position) == rust_result
+            assert rust_force.calculate_normalized_distance_between_two_clusters_adaptive(
+                rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+                rust_second_cluster_position) == rust_normalized_result
+    finally:
+        rust_force.set_parallel_threshold(default_threshold)
+
+
+def test_equals_distance_prepared_clusters_rust():
+    """
+    check for equals distances between prepared clusters in rust and clusters in python
+    """
+    first_prepared = rust_force.PreparedCluster(rust_buildings[:n_first_cluster])
+    second_prepared = rust_force.PreparedCluster(rust_buildings[n_first_cluster:])
+    assert first_prepared.building_count == n_first_cluster
+    assert first_prepared.local_bounds == python_first_cluster.local_bounds
+
+    rust_offset_rules = rust_force.OffsetRules({(str(a), str(b)): v for (a, b), v in building_offset_rules.items()})
+    for _ in range(3):
+        second_position = ClusterPosition(cluster_id=second_cluster_id, x=random.randint(0, 100),
+                                          y=random.randint(0, 100))
+        rust_second_position = rust_force.ClusterPosition(x=second_position.x, y=second_position.y)
+        assert rust_force.calculate_distance_between_prepared_clusters(
+            first_prepared, second_prepared, rust_first_cluster_position, rust_second_position
+        ) == calculate_distance_between_two_clusters(python_first_cluster, python_second_cluster,
+                                                     python_first_cluster_position, second_position)
+        assert rust_force.calculate_normalized_distance_between_prepared_clusters(
+            first_prepared, second_prepared, rust_first_cluster_position, rust_second_position, rust_offset_rules
+        ) == calculate_normalized_distance_between_two_clusters(
+            python_first_cluster, python_second_cluster, python_first_cluster_position, second_position,
+            building_offset_rules)
+
+
+def test_equals_closer_than_threshold_rust():
+    """
+    check for equals threshold predicates between prepared clusters in rust and clusters in python
+    """
+    first_prepared = rust_force.PreparedCluster(rust_buildings[:n_first_cluster])
+    second_prepared = rust_force.PreparedCluster(rust_buildings[n_first_cluster:])
+    rust_offset_rules = rust_force.OffsetRules({(str(a), str(b)): v for (a, b), v in building_offset_rules.items()})
+    for threshold in (-2., 0., 0.5, 1., 10., np.inf):
+        assert rust_force.is_distance_between_prepared_clusters_less_than(
+            first_prepared, second_prepared, rust_first_cluster_position, rust_second_cluster_position, threshold
+        ) == is_distance_between_two_clusters_less_than(python_first_cluster, python_second_cluster,
+                                                        python_first_cluster_position, python_second_cluster_position,
+                                                        threshold)
+        assert rust_force.is_normalized_distance_between_prepared_clusters_less_than(
+            first_prepared, second_prepared, rust_first_cluster_position, rust_second_cluster_position, threshold,
+            rust_offset_rules
+        ) == is_normalized_distance_between_two_clusters_less_than(
+            python_first_cluster, python_second_cluster, python_first_cluster_position,
+            python_second_cluster_position, threshold, building_offset_rules)
+
+    clusters = [python_buildings[i:i + 10] for i in range(0, building_count, 10)]
+    python_clusters = [ClusterShape(cluster_id=uuid4(), buildings=buildings, functional_area=FunctionalAreaType.ONE,
+                                    figure=python_figures[0]) for buildings in clusters]
+    positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=200. * i, y=(i % 2) * 100.)
+                 for i, cluster in enumerate(python_clusters)]
+    prepared = [rust_force.PreparedCluster(rust_buildings[i:i + 10]) for i in range(0, building_count, 10)]
+    rust_positions = [rust_force.ClusterPosition(x=position.x, y=position.y) for position in positions]
+    pairs = np.array(list(zip(*np.triu_indices(len(clusters), k=1))), dtype=np.int64)
+    for threshold in (0., 1., 3.):
+        assert rust_force.find_prepared_cluster_pairs_closer_than(
+            prepared, rust_positions, pairs, threshold, rust_offset_rules
+        ).tolist() == find_cluster_pairs_closer_than(python_clusters, positions, pairs, threshold,
+                                                     building_offset_rules).tolist()
+
+
+def test_equals_closest_building_pairs_rust():
+    """
+    check for equals k closest building pairs between prepared clusters in rust and clusters in python
+    """
+    prepared = [rust_force.PreparedCluster(rust_buildings[:n_first_cluster]),
+                rust_force.PreparedCluster(rust_buildings[n_first_cluster:])]
+    rust_offset_rules = rust_force.OffsetRules({(str(a), str(b)): v for (a, b), v in building_offset_rules.items()})
+    python_pairs = find_closest_building_pairs(python_first_cluster, python_second_cluster,
+                                               python_first_cluster_position, python_second_cluster_position,
+                                               building_offset_rules, k=20)
+    rust_pairs = rust_force.find_closest_building_pairs(
+        prepared, [rust_first_cluster_position, rust_second_cluster_position], 20, rust_offset_rules)
+    assert [(str(p.first_building_id), str(p.second_building_id), p.distance, p.offset_m)
+            for p in python_pairs] == [pair[2:] for pair in rust_pairs]
+    assert all(pair[:2] == (0, 1) for pair in rust_pairs)
+
+
+def test_rust_array_memory_layout():
+    """
+    check that fortran-ordered and strided building arrays give the same results as C-ordered ones
+    """
+    first_array = rust_force.buildings_to_array(rust_buildings[:n_first_cluster])
+    second_array = rust_force.buildings_to_array(rust_buildings[n_first_cluster:])
+    expected = rust_force.calculate_distance_between_two_clusters_array(
+        first_array, second_array, rust_first_cluster_position, rust_second_cluster_position)
+    for first, second in ((np.asfortranarray(first_array), np.asfortranarray(second_array)),
+                          (np.repeat(first_array, 2, axis=0)[::2], second_array)):
+        assert not first.flags.c_contiguous
+        assert rust_force.calculate_distance_between_two_clusters_array(
+            first, second, rust_first_cluster_position, rust_second_cluster_position) == expected
+        assert np.array_equal(rust_force.calculate_oriented_distance_matrix(first, second),
+                              rust_force.calculate_oriented_distance_matrix(first_array, second_array))
+        assert np.array_equal(rust_force.find_overlapping_buildings(first),
+                              rust_force.find_overlapping_buildings(first_array))
+
+
+def test_equals_overlapping_buildings_rust():
+    """
+    check for equals site-wide overlapping building pairs in rust and python
+    """
+    rng = np.random.default_rng(20)
+    buildings = np.stack([rng.uniform(0, 500, 2000), rng.uniform(0, 500, 2000), rng.choice([0., 90.], 2000),
+                          rng.uniform(5, 30, 2000), rng.uniform(5, 30, 2000)], axis=1)
+    first, second = find_overlapping_buildings(buildings)
+    rust_pairs = rust_force.find_overlapping_buildings(buildings)
+    assert rust_pairs.tolist() == list(zip(first.tolist(), second.tolist()))
+    assert rust_force.find_overlapping_buildings(buildings, 100.).tolist() == rust_pairs.tolist()
+
+
+def test_equals_oriented_distance_rust():
+    """
+    check for equals distances between arbitrarily rotated buildings in rust and python
+    """
+    rng = np.random.default_rng(22)
+    buildings = np.stack([rng.uniform(0, 100, 300), rng.uniform(0, 100, 300),
+                          rng.choice([0., 90., 180., 30., 45., 137.5, -60., -90., -270.], 300),
+                          rng.uniform(2, 20, 300), rng.uniform(2, 20, 300)], axis=1)
+    first, second = buildings[:100], buildings[100:]
+    expected = calculate_oriented_distance_matrix(first, second)
+    assert rust_force.calculate_oriented_distance_matrix(first, second) == pytest.approx(expected, abs=1e-9)
+    assert rust_force.calculate_oriented_distance_matrix(first, second)[expected == -1.].tolist() == [-1.] * int(
+        (expected == -1.).sum())
+    distance, _ = rust_force.calculate_min_oriented_distance(first, second)
+    assert distance == pytest.approx(calculate_min_distance(first, second, oriented=True)[0], abs=1e-9)
+
+
+def test_equals_distance_circle_buildings_rust():
+    """
+    check for equals distances between clusters with circle buildings in rust and python
+    """
+    python_circles = [
+        BuildingWrapper(id=building.id, label='', local_position=building.local_position,
+                        figure=Circle(radius_m=building.figure.length_m / 2) if i % 2 else building.figure,
+                        connection_points=[])
+        for i, building in enumerate(python_buildings)
+    ]
+    rust_circles = [
+        rust_force.Building(id=str(building.id), position=rust_buildings[i].position,
+                            circle=rust_force.Circle(radius_m=building.figure.radius_m))
+        if isinstance(building.figure, Circle) else rust_buildings[i]
+        for i, building in enumerate(python_circles)
+    ]
+    assert rust_circles[1].rectangle is None and rust_circles[1].circle.radius_m == python_circles[1].figure.radius_m
+    with pytest.raises(ValueError):
+        rust_force.Building(id=str(uuid4()), position=rust_buildings[0].position)
+
+    first_cluster = ClusterShape(cluster_id=first_cluster_id, functional_area=FunctionalAreaType.ONE,
+                                 figure=python_figures[0], buildings=python_circles[:n_first_cluster])
+    second_cluster = ClusterShape(cluster_id=second_cluster_id, functional_area=FunctionalAreaType.ONE,
+                                  figure=python_figures[0], buildings=python_circles[n_first_cluster:])
+    assert rust_force.calculate_distance_between_two_clusters(
+        rust_circles[:n_first_cluster], rust_circles[n_first_cluster:], rust_first_cluster_position,
+        rust_second_cluster_position
+    ) == calculate_distance_between_two_clusters(first_cluster, second_cluster, python_first_cluster_position,
+                                                 python_second_cluster_position)
+    assert rust_force.calculate_distance_between_prepared_clusters(
+        rust_force.PreparedCluster(rust_circles[:n_first_cluster]),
+        rust_force.PreparedCluster(rust_circles[n_first_cluster:]),
+        rust_first_cluster_position, rust_second_cluster_position
+    ) == calculate_distance_between_two_clusters(first_cluster, second_cluster, python_first_cluster_position,
+                                                 python_second_cluster_position)
+    origin = ClusterPosition(cluster_id=first_cluster_id, x=0., y=0.)
+    buildings = get_building_array(first_cluster, origin)
+    assert np.array_equal(rust_force.buildings_to_array(rust_circles[:n_first_cluster]), buildings)
+    assert rust_force.calculate_oriented_distance_matrix(buildings, buildings) == pytest.approx(
+        calculate_oriented_distance_matrix(buildings, buildings), abs=1e-9)
+
+
+def test_rust_num_threads():
+    """
+    check that the rust thread pool size can be changed and reset
+    """
+    # rayon определяет размер пула по доступным процессу ядрам (affinity, cgroups), а не по `os.cpu_count()`
+    default_num_threads = rust_force.get_num_threads()
+    try:
+        rust_force.set_num_threads(2)
+        assert rust_force.get_num_threads() == 2
+        assert rust_force.calculate_distance_between_two_clusters_parallel(
+            rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+            rust_second_cluster_position) == rust_force.calculate_distance_between_two_clusters(
+            rust_buildings[:n_first_cluster], rust_buildings[n_first_cluster:], rust_first_cluster_position,
+            rust_second_cluster_position)
+    finally:
+        rust_force.set_num_threads(0)
+    assert rust_force.get_num_threads() == default_num_threads
+
+
+def test_equals_distance_matrix_between_clusters_rust():
+    """
+    check for equals all-pairs cluster distance matrices in python and rust
+    """
+    rust_clusters = [rust_buildings[:4], rust_buildings[4:8], rust_buildings[8:]]
+    python_clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 4], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 4)
+    ]
+    cluster_positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=random.randint(0, 100),
+                                         y=random.randint(0, 100)) for cluster in python_clusters]
+    rust_positions = [rust_force.ClusterPosition(x=p.x, y=p.y) for p in cluster_positions]
+
+    assert np.array_equal(
+        rust_force.calculate_distance_matrix_between_clusters(rust_clusters, rust_positions),
+        calculate_distance_matrix_between_clusters(python_clusters, cluster_positions))
+
+    rust_distances, rust_offsets = rust_force.calculate_normalized_distance_matrix_between_clusters(
+        rust_clusters, rust_positions)
+    python_distances, python_offsets = calculate_normalized_distance_matrix_between_clusters(
+        python_clusters, cluster_positions, building_offset_rules)
+    assert np.array_equal(rust_distances, python_distances)
+    assert np.array_equal(rust_offsets, python_offsets)
+
+
+def test_equals_cluster_forces_rust():
+    """
+    check for equals layout forces and layout steps in python and rust
+    """
+    settings = LayoutSettings(attraction_strength=0.5, long_range_strength=3.)
+    centers = np.random.uniform(0, 100, (20, 2))
+    distances = np.random.uniform(0, 2, (20, 20))
+    distances = np.minimum(distances, distances.T)
+    np.fill_diagonal(distances, np.inf)
+    connection_indices = np.array([[0, 1], [3, 7], [5, 19]])
+    connection_costs = np.array([0.2, 1., 0.5])
+    assert rust_force.calculate_cluster_forces(
+        centers, distances, connection_indices, connection_costs, settings.repulsion_distance,
+        settings.repulsion_strength, settings.attraction_strength, settings.long_range_strength
+    ) == pytest.approx(calculate_cluster_forces(centers, distances, connection_indices, connection_costs, settings))
+
+    python_clusters = [
+        ClusterShape(cluster_id=uuid4(), buildings=python_buildings[i:i + 4], functional_area=FunctionalAreaType.ONE,
+                     figure=python_figures[0])
+        for i in range(0, building_count, 4)
+    ]
+    cluster_positions = [ClusterPosition(cluster_id=cluster.cluster_id, x=random.randint(0, 100),
+                                         y=random.randint(0, 100)) for cluster in python_clusters]
+    python_layout = ForceLayout(python_clusters, cluster_positions, [], building_offset_rules, settings)
+    rust_layout = ForceLayout(python_clusters, cluster_positions, [], building_offset_rules, settings, use_rust=True)
+    for _ in range(5):
+        python_layout.step()
+        rust_layout.step()
+        assert rust_layout.positions == pytest.approx(python_layout.positions)
+
+
+def make_big_cluster_args():
+    big_buildings = [
+        rust_force.Building(
+            id=str(uuid4()),
+            rectangle=rust_force.Rectangle(width_m=random.randint(5, 100), length_m=random.randint(5, 100)),
+            position=rust_force.Position(offset_x_m=random.randint(0, 10000), offset_y_m=random.randint(0, 10000),
+                                         angle_deg=0)
+        )
+        for _ in range(3000)
+    ]
+    return big_buildings[:1500], big_buildings[1500:], rust_first_cluster_position, rust_second_cluster_position
+
+
+def run_in_threads(thread_count: int, args) -> list:
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        futures = [executor.submit(rust_force.calculate_distance_between_two_clusters, *args)
+                   for _ in range(thread_count)]
+        return [future.result() for future in futures]
+
+
+def test_distance_clusters_rust_threads():
+    """
+    check that rust kernels called from several python threads give the same results as sequential calls
+    """
+    args = make_big_cluster_args()
+    expected = rust_force.calculate_distance_between_two_clusters(*args)
+    assert run_in_threads(1, args) == [expected]
+    assert run_in_threads(4, args) == [expected] * 4
+
+
 # benchmarks
+@pytest.mark.parametrize('thread_count', [1, 4])
+def test_distance_clusters_rust_threads_scale(benchmark, thread_count):
+    # без GIL время на 4 потоках близко ко времени одного вызова на 1 потоке
+    args = make_big_cluster_args()
+    benchmark(run_in_threads, thread_count, args)
+
+
 def test_distance_clusters_python(benchmark):
     benchmark(calculate_distance_between_two_clusters,
               python_first_cluster, python_second_cluster,
@@ -176,6 +583,25 @@ def test_distance_clusters_rust_parallel(benchmark):
               rust_first_cluster_position, rust_second_cluster_position)
 
 
+def test_distance_clusters_rust_indexed(benchmark):
+    benchmark(rust_force.calculate_distance_between_two_clusters_indexed, rust_buildings[:n_first_cluster],
+              rust_buildings[n_first_cluster:],
+              rust_first_cluster_position, rust_second_cluster_position)
+
+
+def test_distance_clusters_rust_array(benchmark):
+    benchmark(rust_force.calculate_distance_between_two_clusters_array,
+              rust_force.buildings_to_array(rust_buildings[:n_first_cluster]),
+              rust_force.buildings_to_array(rust_buildings[n_first_cluster:]),
+              rust_first_cluster_position, rust_second_cluster_position)
+
+
+def test_distance_clusters_rust_adaptive(benchmark):
+    benchmark(rust_force.calculate_distance_between_two_clusters_adaptive, rust_buildings[:n_first_cluster],
+              rust_buildings[n_first_cluster:],
+              rust_first_cluster_position, rust_second_cluster_position)
+
+
 def test_distance_normalized_clusters_python(benchmark):
     benchmark(calculate_normalized_distance_between_two_clusters,
               python_first_cluster, python_second_cluster,
@@ -187,3 +613,10 @@ def test_distance_normalized_clusters_rust(benchmark):
     benchmark(rust_force.calculate_normalized_distance_between_two_clusters, rust_buildings[:n_first_cluster],
               rust_buildings[n_first_cluster:],
               rust_first_cluster_position, rust_second_cluster_position)
+
+
+def test_distance_normalized_prepared_clusters_rust(benchmark):
+    benchmark(rust_force.calculate_normalized_distance_between_prepared_clusters,
+              rust_force.PreparedCluster(rust_buildings[:n_first_cluster]),
+              rust_force.PreparedCluster(rust_buildings[n_first_cluster:]),
+              rust_first_cluster_position, rust_second_cluster_position)
@@ -0,0 +1,390 @@
+// Чистые вычислительные функции без зависимостей от pyo3.
+// Все формулы повторяют python-реализацию из `force.distance` операция в операцию,
+// чтобы результаты совпадали побитово.
+
+// столбцы массива сооружений, совпадают с `force.distance.get_building_array`
+pub const X: usize = 0;
+pub const Y: usize = 1;
+pub const ANGLE: usize = 2;
+pub const WIDTH: usize = 3;
+pub const LENGTH: usize = 4;
+pub const BUILDING_ARRAY_COLUMNS: usize = 5;
+
+/// Габарит сооружения: центр и половины сторон с учетом поворота.
+/// Для круга половины сторон равны радиусу `radius`, для прямоугольника радиус равен 0.
+#[derive(Copy, Clone, Debug, PartialEq)]
+pub struct Extent {
+    pub x: f64,
+    pub y: f64,
+    pub half_width: f64,
+    pub half_length: f64,
+    pub radius: f64,
+}
+
+impl Extent {
+    /// Круг задается отрицательной шириной: `width_m` -- минус диаметр, `length_m` -- диаметр,
+    /// как в массиве сооружений `force.distance.get_building_array`.
+    pub fn new(x: f64, y: f64, width_m: f64, length_m: f64, angle_deg: f64) -> Extent {
+        if width_m < 0. {
+            let radius = length_m / 2.;
+            return Extent { x, y, half_width: radius, half_length: radius, radius };
+        }
+        let (half_width, half_length) = eval_half_width_and_half_length(width_m, length_m, angle_deg);
+        Extent { x, y, half_width, half_length, radius: 0. }
+    }
+}
+
+/// Габариты сооружений из построчно записанного массива со столбцами `X`, `Y`, `ANGLE`, `WIDTH`, `LENGTH`.
+pub fn extents_from_rows(rows: &[f64]) -> Vec<Extent> {
+    rows.chunks_exact(BUILDING_ARRAY_COLUMNS)
+        .map(|row| Extent::new(row[X], row[Y], row[WIDTH], row[LENGTH], row[ANGLE]))
+        .collect()
+}
+
+/// Половины ширины и длины прямоугольника с учетом поворота.
+pub fn eval_half_width_and_half_length(width_m: f64, length_m: f64, angle_deg: f64) -> (f64, f64) {
+    let length: f64 = length_m / 2.0;
+    let width: f64 = width_m / 2.0;
+    // если угол поворота здания составляет 90 или 270 градусов
+    // то длина является шириной, а ширина -- длиной;
+    // `rem_euclid`, как `%` в Python: у отрицательных углов -90 и -270 остаток 90, а не -90
+    if (angle_deg.rem_euclid(180.0) - 90.0).abs() < 1e-5 {
+        (length, width)
+    } else {
+        (width, length)
+    }
+}
+
+/// Расстояние между прямоугольниками по модулям разностей координат центров
+/// и суммам половин сторон. Для пересекающихся прямоугольников равно -1.
+pub fn distance(delta_x: f64, delta_y: f64, total_half_width: f64, total_half_length: f64) -> f64 {
+    if delta_x < total_half_length && delta_y >= total_half_width {
+        delta_y - total_half_width
+    } else if delta_x >= total_half_length && delta_y < total_half_width {
+        delta_x - total_half_length
+    } else if delta_x >= total_half_length && delta_y >= total_half_width {
+        ((delta_x - total_half_length).powi(2) + (delta_y - total_half_width).powi(2)).sqrt()
+    } else {
+        -1.
+    }
+}
+
+/// Расстояние между сооружениями, центры которых сдвинуты на `first_shift` и `second_shift`.
+pub fn distance_between_extents(
+    first: &Extent,
+    second: &Extent,
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+) -> f64 {
+    let delta_x: f64 = ((first.x + first_shift.0) - (second.x + second_shift.0)).abs();
+    let delta_y: f64 = ((first.y + first_shift.1) - (second.y + second_shift.1)).abs();
+    let total_radius: f64 = first.radius + second.radius;
+    if total_radius > 0. {
+        return distance_with_circles(
+            delta_x,
+            delta_y,
+            first.half_width + second.half_width,
+            first.half_length + second.half_length,
+            total_radius,
+        );
+    }
+    distance(
+        delta_x,
+        delta_y,
+        first.half_width + second.half_width,
+        first.half_length + second.half_length,
+    )
+}
+
+/// Расстояние для пары с кругами: половины сторон круга равны радиусу, поэтому расстояние равно расстоянию
+/// от центра круга до прямоугольника без кругов за вычетом суммы радиусов. Для пересекающихся равно -1.
+pub fn distance_with_circles(
+    delta_x: f64,
+    delta_y: f64,
+    total_half_width: f64,
+    total_half_length: f64,
+    total_radius: f64,
+) -> f64 {
+    let gap_x: f64 = (delta_x - total_half_length + total_radius).max(0.);
+    let gap_y: f64 = (delta_y - total_half_width + total_radius).max(0.);
+    let distance: f64 = (gap_x.powi(2) + gap_y.powi(2)).sqrt() - total_radius;
+    if distance < 0. {
+        -1.
+    } else {
+        distance
+    }
+}
+
+/// Минимальное расстояние между сооружениями двух кластеров, разделённое на соответствующий оффсет.
+/// `offset(i, j)` -- оффсет между i-м сооружением первого кластера и j-м второго.
+/// Возвращает безразмерное расстояние, оффсет и индексы пары сооружений
+/// или `None`, если для какой-либо пары оффсет не задан (NaN).
+pub fn min_normalized_distance<F: Fn(usize, usize) -> f64>(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+    offset: F,
+) -> Option<(f64, f64, usize, usize)> {
+    let mut min_distance: f64 = f64::INFINITY;
+    let mut min: (f64, usize, usize) = (0., usize::MAX, usize::MAX);
+    for (first_idx, first_extent) in first.iter().enumerate() {
+        for (second_idx, second_extent) in second.iter().enumerate() {
+            let offset: f64 = offset(first_idx, second_idx);
+            if offset.is_nan() {
+                return None;
+            }
+            let distance: f64 = distance_between_extents(first_extent, second_extent, first_shift, second_shift) / offset;
+            if distance < min_distance {
+                min_distance = distance;
+                min = (offset, first_idx, second_idx);
+            }
+        }
+    }
+    Some((min_distance, min.0, min.1, min.2))
+}
+
+/// Минимальное расстояние между сооружениями двух кластеров.
+/// Возвращает расстояние и индексы пары сооружений, для пустых кластеров -- бесконечность.
+pub fn min_distance(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+) -> (f64, usize, usize) {
+    let mut min: (f64, usize, usize) = (f64::INFINITY, usize::MAX, usize::MAX);
+    for (first_idx, first_extent) in first.iter().enumerate() {
+        for (second_idx, second_extent) in second.iter().enumerate() {
+            let distance: f64 = distance_between_extents(first_extent, second_extent, first_shift, second_shift);
+            if distance < min.0 {
+                min = (distance, first_idx, second_idx);
+            }
+        }
+    }
+    min
+}
+
+
+// допуск, с которым угол поворота считается кратным 90 градусам
+pub const AXIS_ALIGNED_TOLERANCE_DEG: f64 = 1e-5;
+
+/// Сооружение, повернутое на произвольный угол: центр, половины сторон без перестановки, косинус и синус
+/// угла поворота по часовой стрелке. Для сооружений, угол которых кратен 90 градусам, и для кругов расстояние
+/// считается по габариту `extent`.
+#[derive(Copy, Clone, Debug, PartialEq)]
+pub struct OrientedExtent {
+    pub x: f64,
+    pub y: f64,
+    pub half_width: f64,
+    pub half_length: f64,
+    pub cos: f64,
+    pub sin: f64,
+    pub axis_aligned: bool,
+    pub extent: Extent,
+}
+
+impl OrientedExtent {
+    pub fn new(x: f64, y: f64, width_m: f64, length_m: f64, angle_deg: f64) -> OrientedExtent {
+        let angle_aligned = is_axis_aligned(angle_deg);
+        // круг выровнен при любом угле, но его поворот округляется только для углов, кратных 90 градусам
+        let axis_aligned = width_m < 0. || angle_aligned;
+        let angle = angle_deg.to_radians();
+        // для углов, кратных 90 градусам, -- точные значения
+        let (cos, sin) = if angle_aligned {
+            (angle.cos().round(), angle.sin().round())
+        } else {
+            (angle.cos(), angle.sin())
+        };
+        OrientedExtent {
+            x,
+            y,
+            half_width: width_m.abs() / 2.,
+            half_length: length_m / 2.,
+            cos,
+            sin,
+            axis_aligned,
+            extent: Extent::new(x, y, width_m, length_m, angle_deg),
+        }
+    }
+}
+
+/// Повернутые сооружения из построчно записанного массива со столбцами `X`, `Y`, `ANGLE`, `WIDTH`, `LENGTH`.
+pub fn oriented_extents_from_rows(rows: &[f64]) -> Vec<OrientedExtent> {
+    rows.chunks_exact(BUILDING_ARRAY_COLUMNS)
+        .map(|row| OrientedExtent::new(row[X], row[Y], row[WIDTH], row[LENGTH], row[ANGLE]))
+        .collect()
+}
+
+/// Кратен ли угол поворота 90 градусам.
+pub fn is_axis_aligned(angle_deg: f64) -> bool {
+    let remainder = angle_deg.rem_euclid(90.);
+    remainder.min(90. - remainder) < AXIS_ALIGNED_TOLERANCE_DEG
+}
+
+/// Расстояние между сооружениями с произвольными углами поворота, аналог
+/// `force.distance.calculate_oriented_distance_matrix` для одной пары.
+/// Пересечение определяется по теореме о разделяющей оси, для непересекающихся прямоугольников расстояние
+/// равно наименьшему из расстояний от вершин одного прямоугольника до другого. Для пересекающихся равно -1.
+pub fn oriented_distance(first: &OrientedExtent, second: &OrientedExtent) -> f64 {
+    if first.axis_aligned && second.axis_aligned {
+        return distance_between_extents(&first.extent, &second.extent, (0., 0.), (0., 0.));
+    }
+    let delta_x = second.x - first.x;
+    let delta_y = second.y - first.y;
+    // центр второго сооружения в осях первого и центр первого в осях второго,
+    // ось длины повернута по часовой стрелке: (cos, -sin), ось ширины: (sin, cos)
+    let first_local_x = delta_x * first.cos - delta_y * first.sin;
+    let first_local_y = delta_x * first.sin + delta_y * first.cos;
+    let second_local_x = delta_y * second.sin - delta_x * second.cos;
+    let second_local_y = -delta_x * second.sin - delta_y * second.cos;
+    // косинус и синус угла между осями сооружений
+    let cos = first.cos * second.cos + first.sin * second.sin;
+    let sin = first.cos * second.sin - first.sin * second.cos;
+
+    // пересечение: проекции прямоугольников пересекаются на всех четырёх осях
+    let overlap = first_local_x.abs()
+        < first.half_length + second.half_length * cos.abs() + second.half_width * sin.abs()
+        && first_local_y.abs() < first.half_width + second.half_length * sin.abs() + second.half_width * cos.abs()
+        && second_local_x.abs() < second.half_length + first.half_length * cos.abs() + first.half_width * sin.abs()
+        && second_local_y.abs() < second.half_width + first.half_length * sin.abs() + first.half_width * cos.abs();
+    // круг и повернутый прямоугольник: расстояние от центра круга в осях прямоугольника за вычетом радиуса,
+    // пары из двух кругов считаются по габаритам выше
+    if first.extent.radius > 0. || second.extent.radius > 0. {
+        let distance = if second.extent.radius > 0. {
+            point_to_box_distance(first_local_x, first_local_y, first.half_width, first.half_length)
+                - second.extent.radius
+        } else {
+            point_to_box_distance(second_local_x, second_local_y, second.half_width, second.half_length)
+                - first.extent.radius
+        };
+        return if distance < 0. { -1. } else { distance };
+    }
+    if overlap {
+        return -1.;
+    }
+
+    let mut min: f64 = f64::INFINITY;
+    for &(length_sign, width_sign) in &[(-1., -1.), (-1., 1.), (1., -1.), (1., 1.)] {
+        // вершина второго сооружения в осях первого
+        min = min.min(point_to_box_distance(
+            first_local_x + length_sign * second.half_length * cos + width_sign * second.half_width * sin,
+            first_local_y - length_sign * second.half_length * sin + width_sign * second.half_width * cos,
+            first.half_width,
+            first.half_length,
+        ));
+        // вершина первого сооружения в осях второго
+        min = min.min(point_to_box_distance(
+            second_local_x + length_sign * first.half_length * cos - width_sign * first.half_width * sin,
+            second_local_y + length_sign * first.half_length * sin + width_sign * first.half_width * cos,
+            second.half_width,
+            second.half_length,
+        ));
+    }
+    min
+}
+
+/// Расстояние от точки до прямоугольника с центром в начале координат и сторонами вдоль осей.
+fn point_to_box_distance(x: f64, y: f64, half_width: f64, half_length: f64) -> f64 {
+    let gap_x = (x.abs() - half_length).max(0.);
+    let gap_y = (y.abs() - half_width).max(0.);
+    (gap_x.powi(2) + gap_y.powi(2)).sqrt()
+}
+
+/// Матрица расстояний формы (n, m) между сооружениями с произвольными углами поворота, записанная построчно.
+pub fn oriented_distance_matrix(first: &[OrientedExtent], second: &[OrientedExtent]) -> Vec<f64> {
+    first
+        .iter()
+        .flat_map(|first_extent| second.iter().map(move |second_extent| oriented_distance(first_extent, second_extent)))
+        .collect()
+}
+
+/// Минимальное расстояние между сооружениями с произвольными углами поворота.
+/// Возвращает расстояние и индексы пары сооружений, для пустых массивов -- бесконечность.
+pub fn min_oriented_distance(first: &[OrientedExtent], second: &[OrientedExtent]) -> (f64, usize, usize) {
+    let mut min: (f64, usize, usize) = (f64::INFINITY, usize::MAX, usize::MAX);
+    for (first_idx, first_extent) in first.iter().enumerate() {
+        for (second_idx, second_extent) in second.iter().enumerate() {
+            let distance: f64 = oriented_distance(first_extent, second_extent);
+            if distance < min.0 {
+                min = (distance, first_idx, second_idx);
+            }
+        }
+    }
+    min
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_distance() {
+        let first = Extent::new(0., 0., 2., 4., 0.);
+        let second = Extent::new(10., 0., 2., 4., 90.);
+        // 10 - (2 + 1)
+        assert_eq!(distance_between_extents(&first, &second, (0., 0.), (0., 0.)), 7.);
+        assert_eq!(distance_between_extents(&first, &second, (0., 0.), (-8., 0.)), -1.);
+        assert_eq!(distance_between_extents(&first, &second, (0., 0.), (0., 5.)), (49f64 + 4.).sqrt());
+    }
+
+    #[test]
+    fn test_extents_from_rows() {
+        let extents = extents_from_rows(&[1., 2., 90., 2., 4., 3., 4., 0., 2., 4.]);
+        assert_eq!(extents, vec![Extent::new(1., 2., 2., 4., 90.), Extent::new(3., 4., 2., 4., 0.)]);
+        assert_eq!(min_distance(&extents[..1], &extents[1..], (0., 0.), (10., 0.)), (12. - 3., 0, 0));
+    }
+
+    #[test]
+    fn test_circle_distance() {
+        let circle = Extent::new(0., 0., -4., 4., 30.);
+        assert_eq!((circle.half_width, circle.half_length, circle.radius), (2., 2., 2.));
+        assert_eq!(distance_between_extents(&circle, &Extent::new(10., 0., -2., 2., 0.), (0., 0.), (0., 0.)), 7.);
+        // круг напротив угла прямоугольника
+        let rectangle = Extent::new(5., 4., 2., 4., 0.);
+        let corner_distance = distance_between_extents(&circle, &rectangle, (0., 0.), (0., 0.));
+        assert!((corner_distance - (18f64.sqrt() - 2.)).abs() < 1e-12);
+        assert_eq!(distance_between_extents(&circle, &rectangle, (0., 0.), (-1., -3.)), 0.);
+        assert_eq!(distance_between_extents(&circle, &rectangle, (1., 0.), (-1., -3.)), -1.);
+
+        let oriented_circle = OrientedExtent::new(0., 0., -4., 4., 0.);
+        let diamond = OrientedExtent::new(10., 0., 2., 2., 45.);
+        assert!((oriented_distance(&oriented_circle, &diamond) - (8. - 2f64.sqrt())).abs() < 1e-12);
+        assert!((oriented_distance(&diamond, &oriented_circle) - (8. - 2f64.sqrt())).abs() < 1e-12);
+        assert_eq!(oriented_distance(&OrientedExtent::new(7., 0., -4., 4., 0.), &diamond), -1.);
+        // круг выровнен при любом угле, но его косинус и синус не округляются
+        let rotated_circle = OrientedExtent::new(0., 0., -4., 4., 45.);
+        assert!(rotated_circle.axis_aligned);
+        assert!((rotated_circle.cos - 0.5f64.sqrt()).abs() < 1e-12);
+        assert!((rotated_circle.sin - 0.5f64.sqrt()).abs() < 1e-12);
+    }
+
+    #[test]
+    fn test_oriented_distance() {
+        let square = OrientedExtent::new(0., 0., 2., 2., 0.);
+        // квадрат, повернутый на 45 градусов, вершиной к первому: 10 - 1 - sqrt(2)
+        let diamond = OrientedExtent::new(10., 0., 2., 2., 45.);
+        assert!((oriented_distance(&square, &diamond) - (9. - 2f64.sqrt())).abs() < 1e-12);
+        assert!((oriented_distance(&diamond, &square) - (9. - 2f64.sqrt())).abs() < 1e-12);
+        assert_eq!(oriented_distance(&square, &OrientedExtent::new(2.3, 0., 2., 2., 45.)), -1.);
+        assert!(oriented_distance(&square, &OrientedExtent::new(2.5, 0., 2., 2., 45.)) > 0.);
+        // по часовой стрелке: длинная сторона под углом 30 градусов уходит вниз вправо
+        let bar = OrientedExtent::new(0., 0., 0.2, 20., 30.);
+        assert_eq!(oriented_distance(&bar, &OrientedExtent::new(8., -4.5, 1., 1., 0.)), -1.);
+        assert!(oriented_distance(&bar, &OrientedExtent::new(8., 4.5, 1., 1., 0.)) > 5.);
+
+        let first = OrientedExtent::new(-5., 0., 2., 4., 90.);
+        let second = OrientedExtent::new(10., 0., 2., 4., 270.);
+        assert!(first.axis_aligned && second.axis_aligned && is_axis_aligned(-90.));
+        let aligned_distance = distance_between_extents(&first.extent, &second.extent, (0., 0.), (0., 0.));
+        assert_eq!(oriented_distance(&first, &second), aligned_distance);
+        // у углов -90 и -270 длина и ширина меняются местами, как у 90 и 270
+        for angle in &[-90., -270.] {
+            let bar = OrientedExtent::new(0., 0., 2., 10., *angle);
+            assert_eq!(oriented_distance(&bar, &OrientedExtent::new(0., 4.5, 1., 1., 0.)), -1.);
+            assert_eq!(oriented_distance(&bar, &OrientedExtent::new(3., 0., 1., 1., 0.)), 1.5);
+        }
+        let expected = (oriented_distance(&square, &diamond), 1, 1);
+        assert_eq!(min_oriented_distance(&[first, square], &[second, diamond]), expected);
+    }
+}
@@ -0,0 +1,117 @@
+// Силы раскладки кластеров. Чистые функции без зависимостей от pyo3,
+// формулы повторяют `force.layout.calculate_cluster_forces`.
+
+/// Параметры сил раскладки, совпадают с одноименными полями `force.layout.LayoutSettings`.
+#[derive(Copy, Clone, Debug)]
+pub struct ForceSettings {
+    pub repulsion_distance: f64,
+    pub repulsion_strength: f64,
+    pub attraction_strength: f64,
+    pub long_range_strength: f64,
+}
+
+/// Сила отталкивания, действующая на `i`-й кластер со стороны остальных.
+///
+/// Кластеры отталкиваются вдоль линии, соединяющей их центры, если безразмерное расстояние между ними
+/// меньше `repulsion_distance`; величина силы пропорциональна недостающему расстоянию.
+/// Дополнительно все кластеры отталкиваются с силой `long_range_strength / r`.
+/// `distances` -- построчно записанная матрица безразмерных расстояний N×N.
+pub fn repulsion_force(i: usize, centers: &[(f64, f64)], distances: &[f64], settings: &ForceSettings) -> (f64, f64) {
+    let n = centers.len();
+    let (x, y) = centers[i];
+    let mut force = (0., 0.);
+    for j in 0..n {
+        let (delta_x, delta_y) = (x - centers[j].0, y - centers[j].1);
+        let length_sq = delta_x * delta_x + delta_y * delta_y;
+        // у совпадающих центров нет направления
+        if length_sq == 0. {
+            continue;
+        }
+        let magnitude = settings.repulsion_strength * (settings.repulsion_distance - distances[i * n + j]).max(0.);
+        let scale = magnitude / length_sq.sqrt() + settings.long_range_strength / length_sq;
+        force.0 += delta_x * scale;
+        force.1 += delta_y * scale;
+    }
+    force
+}
+
+/// Суммарные силы, действующие на кластеры: отталкивание по безразмерным расстояниям
+/// и притяжение связанных кластеров пропорционально стоимости связи и расстоянию между центрами.
+/// `connections` -- индексы первого и второго кластеров и нормированная стоимость связи.
+pub fn cluster_forces(
+    centers: &[(f64, f64)],
+    distances: &[f64],
+    connections: &[(usize, usize, f64)],
+    settings: &ForceSettings,
+) -> Vec<(f64, f64)> {
+    let mut forces: Vec<(f64, f64)> = (0..centers.len())
+        .map(|i| repulsion_force(i, centers, distances, settings))
+        .collect();
+    add_attraction_forces(&mut forces, centers, connections, settings);
+    forces
+}
+
+/// Добавляет к силам притяжение связанных кластеров.
+pub fn add_attraction_forces(
+    forces: &mut [(f64, f64)],
+    centers: &[(f64, f64)],
+    connections: &[(usize, usize, f64)],
+    settings: &ForceSettings,
+) {
+    for &(first, second, cost) in connections {
+        let pull_x = settings.attraction_strength * cost * (centers[second].0 - centers[first].0);
+        let pull_y = settings.attraction_strength * cost * (centers[second].1 - centers[first].1);
+        forces[first].0 += pull_x;
+        forces[first].1 += pull_y;
+        forces[second].0 -= pull_x;
+        forces[second].1 -= pull_y;
+    }
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    const SETTINGS: ForceSettings = ForceSettings {
+        repulsion_distance: 1.,
+        repulsion_strength: 2.,
+        attraction_strength: 0.5,
+        long_range_strength: 0.,
+    };
+
+    #[test]
+    fn close_clusters_repel() {
+        let centers = [(0., 0.), (3., 4.)];
+        let distances = [f64::INFINITY, 0.5, 0.5, f64::INFINITY];
+        let forces = cluster_forces(&centers, &distances, &[], &SETTINGS);
+        // величина силы 2 * (1 - 0.5) = 1, направление от второго кластера к первому
+        assert!((forces[0].0 + 0.6).abs() < 1e-12 && (forces[0].1 + 0.8).abs() < 1e-12);
+        assert!((forces[1].0 - 0.6).abs() < 1e-12 && (forces[1].1 - 0.8).abs() < 1e-12);
+    }
+
+    #[test]
+    fn far_clusters_do_not_repel() {
+        let centers = [(0., 0.), (3., 4.)];
+        let distances = [f64::INFINITY, 2., 2., f64::INFINITY];
+        assert_eq!(cluster_forces(&centers, &distances, &[], &SETTINGS), vec![(0., 0.), (0., 0.)]);
+    }
+
+    #[test]
+    fn connected_clusters_attract() {
+        let centers = [(0., 0.), (4., 0.)];
+        let distances = [f64::INFINITY, 2., 2., f64::INFINITY];
+        let forces = cluster_forces(&centers, &distances, &[(0, 1, 0.25)], &SETTINGS);
+        assert_eq!(forces, vec![(0.5, 0.), (-0.5, 0.)]);
+    }
+
+    #[test]
+    fn long_range_repulsion_decreases_with_distance() {
+        let settings = ForceSettings { long_range_strength: 10., ..SETTINGS };
+        let centers = [(0., 0.), (4., 0.), (0., 8.)];
+        let distances = [f64::INFINITY, 2., 2., 2., f64::INFINITY, 2., 2., 2., f64::INFINITY];
+        let forces = cluster_forces(&centers, &distances, &[], &settings);
+        // 10 / 4 от второго кластера и 10 / 8 от третьего
+        assert!((forces[0].0 + 2.5).abs() < 1e-12 && (forces[0].1 + 1.25).abs() < 1e-12);
+    }
+}
@@ -1,6 +1,9 @@
+use numpy::{PyArray1, PyArray2, PyReadonlyArray1, PyReadonlyArray2};
+use pyo3::exceptions::{PyKeyError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::wrap_pyfunction;
 use rayon::prelude::*;
+use std::borrow::Cow;
 use std::collections::HashMap;
 use std::fs::File;
 use std::io::Read;
@@ -8,7 +11,13 @@ use std::io::Read;
 extern crate lazy_static;
 
 
+mod kernel;
+mod layout;
 mod model;
+mod offsets;
+mod pairs;
+mod parallel;
+mod spatial;
 
 #[cfg(test)]
 mod tests {
@@ -21,6 +30,7 @@ mod tests {
 
 #[pyfunction]
 fn calculate_distance_between_two_clusters_parallel(
+    py: Python,
     // создать структуру кластера, которая имплементит Copy и содержит Vec<Building> нельзя,
     // тк Vec в rust не имплементит Copy, поэтому такие аргументы
     first_cluster_buildings: Vec<model::Building>,
@@ -28,76 +38,713 @@ fn calculate_distance_between_two_clusters_parallel(
     first_cluster_position: model::ClusterPosition,
     second_cluster_position: model::ClusterPosition,
 ) -> f64 {
-    let mut first_cluster_buildings = first_cluster_buildings.clone();
-    let mut second_cluster_buildings = second_cluster_buildings.clone();
+    py.allow_threads(|| parallel::install(|| {
+        let mut first_cluster_buildings = first_cluster_buildings.clone();
+        let mut second_cluster_buildings = second_cluster_buildings.clone();
 
-    // пересчитываем позиции сооружений с учетом положения кластера
-    first_cluster_buildings.par_iter_mut().for_each(|b| {
-        b.position = _get_global_position_for_building(b.position, first_cluster_position)
-    });
-    second_cluster_buildings.par_iter_mut().for_each(|b| {
-        b.position = _get_global_position_for_building(b.position, second_cluster_position)
-    });
+        // пересчитываем позиции сооружений с учетом положения кластера
+        first_cluster_buildings.par_iter_mut().for_each(|b| {
+            b.position = _get_global_position_for_building(b.position, first_cluster_position)
+        });
+        second_cluster_buildings.par_iter_mut().for_each(|b| {
+            b.position = _get_global_position_for_building(b.position, second_cluster_position)
+        });
 
-    let min: f64 = first_cluster_buildings
-        .par_iter()
-        .flat_map(|b1| (second_cluster_buildings.par_iter().map(move |b2| (b1, b2))))
-        .map(|(b1, b2)| {
-            calculate_distance_between_two_buildings(*b1, *b2)
-        })
-        .reduce(|| f64::INFINITY, |a, b| a.min(b));
+        let min: f64 = first_cluster_buildings
+            .par_iter()
+            .flat_map(|b1| (second_cluster_buildings.par_iter().map(move |b2| (b1, b2))))
+            .map(|(b1, b2)| {
+                calculate_distance_between_two_buildings(*b1, *b2)
+            })
+            .reduce(|| f64::INFINITY, |a, b| a.min(b));
 
-    return min;
+        return min;
+    }))
 }
 
 lazy_static! {
     // "гениальное" решение для одноразовой инициализации оффсетов во избежание копирования по 100 раз
-    static ref BUILDING_OFFSET_RULES: HashMap<String, f64> = initialize_building_offset_rules();
+    static ref BUILDING_OFFSET_RULES: offsets::OffsetTable = initialize_building_offset_rules();
 }
 
 
-fn initialize_building_offset_rules() -> HashMap<String, f64> {
+fn initialize_building_offset_rules() -> offsets::OffsetTable {
     let mut file = File::open("offsets.json").unwrap();
     let mut buff = String::new();
     file.read_to_string(&mut buff).unwrap();
 
     let map: HashMap<String, f64> = serde_json::from_str(&buff).unwrap();
-    map
+    offsets::OffsetTable::from_keyed_rules(&map).unwrap()
+}
 
+/// Индексы сооружений в таблице оффсетов, id переводятся в индексы один раз на вызов, а не на каждую пару.
+fn get_offset_indices(table: &offsets::OffsetTable, buildings: &[model::Building]) -> PyResult<Vec<usize>> {
+    get_building_id_offset_indices(table, buildings.iter().map(|b| &b.id))
+}
+
+fn get_building_id_offset_indices<'a, I: Iterator<Item = &'a uuid::Uuid>>(
+    table: &offsets::OffsetTable,
+    building_ids: I,
+) -> PyResult<Vec<usize>> {
+    building_ids
+        .map(|id| {
+            table
+                .index(id)
+                .ok_or_else(|| PyKeyError::new_err(format!("no offset rules for building {}", id)))
+        })
+        .collect()
+}
+
+/// Переданные правила оффсетов или, если они не заданы, правила из `offsets.json`.
+fn get_offset_table<'a>(offset_rules: &'a Option<PyRef<model::OffsetRules>>) -> &'a offsets::OffsetTable {
+    match offset_rules {
+        Some(rules) => &rules.table,
+        None => &*BUILDING_OFFSET_RULES,
+    }
 }
 
 #[pyfunction]
-unsafe fn calculate_normalized_distance_between_two_clusters(
+fn calculate_normalized_distance_between_two_clusters(
+    py: Python,
     first_cluster_buildings: Vec<model::Building>,
     second_cluster_buildings: Vec<model::Building>,
     first_cluster_position: model::ClusterPosition,
     second_cluster_position: model::ClusterPosition,
-) -> (f64, f64) {
-    let mut first_cluster = first_cluster_buildings.clone();
-    let mut second_cluster = second_cluster_buildings.clone();
-
-    // пересчитываем позиции сооружений с учетом положения кластера
-    for building in &mut first_cluster {
-        building.position = _get_global_position_for_building(building.position, first_cluster_position)
-    }
-    for building in &mut second_cluster {
-        building.position = _get_global_position_for_building(building.position, second_cluster_position)
-    }
-
-    let mut min_distance: f64 = f64::INFINITY;
-    let mut offset_for_min_distance: f64 = 0.;
-    for first_building in first_cluster {
-        for second_building in &second_cluster {
-            let key = format!("{}_{}", first_building.id, second_building.id);
-            let offset: f64 = BUILDING_OFFSET_RULES[&key];
-            let distance: f64 = calculate_distance_between_two_buildings(first_building, *second_building) / offset ;
-            if distance < min_distance {
-                min_distance = distance;
-                offset_for_min_distance = offset;
-            }
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<(f64, f64)> {
+    let table = get_offset_table(&offset_rules);
+    let first_indices = get_offset_indices(table, &first_cluster_buildings)?;
+    let second_indices = get_offset_indices(table, &second_cluster_buildings)?;
+    let first_extents: Vec<kernel::Extent> = first_cluster_buildings.iter().map(|b| b.extent()).collect();
+    let second_extents: Vec<kernel::Extent> = second_cluster_buildings.iter().map(|b| b.extent()).collect();
+
+    let (min_distance, offset_for_min_distance, _, _) = py.allow_threads(|| {
+        kernel::min_normalized_distance(
+            &first_extents,
+            &second_extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            |i, j| table.offset(first_indices[i], second_indices[j]),
+        )
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    return Ok((min_distance, offset_for_min_distance));
+}
+
+/// Построчные данные массива сооружений формы (n, 5). C-упорядоченный массив читается без копирования,
+/// остальные (например, F-упорядоченные или срезы) копируются построчно.
+fn get_building_rows<'a>(buildings: &'a PyReadonlyArray2<f64>) -> PyResult<Cow<'a, [f64]>> {
+    let array = buildings.as_array();
+    if array.ncols() != kernel::BUILDING_ARRAY_COLUMNS {
+        return Err(PyValueError::new_err(format!(
+            "building array must have {} columns: x, y, angle, width, length",
+            kernel::BUILDING_ARRAY_COLUMNS
+        )));
+    }
+    // `as_slice` успешен и для F-упорядоченного массива, но тогда данные идут по столбцам
+    if buildings.is_c_contiguous() {
+        if let Ok(rows) = buildings.as_slice() {
+            return Ok(Cow::Borrowed(rows));
         }
     }
-    return (min_distance, offset_for_min_distance);
+    Ok(Cow::Owned(array.iter().copied().collect()))
+}
+
+/// Индексы сооружений в таблице оффсетов, проверенные на выход за границы таблицы.
+fn get_offset_index_slice<'a>(
+    indices: &'a PyReadonlyArray1<i64>,
+    building_count: usize,
+    table: &offsets::OffsetTable,
+) -> PyResult<&'a [i64]> {
+    let indices = indices.as_slice().map_err(|_| PyValueError::new_err("index array must be C-contiguous"))?;
+    if indices.len() != building_count {
+        return Err(PyValueError::new_err("index array length must match building array"));
+    }
+    if indices.iter().any(|&idx| idx < 0 || idx as usize >= table.building_count()) {
+        return Err(PyKeyError::new_err("offset index is out of range"));
+    }
+    Ok(indices)
+}
+
+/// Аналог `calculate_distance_between_two_clusters` для массивов сооружений формы (n, 5)
+/// со столбцами x, y, angle, width, length в локальных координатах кластеров.
+#[pyfunction]
+fn calculate_distance_between_two_clusters_array(
+    py: Python,
+    first_cluster_buildings: PyReadonlyArray2<f64>,
+    second_cluster_buildings: PyReadonlyArray2<f64>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+) -> PyResult<f64> {
+    let first_rows = get_building_rows(&first_cluster_buildings)?;
+    let second_rows = get_building_rows(&second_cluster_buildings)?;
+    let (min, _, _) = py.allow_threads(|| {
+        kernel::min_distance(
+            &kernel::extents_from_rows(&first_rows),
+            &kernel::extents_from_rows(&second_rows),
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+        )
+    });
+    return Ok(min);
+}
+
+/// Аналог `calculate_normalized_distance_between_two_clusters` для массивов сооружений
+/// и индексов сооружений в `offset_rules` (см. `OffsetRules.get_indices`).
+#[pyfunction]
+fn calculate_normalized_distance_between_two_clusters_array(
+    py: Python,
+    first_cluster_buildings: PyReadonlyArray2<f64>,
+    second_cluster_buildings: PyReadonlyArray2<f64>,
+    first_offset_indices: PyReadonlyArray1<i64>,
+    second_offset_indices: PyReadonlyArray1<i64>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+    offset_rules: PyRef<model::OffsetRules>,
+) -> PyResult<(f64, f64)> {
+    let table = &offset_rules.table;
+    let first_rows = get_building_rows(&first_cluster_buildings)?;
+    let second_rows = get_building_rows(&second_cluster_buildings)?;
+    let first_count = first_rows.len() / kernel::BUILDING_ARRAY_COLUMNS;
+    let second_count = second_rows.len() / kernel::BUILDING_ARRAY_COLUMNS;
+    let first_indices = get_offset_index_slice(&first_offset_indices, first_count, table)?;
+    let second_indices = get_offset_index_slice(&second_offset_indices, second_count, table)?;
+
+    let (min_distance, offset_for_min_distance, _, _) = py.allow_threads(|| {
+        kernel::min_normalized_distance(
+            &kernel::extents_from_rows(&first_rows),
+            &kernel::extents_from_rows(&second_rows),
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            |i, j| table.offset(first_indices[i] as usize, second_indices[j] as usize),
+        )
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    return Ok((min_distance, offset_for_min_distance));
+}
+
+/// Единая точка входа для расчета расстояния между кластерами: при количестве пар сооружений
+/// меньше порога (см. `set_parallel_threshold`) расчет последовательный, иначе -- параллельный.
+#[pyfunction]
+fn calculate_distance_between_two_clusters_adaptive(
+    py: Python,
+    first_cluster_buildings: Vec<model::Building>,
+    second_cluster_buildings: Vec<model::Building>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+) -> f64 {
+    let first_extents: Vec<kernel::Extent> = first_cluster_buildings.iter().map(|b| b.extent()).collect();
+    let second_extents: Vec<kernel::Extent> = second_cluster_buildings.iter().map(|b| b.extent()).collect();
+    let (min, _, _) = py.allow_threads(|| {
+        parallel::min_distance_adaptive(
+            &first_extents,
+            &second_extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+        )
+    });
+    return min;
+}
+
+/// Единая точка входа для расчета безразмерного расстояния между кластерами,
+/// выбирающая последовательный или параллельный расчет по количеству пар сооружений.
+#[pyfunction]
+fn calculate_normalized_distance_between_two_clusters_adaptive(
+    py: Python,
+    first_cluster_buildings: Vec<model::Building>,
+    second_cluster_buildings: Vec<model::Building>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<(f64, f64)> {
+    let table = get_offset_table(&offset_rules);
+    let first_indices = get_offset_indices(table, &first_cluster_buildings)?;
+    let second_indices = get_offset_indices(table, &second_cluster_buildings)?;
+    let first_extents: Vec<kernel::Extent> = first_cluster_buildings.iter().map(|b| b.extent()).collect();
+    let second_extents: Vec<kernel::Extent> = second_cluster_buildings.iter().map(|b| b.extent()).collect();
+
+    let (min_distance, offset_for_min_distance, _, _) = py.allow_threads(|| {
+        parallel::min_normalized_distance_adaptive(
+            &first_extents,
+            &second_extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            |i, j| table.offset(first_indices[i], second_indices[j]),
+        )
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    return Ok((min_distance, offset_for_min_distance));
+}
+
+/// Порог количества пар сооружений, начиная с которого `*_adaptive` функции считают параллельно.
+#[pyfunction]
+fn set_parallel_threshold(pair_count: usize) {
+    parallel::set_parallel_threshold(pair_count);
+}
+
+#[pyfunction]
+fn get_parallel_threshold() -> usize {
+    parallel::parallel_threshold()
+}
+
+/// Размер пула потоков для параллельных функций, 0 -- пул rayon по умолчанию (по числу ядер).
+#[pyfunction]
+fn set_num_threads(num_threads: usize) -> PyResult<()> {
+    parallel::set_num_threads(num_threads).map_err(PyValueError::new_err)
+}
+
+#[pyfunction]
+fn get_num_threads() -> usize {
+    parallel::current_num_threads()
+}
+
+/// Пары кластеров (i, j), i < j.
+fn get_cluster_pairs(cluster_count: usize) -> Vec<(usize, usize)> {
+    (0..cluster_count)
+        .flat_map(|i| ((i + 1)..cluster_count).map(move |j| (i, j)))
+        .collect()
+}
+
+/// Симметричная матрица N×N из значений для пар кластеров, на диагонали `diagonal`.
+fn to_square_matrix<'py>(
+    py: Python<'py>,
+    cluster_count: usize,
+    pairs: &[(usize, usize)],
+    values: &[f64],
+    diagonal: f64,
+) -> PyResult<&'py PyArray2<f64>> {
+    let mut matrix = vec![diagonal; cluster_count * cluster_count];
+    for (&(i, j), &value) in pairs.iter().zip(values) {
+        matrix[i * cluster_count + j] = value;
+        matrix[j * cluster_count + i] = value;
+    }
+    PyArray1::from_vec(py, matrix).reshape([cluster_count, cluster_count])
+}
+
+fn get_cluster_extents(clusters: &[Vec<model::Building>]) -> Vec<Vec<kernel::Extent>> {
+    clusters.iter().map(|c| c.iter().map(|b| b.extent()).collect()).collect()
+}
+
+/// Матрица N×N минимальных расстояний между всеми парами кластеров за один вызов.
+/// Пары кластеров считаются параллельно, на диагонали -- бесконечность.
+#[pyfunction]
+fn calculate_distance_matrix_between_clusters<'py>(
+    py: Python<'py>,
+    clusters: Vec<Vec<model::Building>>,
+    cluster_positions: Vec<model::ClusterPosition>,
+) -> PyResult<&'py PyArray2<f64>> {
+    if clusters.len() != cluster_positions.len() {
+        return Err(PyValueError::new_err("clusters and cluster_positions must have the same length"));
+    }
+    let extents = get_cluster_extents(&clusters);
+    let pairs = get_cluster_pairs(clusters.len());
+    let distances: Vec<f64> = py.allow_threads(|| parallel::install(|| {
+        pairs
+            .par_iter()
+            .map(|&(i, j)| {
+                kernel::min_distance(
+                    &extents[i],
+                    &extents[j],
+                    (cluster_positions[i].x, cluster_positions[i].y),
+                    (cluster_positions[j].x, cluster_positions[j].y),
+                ).0
+            })
+            .collect()
+    }));
+    to_square_matrix(py, clusters.len(), &pairs, &distances, f64::INFINITY)
+}
+
+/// Матрицы N×N минимальных безразмерных расстояний и соответствующих оффсетов между всеми парами кластеров.
+/// Правила оффсетов считаются симметричными, значение для пары (i, j) вычисляется с i-м кластером в роли первого.
+/// На диагонали -- бесконечность и нулевой оффсет.
+#[pyfunction]
+fn calculate_normalized_distance_matrix_between_clusters<'py>(
+    py: Python<'py>,
+    clusters: Vec<Vec<model::Building>>,
+    cluster_positions: Vec<model::ClusterPosition>,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<(&'py PyArray2<f64>, &'py PyArray2<f64>)> {
+    if clusters.len() != cluster_positions.len() {
+        return Err(PyValueError::new_err("clusters and cluster_positions must have the same length"));
+    }
+    let table = get_offset_table(&offset_rules);
+    let indices = clusters
+        .iter()
+        .map(|c| get_offset_indices(table, c))
+        .collect::<PyResult<Vec<Vec<usize>>>>()?;
+    let extents = get_cluster_extents(&clusters);
+    let pairs = get_cluster_pairs(clusters.len());
+    let results: Option<Vec<(f64, f64)>> = py.allow_threads(|| parallel::install(|| {
+        pairs
+            .par_iter()
+            .map(|&(i, j)| {
+                kernel::min_normalized_distance(
+                    &extents[i],
+                    &extents[j],
+                    (cluster_positions[i].x, cluster_positions[i].y),
+                    (cluster_positions[j].x, cluster_positions[j].y),
+                    |a, b| table.offset(indices[i][a], indices[j][b]),
+                ).map(|(distance, offset, _, _)| (distance, offset))
+            })
+            .collect()
+    }));
+    let results = results.ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    let distances: Vec<f64> = results.iter().map(|r| r.0).collect();
+    let offsets: Vec<f64> = results.iter().map(|r| r.1).collect();
+    Ok((
+        to_square_matrix(py, clusters.len(), &pairs, &distances, f64::INFINITY)?,
+        to_square_matrix(py, clusters.len(), &pairs, &offsets, 0.)?,
+    ))
+}
+
+/// Силы раскладки кластеров формы (N, 2), см. `force.layout.calculate_cluster_forces`.
+/// Отталкивание считается параллельно по кластерам.
+#[pyfunction]
+fn calculate_cluster_forces<'py>(
+    py: Python<'py>,
+    centers: PyReadonlyArray2<f64>,
+    distances: PyReadonlyArray2<f64>,
+    connection_indices: PyReadonlyArray2<i64>,
+    connection_costs: PyReadonlyArray1<f64>,
+    repulsion_distance: f64,
+    repulsion_strength: f64,
+    attraction_strength: f64,
+    long_range_strength: f64,
+) -> PyResult<&'py PyArray2<f64>> {
+    let centers = centers.as_array();
+    let distances = distances.as_array();
+    let connection_indices = connection_indices.as_array();
+    let connection_costs = connection_costs.as_array();
+    let n = centers.shape()[0];
+    if centers.shape()[1] != 2 || distances.shape() != [n, n] {
+        return Err(PyValueError::new_err("expected centers of shape (N, 2) and distances of shape (N, N)"));
+    }
+    if connection_indices.shape() != [connection_costs.len(), 2] {
+        return Err(PyValueError::new_err("expected connection_indices of shape (k, 2) matching connection_costs"));
+    }
+    let mut connections: Vec<(usize, usize, f64)> = Vec::with_capacity(connection_costs.len());
+    for (k, cost) in connection_costs.iter().enumerate() {
+        let (first, second) = (connection_indices[[k, 0]], connection_indices[[k, 1]]);
+        if first < 0 || second < 0 || first as usize >= n || second as usize >= n {
+            return Err(PyValueError::new_err("connection index is out of range"));
+        }
+        connections.push((first as usize, second as usize, *cost));
+    }
+    let centers: Vec<(f64, f64)> = (0..n).map(|i| (centers[[i, 0]], centers[[i, 1]])).collect();
+    let distances: Vec<f64> = distances.iter().cloned().collect();
+    let settings = layout::ForceSettings {
+        repulsion_distance,
+        repulsion_strength,
+        attraction_strength,
+        long_range_strength,
+    };
+
+    let forces = py.allow_threads(|| parallel::install(|| {
+        let mut forces: Vec<(f64, f64)> = (0..n)
+            .into_par_iter()
+            .map(|i| layout::repulsion_force(i, &centers, &distances, &settings))
+            .collect();
+        layout::add_attraction_forces(&mut forces, &centers, &connections, &settings);
+        forces
+    }));
+    let values: Vec<f64> = forces.iter().flat_map(|&(fx, fy)| vec![fx, fy]).collect();
+    PyArray1::from_vec(py, values).reshape([n, 2])
+}
+
+/// Минимальное расстояние между сооружениями двух подготовленных кластеров.
+/// Пары ячеек сеток кластеров перебираются по возрастанию расстояния между их габаритами.
+#[pyfunction]
+fn calculate_distance_between_prepared_clusters(
+    py: Python,
+    first_cluster: PyRef<model::PreparedCluster>,
+    second_cluster: PyRef<model::PreparedCluster>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+) -> f64 {
+    let first_cluster: &model::PreparedCluster = &first_cluster;
+    let second_cluster: &model::PreparedCluster = &second_cluster;
+    py.allow_threads(|| {
+        let (min, _, _) = spatial::min_distance(
+            &first_cluster.index,
+            &second_cluster.index,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+        );
+        min
+    })
+}
+
+/// Минимальное безразмерное расстояние между сооружениями двух подготовленных кластеров и оффсет для него.
+#[pyfunction]
+fn calculate_normalized_distance_between_prepared_clusters(
+    py: Python,
+    first_cluster: PyRef<model::PreparedCluster>,
+    second_cluster: PyRef<model::PreparedCluster>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<(f64, f64)> {
+    let table = get_offset_table(&offset_rules);
+    let first_cluster: &model::PreparedCluster = &first_cluster;
+    let second_cluster: &model::PreparedCluster = &second_cluster;
+    let first_indices = get_building_id_offset_indices(table, first_cluster.building_ids.iter())?;
+    let second_indices = get_building_id_offset_indices(table, second_cluster.building_ids.iter())?;
+
+    let (min_distance, offset_for_min_distance, _, _) = py.allow_threads(|| {
+        kernel::min_normalized_distance(
+            &first_cluster.index.extents,
+            &second_cluster.index.extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            |i, j| table.offset(first_indices[i], second_indices[j]),
+        )
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    Ok((min_distance, offset_for_min_distance))
+}
+
+/// Есть ли пара сооружений двух подготовленных кластеров, расстояние между которыми меньше `threshold`.
+/// В отличие от расчета минимального расстояния перебор прекращается на первой найденной паре.
+#[pyfunction]
+fn is_distance_between_prepared_clusters_less_than(
+    py: Python,
+    first_cluster: PyRef<model::PreparedCluster>,
+    second_cluster: PyRef<model::PreparedCluster>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+    threshold: f64,
+) -> bool {
+    let first_cluster: &model::PreparedCluster = &first_cluster;
+    let second_cluster: &model::PreparedCluster = &second_cluster;
+    let max_offsets = vec![1.; first_cluster.building_ids.len()];
+    py.allow_threads(|| {
+        pairs::any_closer_than(
+            &first_cluster.index.extents,
+            &second_cluster.index.extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            &max_offsets,
+            1.,
+            threshold,
+            |_, _| 1.,
+        ) == Some(true)
+    })
+}
+
+/// Есть ли пара сооружений двух подготовленных кластеров, безразмерное расстояние между которыми меньше `threshold`,
+/// например, нарушающая оффсет при `threshold` = 1.
+#[pyfunction]
+fn is_normalized_distance_between_prepared_clusters_less_than(
+    py: Python,
+    first_cluster: PyRef<model::PreparedCluster>,
+    second_cluster: PyRef<model::PreparedCluster>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
+    threshold: f64,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<bool> {
+    let table = get_offset_table(&offset_rules);
+    let first_cluster: &model::PreparedCluster = &first_cluster;
+    let second_cluster: &model::PreparedCluster = &second_cluster;
+    let first_indices = get_building_id_offset_indices(table, first_cluster.building_ids.iter())?;
+    let second_indices = get_building_id_offset_indices(table, second_cluster.building_ids.iter())?;
+    let first_max_offsets: Vec<f64> = first_indices.iter().map(|&idx| table.max_offset(idx)).collect();
+    let second_max_offset = second_indices.iter().fold(0., |max: f64, &idx| max.max(table.max_offset(idx)));
+
+    py.allow_threads(|| {
+        pairs::any_closer_than(
+            &first_cluster.index.extents,
+            &second_cluster.index.extents,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+            &first_max_offsets,
+            second_max_offset,
+            threshold,
+            |i, j| table.offset(first_indices[i], second_indices[j]),
+        )
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))
+}
+
+/// Маска пар подготовленных кластеров, между которыми есть пара сооружений с безразмерным расстоянием
+/// меньше `threshold`. `cluster_pairs` -- индексы пар кластеров формы (k, 2).
+/// Пары кластеров, габариты которых удалены не меньше чем на `threshold` наибольших оффсетов, отсекаются
+/// без перебора сооружений; при большом количестве пар сооружений пары кластеров считаются параллельно.
+#[pyfunction]
+fn find_prepared_cluster_pairs_closer_than<'py>(
+    py: Python<'py>,
+    clusters: Vec<PyRef<model::PreparedCluster>>,
+    cluster_positions: Vec<model::ClusterPosition>,
+    cluster_pairs: PyReadonlyArray2<i64>,
+    threshold: f64,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<&'py PyArray1<bool>> {
+    if clusters.len() != cluster_positions.len() {
+        return Err(PyValueError::new_err("cluster positions must match clusters"));
+    }
+    let cluster_pairs = cluster_pairs.as_array();
+    if cluster_pairs.ncols() != 2 {
+        return Err(PyValueError::new_err("cluster pairs must have shape (K, 2)"));
+    }
+    let mut pair_indices: Vec<(usize, usize)> = Vec::with_capacity(cluster_pairs.nrows());
+    for pair in cluster_pairs.outer_iter() {
+        if pair.iter().any(|&idx| idx < 0 || idx as usize >= clusters.len()) {
+            return Err(PyValueError::new_err("cluster index is out of range"));
+        }
+        pair_indices.push((pair[0] as usize, pair[1] as usize));
+    }
+
+    let table = get_offset_table(&offset_rules);
+    let clusters: Vec<&model::PreparedCluster> = clusters.iter().map(|cluster| &**cluster).collect();
+    let indices = clusters
+        .iter()
+        .map(|cluster| get_building_id_offset_indices(table, cluster.building_ids.iter()))
+        .collect::<PyResult<Vec<Vec<usize>>>>()?;
+    let max_offsets: Vec<Vec<f64>> = indices
+        .iter()
+        .map(|cluster_indices| cluster_indices.iter().map(|&idx| table.max_offset(idx)).collect())
+        .collect();
+    let cluster_max_offsets: Vec<f64> = max_offsets
+        .iter()
+        .map(|offsets| offsets.iter().fold(0., |max: f64, &offset| max.max(offset)))
+        .collect();
+    let shifts: Vec<(f64, f64)> = cluster_positions.iter().map(|position| (position.x, position.y)).collect();
+    let building_pair_count: usize = pair_indices
+        .iter()
+        .map(|&(i, j)| clusters[i].building_ids.len() * clusters[j].building_ids.len())
+        .sum();
+
+    let is_closer = |&(i, j): &(usize, usize)| -> Option<bool> {
+        let gap = clusters[i].bounds.shifted(shifts[i]).lower_bound(&clusters[j].bounds.shifted(shifts[j]));
+        if pairs::lower_bound(gap, cluster_max_offsets[i].min(cluster_max_offsets[j])) >= threshold {
+            return Some(false);
+        }
+        pairs::any_closer_than(
+            &clusters[i].index.extents,
+            &clusters[j].index.extents,
+            shifts[i],
+            shifts[j],
+            &max_offsets[i],
+            cluster_max_offsets[j],
+            threshold,
+            |a, b| table.offset(indices[i][a], indices[j][b]),
+        )
+    };
+    let mask: Option<Vec<bool>> = py.allow_threads(|| {
+        if parallel::is_parallel(building_pair_count) {
+            parallel::install(|| pair_indices.par_iter().map(is_closer).collect())
+        } else {
+            pair_indices.iter().map(is_closer).collect()
+        }
+    });
+    let mask = mask.ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    Ok(PyArray1::from_vec(py, mask))
+}
+
+/// `k` ближайших по безразмерному расстоянию пар сооружений из разных подготовленных кластеров.
+/// Пары кластеров и сооружения отсекаются по габаритам, найденные пары хранятся в куче размера `k`.
+/// Возвращает кортежи (индекс первого кластера, индекс второго кластера, id первого сооружения,
+/// id второго сооружения, безразмерное расстояние, оффсет) по возрастанию расстояния.
+#[pyfunction]
+fn find_closest_building_pairs(
+    py: Python,
+    clusters: Vec<PyRef<model::PreparedCluster>>,
+    cluster_positions: Vec<model::ClusterPosition>,
+    k: usize,
+    offset_rules: Option<PyRef<model::OffsetRules>>,
+) -> PyResult<Vec<(usize, usize, String, String, f64, f64)>> {
+    if clusters.len() != cluster_positions.len() {
+        return Err(PyValueError::new_err("cluster positions must match clusters"));
+    }
+    let table = get_offset_table(&offset_rules);
+    let clusters: Vec<&model::PreparedCluster> = clusters.iter().map(|cluster| &**cluster).collect();
+    let indices = clusters
+        .iter()
+        .map(|cluster| get_building_id_offset_indices(table, cluster.building_ids.iter()))
+        .collect::<PyResult<Vec<Vec<usize>>>>()?;
+    let max_offsets: Vec<Vec<f64>> = indices
+        .iter()
+        .map(|cluster_indices| cluster_indices.iter().map(|&idx| table.max_offset(idx)).collect())
+        .collect();
+    let extents: Vec<&[kernel::Extent]> = clusters.iter().map(|cluster| cluster.index.extents.as_slice()).collect();
+    let shifts: Vec<(f64, f64)> = cluster_positions.iter().map(|position| (position.x, position.y)).collect();
+
+    let closest = py.allow_threads(|| {
+        pairs::closest_building_pairs(&extents, &shifts, &max_offsets, k, |first, i, second, j| {
+            table.offset(indices[first][i], indices[second][j])
+        })
+    }).ok_or_else(|| PyKeyError::new_err("offset rule is not defined for a pair of buildings"))?;
+    Ok(closest
+        .iter()
+        .map(|pair| (
+            pair.first_cluster,
+            pair.second_cluster,
+            clusters[pair.first_cluster].building_ids[pair.first_idx].to_string(),
+            clusters[pair.second_cluster].building_ids[pair.second_idx].to_string(),
+            pair.distance,
+            pair.offset,
+        ))
+        .collect())
+}
+
+/// Все пары пересекающихся сооружений площадки, аналог `force.spatial.find_overlapping_buildings`.
+/// `buildings` -- массив сооружений в глобальных координатах формы (n, 5).
+/// Возвращает массив индексов пар формы (k, 2), первый индекс меньше второго, пары упорядочены по возрастанию.
+#[pyfunction]
+fn find_overlapping_buildings<'py>(
+    py: Python<'py>,
+    buildings: PyReadonlyArray2<f64>,
+    cell_size: Option<f64>,
+) -> PyResult<&'py PyArray2<i64>> {
+    let extents = kernel::extents_from_rows(&get_building_rows(&buildings)?);
+    let pairs = py.allow_threads(|| parallel::overlapping_pairs_adaptive(&extents, cell_size));
+    let indices: Vec<i64> = pairs.iter().flat_map(|&(first, second)| vec![first as i64, second as i64]).collect();
+    PyArray1::from_vec(py, indices).reshape([pairs.len(), 2])
+}
+
+/// Матрица расстояний между сооружениями с произвольными углами поворота,
+/// аналог `force.distance.calculate_oriented_distance_matrix`.
+/// `first_buildings` и `second_buildings` -- массивы сооружений в глобальных координатах формы (n, 5) и (m, 5).
+#[pyfunction]
+fn calculate_oriented_distance_matrix<'py>(
+    py: Python<'py>,
+    first_buildings: PyReadonlyArray2<f64>,
+    second_buildings: PyReadonlyArray2<f64>,
+) -> PyResult<&'py PyArray2<f64>> {
+    let first_extents = kernel::oriented_extents_from_rows(&get_building_rows(&first_buildings)?);
+    let second_extents = kernel::oriented_extents_from_rows(&get_building_rows(&second_buildings)?);
+    let distances = py.allow_threads(|| parallel::oriented_distance_matrix_adaptive(&first_extents, &second_extents));
+    PyArray1::from_vec(py, distances).reshape([first_extents.len(), second_extents.len()])
+}
+
+/// Минимальное расстояние между сооружениями с произвольными углами поворота и индексы пары сооружений,
+/// аналог `force.distance.calculate_min_distance` с `oriented=True`.
+#[pyfunction]
+fn calculate_min_oriented_distance(
+    py: Python,
+    first_buildings: PyReadonlyArray2<f64>,
+    second_buildings: PyReadonlyArray2<f64>,
+) -> PyResult<(f64, (usize, usize))> {
+    let first_extents = kernel::oriented_extents_from_rows(&get_building_rows(&first_buildings)?);
+    let second_extents = kernel::oriented_extents_from_rows(&get_building_rows(&second_buildings)?);
+    if first_extents.is_empty() || second_extents.is_empty() {
+        return Err(PyValueError::new_err("clusters must not be empty"));
+    }
+    let (min, first_idx, second_idx) =
+        py.allow_threads(|| kernel::min_oriented_distance(&first_extents, &second_extents));
+    Ok((min, (first_idx, second_idx)))
+}
+
+/// Выгрузка списка сооружений в массив формы (n, 5) со столбцами x, y, angle, width, length за один вызов.
+#[pyfunction]
+fn buildings_to_array<'py>(py: Python<'py>, buildings: Vec<model::Building>) -> PyResult<&'py PyArray2<f64>> {
+    let mut rows: Vec<f64> = Vec::with_capacity(buildings.len() * kernel::BUILDING_ARRAY_COLUMNS);
+    for building in &buildings {
+        let (width_m, length_m) = building.figure_size();
+        rows.extend_from_slice(&[
+            building.position.offset_x_m,
+            building.position.offset_y_m,
+            building.position.angle_deg,
+            width_m,
+            length_m,
+        ]);
+    }
+    PyArray1::from_vec(py, rows).reshape([buildings.len(), kernel::BUILDING_ARRAY_COLUMNS])
 }
 
 fn _get_global_position_for_building(
@@ -113,6 +760,7 @@ fn _get_global_position_for_building(
 
 #[pyfunction]
 fn calculate_distance_between_two_clusters(
+    py: Python,
     // создать структуру кластера, которая имплементит Copy и содержит Vec<Building> нельзя,
     // тк Vec в rust не имплементит Copy, поэтому такие аргументы
     first_cluster_buildings: Vec<model::Building>,
@@ -120,78 +768,66 @@ fn calculate_distance_between_two_clusters(
     first_cluster_position: model::ClusterPosition,
     second_cluster_position: model::ClusterPosition,
 ) -> f64 {
-    let mut first_cluster_buildings = first_cluster_buildings.clone();
-    let mut second_cluster_buildings = second_cluster_buildings.clone();
+    py.allow_threads(|| {
+        let mut first_cluster_buildings = first_cluster_buildings.clone();
+        let mut second_cluster_buildings = second_cluster_buildings.clone();
 
-    // пересчитываем позиции сооружений с учетом положения кластера
-    for building in &mut first_cluster_buildings {
-        building.position = _get_global_position_for_building(building.position, first_cluster_position)
-    }
-    for building in &mut second_cluster_buildings {
-        building.position = _get_global_position_for_building(building.position, second_cluster_position)
-    }
+        // пересчитываем позиции сооружений с учетом положения кластера
+        for building in &mut first_cluster_buildings {
+            building.position = _get_global_position_for_building(building.position, first_cluster_position)
+        }
+        for building in &mut second_cluster_buildings {
+            building.position = _get_global_position_for_building(building.position, second_cluster_position)
+        }
 
-    let mut distances: Vec<f64> = Vec::new();
-    for first_building in first_cluster_buildings {
-        for second_building in &second_cluster_buildings {
-            distances.push(
-                calculate_distance_between_two_buildings(first_building, *second_building)
-            )
+        let mut distances: Vec<f64> = Vec::new();
+        for first_building in first_cluster_buildings {
+            for second_building in &second_cluster_buildings {
+                distances.push(
+                    calculate_distance_between_two_buildings(first_building, *second_building)
+                )
+            }
         }
-    }
 
-    // https://stackoverflow.com/questions/28446632/how-do-i-get-the-minimum-or-maximum-value-of-an-iterator-containing-floating-poi
-    let min = distances.iter().fold(f64::INFINITY, |a, &b| a.min(b));
-    return min;
+        // https://stackoverflow.com/questions/28446632/how-do-i-get-the-minimum-or-maximum-value-of-an-iterator-containing-floating-poi
+        let min = distances.iter().fold(f64::INFINITY, |a, &b| a.min(b));
+        return min;
+    })
 }
 
 #[pyfunction]
-fn calculate_distance_between_two_buildings(
-    first_building: model::Building,
-    second_building: model::Building,
+fn calculate_distance_between_two_clusters_indexed(
+    py: Python,
+    first_cluster_buildings: Vec<model::Building>,
+    second_cluster_buildings: Vec<model::Building>,
+    first_cluster_position: model::ClusterPosition,
+    second_cluster_position: model::ClusterPosition,
 ) -> f64 {
-    let delta_x: f64 = (first_building.position.offset_x_m - second_building.position.offset_x_m).abs();
-    let delta_y: f64 = (first_building.position.offset_y_m - second_building.position.offset_y_m).abs();
-    let (total_half_width, total_half_length): (f64, f64) = eval_half_total_width_and_half_total_length(
-        first_building,
-        second_building,
-    );
-
-    if delta_x < total_half_length && delta_y >= total_half_width {
-        return delta_y - total_half_width;
-    } else if delta_x >= total_half_length && delta_y < total_half_width {
-        return delta_x - total_half_length;
-    } else if delta_x >= total_half_length && delta_y >= total_half_width {
-        return ((delta_x - total_half_length).powi(2) + (delta_y - total_half_width).powi(2)).sqrt();
-    } else {
-        return -1.;
-    }
+    py.allow_threads(|| {
+        let first_index = spatial::GridIndex::new(
+            first_cluster_buildings.iter().map(|b| b.extent()).collect(),
+            spatial::DEFAULT_BUCKET_SIZE,
+        );
+        let second_index = spatial::GridIndex::new(
+            second_cluster_buildings.iter().map(|b| b.extent()).collect(),
+            spatial::DEFAULT_BUCKET_SIZE,
+        );
+        let (min, _, _) = spatial::min_distance(
+            &first_index,
+            &second_index,
+            (first_cluster_position.x, first_cluster_position.y),
+            (second_cluster_position.x, second_cluster_position.y),
+        );
+        return min;
+    })
 }
 
-
-fn eval_half_total_width_and_half_total_length(
+#[pyfunction]
+fn calculate_distance_between_two_buildings(
     first_building: model::Building,
     second_building: model::Building,
-) -> (f64, f64) {
-    let first_length: f64 = first_building.rectangle.length_m / 2.0;
-    let first_width: f64 = first_building.rectangle.width_m / 2.0;
-
-    let (first_length, first_width): (f64, f64) = if (first_building.position.angle_deg % 180.0 - 90.0).abs() < 1e-5 {
-        (first_width, first_length)
-    } else {
-        (first_length, first_width)
-    };
-
-    let second_length: f64 = second_building.rectangle.length_m / 2.0;
-    let second_width: f64 = second_building.rectangle.width_m / 2.0;
-
-    let (second_length, second_width): (f64, f64) = if (second_building.position.angle_deg % 180.0 - 90.0).abs() < 1e-5 {
-        (second_width, second_length)
-    } else {
-        (second_length, second_width)
-    };
-
-    return (first_width + second_width, first_length + second_length);
+) -> f64 {
+    return kernel::distance_between_extents(&first_building.extent(), &second_building.extent(), (0., 0.), (0., 0.));
 }
 
 
@@ -201,10 +837,35 @@ fn rust_force(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(calculate_distance_between_two_buildings, m)?)?;
     m.add_function(wrap_pyfunction!(calculate_distance_between_two_clusters, m)?)?;
     m.add_function(wrap_pyfunction!(calculate_distance_between_two_clusters_parallel, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_distance_between_two_clusters_indexed, m)?)?;
     m.add_function(wrap_pyfunction!(calculate_normalized_distance_between_two_clusters, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_distance_between_two_clusters_array, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_normalized_distance_between_two_clusters_array, m)?)?;
+    m.add_function(wrap_pyfunction!(buildings_to_array, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_distance_between_two_clusters_adaptive, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_normalized_distance_between_two_clusters_adaptive, m)?)?;
+    m.add_function(wrap_pyfunction!(set_parallel_threshold, m)?)?;
+    m.add_function(wrap_pyfunction!(get_parallel_threshold, m)?)?;
+    m.add_function(wrap_pyfunction!(set_num_threads, m)?)?;
+    m.add_function(wrap_pyfunction!(get_num_threads, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_distance_matrix_between_clusters, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_normalized_distance_matrix_between_clusters, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_cluster_forces, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_distance_between_prepared_clusters, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_normalized_distance_between_prepared_clusters, m)?)?;
+    m.add_function(wrap_pyfunction!(is_distance_between_prepared_clusters_less_than, m)?)?;
+    m.add_function(wrap_pyfunction!(is_normalized_distance_between_prepared_clusters_less_than, m)?)?;
+    m.add_function(wrap_pyfunction!(find_prepared_cluster_pairs_closer_than, m)?)?;
+    m.add_function(wrap_pyfunction!(find_closest_building_pairs, m)?)?;
+    m.add_function(wrap_pyfunction!(find_overlapping_buildings, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_oriented_distance_matrix, m)?)?;
+    m.add_function(wrap_pyfunction!(calculate_min_oriented_distance, m)?)?;
     m.add_class::<model::Building>()?;
+    m.add_class::<model::OffsetRules>()?;
+    m.add_class::<model::PreparedCluster>()?;
     m.add_class::<model::Position>()?;
     m.add_class::<model::ClusterPosition>()?;
     m.add_class::<model::Rectangle>()?;
+    m.add_class::<model::Circle>()?;
     Ok(())
 }
\ No newline at end of file
@@ -1,4 +1,11 @@
+use numpy::{PyArray1, PyReadonlyArray1, PyReadonlyArray2};
+use pyo3::exceptions::{PyKeyError, PyValueError};
 use pyo3::prelude::*;
+use std::collections::HashMap;
+
+use crate::kernel;
+use crate::offsets;
+use crate::spatial;
 
 #[pyclass]
 #[derive(Copy, Clone)]
@@ -7,6 +14,12 @@ pub struct Rectangle {
     pub length_m: f64,
 }
 
+#[pyclass]
+#[derive(Copy, Clone)]
+pub struct Circle {
+    pub radius_m: f64,
+}
+
 #[pyclass]
 #[derive(Copy, Clone)]
 pub struct Position {
@@ -30,10 +43,30 @@ pub struct Building {
     // в расте со строками нельзя имплементить Copy
     // для питона нет (я пока не нашла) аналога для uuid
     pub id: uuid::Uuid,
-    pub rectangle: Rectangle,
+    // задана ровно одна фигура: прямоугольник или круг
+    pub rectangle: Option<Rectangle>,
+    pub circle: Option<Circle>,
     pub position: Position,
 }
 
+/// Набор правил оффсетов, загружаемый из python без чтения файлов.
+/// Несколько наборов могут существовать одновременно, память освобождается вместе с python-объектом.
+#[pyclass]
+pub struct OffsetRules {
+    pub table: offsets::OffsetTable,
+}
+
+/// Кластер, подготовленный для многократного расчета расстояний.
+/// Сооружения кластера не меняются за время оптимизации, поэтому габариты сооружений с учетом поворота,
+/// общий габарит и сетка сооружений в локальных координатах строятся один раз,
+/// а при расчете расстояний передаются только положения кластеров.
+#[pyclass]
+pub struct PreparedCluster {
+    pub building_ids: Vec<uuid::Uuid>,
+    pub bounds: spatial::Bounds,
+    pub index: spatial::GridIndex,
+}
+
 
 #[pymethods]
 impl Rectangle {
@@ -54,6 +87,20 @@ impl Rectangle {
 }
 
 
+#[pymethods]
+impl Circle {
+    #[new]
+    fn new(radius_m: f64) -> Self {
+        Circle { radius_m }
+    }
+
+    #[getter]
+    fn radius_m(&self) -> PyResult<f64> {
+        Ok(self.radius_m)
+    }
+}
+
+
 #[pymethods]
 impl Position {
     #[new]
@@ -101,11 +148,15 @@ impl ClusterPosition {
 #[pymethods]
 impl Building {
     #[new]
-    fn new(id: String, rectangle: Rectangle, position: Position) -> Self {
-        Building {
+    fn new(id: String, rectangle: Option<Rectangle>, position: Position, circle: Option<Circle>) -> PyResult<Self> {
+        if rectangle.is_some() == circle.is_some() {
+            return Err(PyValueError::new_err("building must have exactly one figure: rectangle or circle"));
+        }
+        Ok(Building {
             id: uuid::Uuid::parse_str(&id).unwrap(),
             rectangle,
-            position }
+            circle,
+            position })
     }
 
     #[getter]
@@ -114,13 +165,147 @@ impl Building {
     }
 
     #[getter]
-    fn rectangle(&self) -> PyResult<Rectangle> {
+    fn rectangle(&self) -> PyResult<Option<Rectangle>> {
         Ok(self.rectangle)
     }
 
+    #[getter]
+    fn circle(&self) -> PyResult<Option<Circle>> {
+        Ok(self.circle)
+    }
+
     #[getter]
     fn position(&self) -> PyResult<Position> {
         Ok(self.position)
     }
 }
 
+
+
+#[pymethods]
+impl OffsetRules {
+    /// Правила из словаря `{(id первого сооружения, id второго сооружения): оффсет}`.
+    #[new]
+    fn new(rules: HashMap<(String, String), f64>) -> PyResult<Self> {
+        let mut parsed: Vec<(uuid::Uuid, uuid::Uuid, f64)> = Vec::with_capacity(rules.len());
+        for ((first_id, second_id), offset) in rules {
+            parsed.push((parse_uuid(&first_id)?, parse_uuid(&second_id)?, offset));
+        }
+        Ok(OffsetRules { table: offsets::OffsetTable::from_rules(&parsed) })
+    }
+
+    /// Правила из квадратной матрицы оффсетов, строки и столбцы которой соответствуют `building_ids`.
+    #[staticmethod]
+    fn from_array(building_ids: Vec<String>, offsets: PyReadonlyArray2<f64>) -> PyResult<Self> {
+        let ids = building_ids.iter().map(|id| parse_uuid(id)).collect::<PyResult<Vec<uuid::Uuid>>>()?;
+        let values: Vec<f64> = offsets.as_array().iter().cloned().collect();
+        let table = offsets::OffsetTable::from_matrix(&ids, values).map_err(PyValueError::new_err)?;
+        Ok(OffsetRules { table })
+    }
+
+    /// Сжатые правила из массивов `force.offsets.CompressedOffsetTable`.
+    #[staticmethod]
+    fn from_compressed(
+        building_ids: Vec<String>,
+        building_types: PyReadonlyArray1<i64>,
+        type_offsets: PyReadonlyArray2<f64>,
+        exception_indices: PyReadonlyArray2<i64>,
+        exception_offsets: PyReadonlyArray1<f64>,
+    ) -> PyResult<Self> {
+        let ids = building_ids.iter().map(|id| parse_uuid(id)).collect::<PyResult<Vec<uuid::Uuid>>>()?;
+        let types = building_types
+            .as_array()
+            .iter()
+            .map(|&t| match t {
+                t if t < 0 => Err(PyValueError::new_err("building type must be non-negative")),
+                t => Ok(t as usize),
+            })
+            .collect::<PyResult<Vec<usize>>>()?;
+        let exception_indices = exception_indices.as_array();
+        let exception_offsets = exception_offsets.as_array();
+        if exception_indices.ncols() != 2 || exception_indices.nrows() != exception_offsets.len() {
+            return Err(PyValueError::new_err("exception indices must have shape (K, 2) matching exception offsets"));
+        }
+        let mut exceptions: Vec<(usize, usize, f64)> = Vec::with_capacity(exception_offsets.len());
+        for (pair, &offset) in exception_indices.outer_iter().zip(exception_offsets.iter()) {
+            if pair[0] < 0 || pair[1] < 0 {
+                return Err(PyValueError::new_err("exception index must be non-negative"));
+            }
+            exceptions.push((pair[0] as usize, pair[1] as usize, offset));
+        }
+        let type_offsets: Vec<f64> = type_offsets.as_array().iter().cloned().collect();
+        let table = offsets::OffsetTable::from_compressed(&ids, types, type_offsets, &exceptions)
+            .map_err(PyValueError::new_err)?;
+        Ok(OffsetRules { table })
+    }
+
+    #[getter]
+    fn building_count(&self) -> PyResult<usize> {
+        Ok(self.table.building_count())
+    }
+
+    /// Индексы сооружений в таблице для функций, принимающих массивы сооружений.
+    fn get_indices<'py>(&self, py: Python<'py>, building_ids: Vec<String>) -> PyResult<&'py PyArray1<i64>> {
+        let mut indices: Vec<i64> = Vec::with_capacity(building_ids.len());
+        for id in &building_ids {
+            let idx = self.table.index(&parse_uuid(id)?)
+                .ok_or_else(|| PyKeyError::new_err(format!("no offset rules for building {}", id)))?;
+            indices.push(idx as i64);
+        }
+        Ok(PyArray1::from_vec(py, indices))
+    }
+}
+
+
+#[pymethods]
+impl PreparedCluster {
+    #[new]
+    fn new(buildings: Vec<Building>) -> Self {
+        let extents: Vec<kernel::Extent> = buildings.iter().map(|b| b.extent()).collect();
+        PreparedCluster {
+            building_ids: buildings.iter().map(|b| b.id).collect(),
+            bounds: spatial::Bounds::from_extents(&extents),
+            index: spatial::GridIndex::new(extents, spatial::DEFAULT_BUCKET_SIZE),
+        }
+    }
+
+    #[getter]
+    fn building_count(&self) -> PyResult<usize> {
+        Ok(self.building_ids.len())
+    }
+
+    /// Габарит сооружений в локальных координатах: min_x, max_x, min_y, max_y.
+    #[getter]
+    fn local_bounds(&self) -> PyResult<(f64, f64, f64, f64)> {
+        Ok((self.bounds.min_x, self.bounds.max_x, self.bounds.min_y, self.bounds.max_y))
+    }
+}
+
+
+fn parse_uuid(id: &str) -> PyResult<uuid::Uuid> {
+    uuid::Uuid::parse_str(id).map_err(|e| PyValueError::new_err(e.to_string()))
+}
+
+
+impl Building {
+    /// Значения столбцов `WIDTH` и `LENGTH` массива сооружений, для круга -- минус диаметр и диаметр.
+    pub fn figure_size(&self) -> (f64, f64) {
+        match (self.rectangle, self.circle) {
+            (Some(rectangle), _) => (rectangle.width_m, rectangle.length_m),
+            (None, Some(circle)) => (-2. * circle.radius_m, 2. * circle.radius_m),
+            (None, None) => (0., 0.),
+        }
+    }
+
+    /// Габарит сооружения с учетом поворота.
+    pub fn extent(&self) -> kernel::Extent {
+        let (width_m, length_m) = self.figure_size();
+        kernel::Extent::new(
+            self.position.offset_x_m,
+            self.position.offset_y_m,
+            width_m,
+            length_m,
+            self.position.angle_deg,
+        )
+    }
+}
@@ -0,0 +1,231 @@
+// Таблица оффсетов между сооружениями: плотная или сжатая.
+use std::collections::HashMap;
+
+use uuid::Uuid;
+
+/// Хранение оффсетов таблицы.
+enum Storage {
+    /// Матрица N×N, записанная построчно.
+    Dense(Vec<f64>),
+    /// Симметричная таблица: оффсеты по умолчанию для пар типов сооружений
+    /// и исключения для пар сооружений с индексами (меньший, больший).
+    Compressed {
+        types: Vec<usize>,
+        type_count: usize,
+        type_offsets: Vec<f64>,
+        exceptions: HashMap<(usize, usize), f64>,
+    },
+}
+
+/// id сооружений один раз заменяются индексами, после чего оффсет пары читается
+/// по индексам строки и столбца без выделения памяти и хеширования строк.
+/// Отсутствующим правилам соответствует NaN.
+pub struct OffsetTable {
+    indices: HashMap<Uuid, usize>,
+    size: usize,
+    storage: Storage,
+    // наибольший оффсет каждого сооружения в парах с любым порядком сооружений
+    max_offsets: Vec<f64>,
+}
+
+impl OffsetTable {
+    pub fn from_rules(rules: &[(Uuid, Uuid, f64)]) -> OffsetTable {
+        let mut indices: HashMap<Uuid, usize> = HashMap::new();
+        for (first_id, second_id, _) in rules {
+            let next = indices.len();
+            indices.entry(*first_id).or_insert(next);
+            let next = indices.len();
+            indices.entry(*second_id).or_insert(next);
+        }
+        let size = indices.len();
+        let mut offsets = vec![f64::NAN; size * size];
+        for (first_id, second_id, offset) in rules {
+            offsets[indices[first_id] * size + indices[second_id]] = *offset;
+        }
+        OffsetTable::new(indices, size, Storage::Dense(offsets))
+    }
+
+    fn new(indices: HashMap<Uuid, usize>, size: usize, storage: Storage) -> OffsetTable {
+        let mut max_offsets: Vec<f64> = vec![0.; size];
+        match &storage {
+            Storage::Dense(offsets) => {
+                for first_idx in 0..size {
+                    for second_idx in 0..size {
+                        let offset = offsets[first_idx * size + second_idx];
+                        // f64::max пропускает NaN
+                        max_offsets[first_idx] = max_offsets[first_idx].max(offset);
+                        max_offsets[second_idx] = max_offsets[second_idx].max(offset);
+                    }
+                }
+            }
+            Storage::Compressed { types, type_count, type_offsets, exceptions } => {
+                let mut present = vec![false; *type_count];
+                for &building_type in types {
+                    present[building_type] = true;
+                }
+                let type_max: Vec<f64> = (0..*type_count)
+                    .map(|first| {
+                        (0..*type_count)
+                            .filter(|&second| present[second])
+                            .fold(0., |max: f64, second| max.max(type_offsets[first * type_count + second]))
+                    })
+                    .collect();
+                for (idx, &building_type) in types.iter().enumerate() {
+                    max_offsets[idx] = type_max[building_type];
+                }
+                for (&(first_idx, second_idx), &offset) in exceptions {
+                    max_offsets[first_idx] = max_offsets[first_idx].max(offset);
+                    max_offsets[second_idx] = max_offsets[second_idx].max(offset);
+                }
+            }
+        }
+        OffsetTable { indices, size, storage, max_offsets }
+    }
+
+    /// Таблица из квадратной матрицы оффсетов, записанной построчно, строки и столбцы
+    /// которой соответствуют сооружениям `building_ids`.
+    pub fn from_matrix(building_ids: &[Uuid], offsets: Vec<f64>) -> Result<OffsetTable, String> {
+        let size = building_ids.len();
+        if offsets.len() != size * size {
+            return Err(format!("expected {}x{} offset matrix, got {} values", size, size, offsets.len()));
+        }
+        let indices = index_building_ids(building_ids)?;
+        Ok(OffsetTable::new(indices, size, Storage::Dense(offsets)))
+    }
+
+    /// Сжатая таблица, повторяющая `force.offsets.CompressedOffsetTable`: `types` -- индексы типов сооружений,
+    /// `type_offsets` -- построчно записанная матрица оффсетов по умолчанию для пар типов T×T,
+    /// `exceptions` -- оффсеты пар сооружений, отличающиеся от оффсетов по умолчанию.
+    /// Оффсет пары не зависит от порядка сооружений в ней.
+    pub fn from_compressed(
+        building_ids: &[Uuid],
+        types: Vec<usize>,
+        type_offsets: Vec<f64>,
+        exceptions: &[(usize, usize, f64)],
+    ) -> Result<OffsetTable, String> {
+        let size = building_ids.len();
+        if types.len() != size {
+            return Err(format!("expected {} building types, got {}", size, types.len()));
+        }
+        let type_count = (type_offsets.len() as f64).sqrt() as usize;
+        if type_count * type_count != type_offsets.len() {
+            return Err(format!("type offsets must be a square matrix, got {} values", type_offsets.len()));
+        }
+        if let Some(building_type) = types.iter().find(|&&t| t >= type_count) {
+            return Err(format!("building type {} is out of range of {} types", building_type, type_count));
+        }
+        let mut exception_map: HashMap<(usize, usize), f64> = HashMap::with_capacity(exceptions.len());
+        for &(first_idx, second_idx, offset) in exceptions {
+            if first_idx >= size || second_idx >= size {
+                return Err(format!("exception pair ({}, {}) is out of range", first_idx, second_idx));
+            }
+            exception_map.insert((first_idx.min(second_idx), first_idx.max(second_idx)), offset);
+        }
+        let indices = index_building_ids(building_ids)?;
+        Ok(OffsetTable::new(
+            indices,
+            size,
+            Storage::Compressed { types, type_count, type_offsets, exceptions: exception_map },
+        ))
+    }
+
+    /// Таблица из словаря с ключами вида `"<id первого сооружения>_<id второго сооружения>"`.
+    pub fn from_keyed_rules(rules: &HashMap<String, f64>) -> Result<OffsetTable, String> {
+        let mut parsed: Vec<(Uuid, Uuid, f64)> = Vec::with_capacity(rules.len());
+        for (key, offset) in rules {
+            let mut ids = key.split('_');
+            match (ids.next(), ids.next(), ids.next()) {
+                (Some(first_id), Some(second_id), None) => parsed.push((
+                    Uuid::parse_str(first_id).map_err(|e| e.to_string())?,
+                    Uuid::parse_str(second_id).map_err(|e| e.to_string())?,
+                    *offset,
+                )),
+                _ => return Err(format!("invalid offset rule key: {}", key)),
+            }
+        }
+        Ok(OffsetTable::from_rules(&parsed))
+    }
+
+    pub fn building_count(&self) -> usize {
+        self.size
+    }
+
+    pub fn index(&self, id: &Uuid) -> Option<usize> {
+        self.indices.get(id).copied()
+    }
+
+    /// Наибольший оффсет сооружения в парах с остальными сооружениями, заданные правила дают оценку сверху
+    /// для любой пары с этим сооружением.
+    pub fn max_offset(&self, idx: usize) -> f64 {
+        self.max_offsets[idx]
+    }
+
+    #[inline]
+    pub fn offset(&self, first_idx: usize, second_idx: usize) -> f64 {
+        match &self.storage {
+            Storage::Dense(offsets) => offsets[first_idx * self.size + second_idx],
+            Storage::Compressed { types, type_count, type_offsets, exceptions } => {
+                let key = (first_idx.min(second_idx), first_idx.max(second_idx));
+                match exceptions.get(&key) {
+                    Some(offset) => *offset,
+                    None => type_offsets[types[first_idx] * type_count + types[second_idx]],
+                }
+            }
+        }
+    }
+}
+
+fn index_building_ids(building_ids: &[Uuid]) -> Result<HashMap<Uuid, usize>, String> {
+    let mut indices: HashMap<Uuid, usize> = HashMap::with_capacity(building_ids.len());
+    for (idx, id) in building_ids.iter().enumerate() {
+        if indices.insert(*id, idx).is_some() {
+            return Err(format!("duplicate building id {}", id));
+        }
+    }
+    Ok(indices)
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_from_keyed_rules() {
+        let first = Uuid::parse_str("10000000-0000-0000-0000-000000000000").unwrap();
+        let second = Uuid::parse_str("20000000-0000-0000-0000-000000000000").unwrap();
+        let mut rules: HashMap<String, f64> = HashMap::new();
+        rules.insert(format!("{}_{}", first, second), 8.);
+        let table = OffsetTable::from_keyed_rules(&rules).unwrap();
+        let (first_idx, second_idx) = (table.index(&first).unwrap(), table.index(&second).unwrap());
+        assert_eq!(table.offset(first_idx, second_idx), 8.);
+        assert!(table.offset(second_idx, first_idx).is_nan());
+    }
+
+    #[test]
+    fn test_from_matrix() {
+        let ids = vec![Uuid::from_u128(1), Uuid::from_u128(2)];
+        let table = OffsetTable::from_matrix(&ids, vec![0., 5., 6., 0.]).unwrap();
+        assert_eq!(table.offset(table.index(&ids[1]).unwrap(), table.index(&ids[0]).unwrap()), 6.);
+        assert_eq!(table.max_offset(0), 6.);
+        assert!(OffsetTable::from_matrix(&ids, vec![1.]).is_err());
+        assert!(OffsetTable::from_matrix(&[ids[0], ids[0]], vec![0.; 4]).is_err());
+    }
+
+    #[test]
+    fn test_from_compressed() {
+        let ids = vec![Uuid::from_u128(1), Uuid::from_u128(2), Uuid::from_u128(3)];
+        // оффсеты пар типов: 0-0 -- 10, 0-1 -- 20, 1-1 -- не задан
+        let type_offsets = vec![10., 20., 20., f64::NAN];
+        let table = OffsetTable::from_compressed(&ids, vec![0, 0, 1], type_offsets.clone(), &[(1, 0, 5.)]).unwrap();
+        assert_eq!(table.offset(0, 1), 5.);
+        assert_eq!(table.offset(1, 0), 5.);
+        assert_eq!(table.offset(0, 0), 10.);
+        assert_eq!(table.offset(2, 1), 20.);
+        assert!(table.offset(2, 2).is_nan());
+        assert_eq!((table.max_offset(0), table.max_offset(2)), (20., 20.));
+        assert!(OffsetTable::from_compressed(&ids, vec![0, 0, 2], type_offsets.clone(), &[]).is_err());
+        assert!(OffsetTable::from_compressed(&ids, vec![0, 0, 1], vec![1.; 3], &[]).is_err());
+        assert!(OffsetTable::from_compressed(&ids, vec![0, 0, 1], type_offsets, &[(0, 3, 1.)]).is_err());
+    }
+}
@@ -0,0 +1,327 @@
+// Поиск ближайших пар сооружений между кластерами с отсечением по габаритам.
+use std::cmp::Ordering;
+use std::collections::BinaryHeap;
+
+use crate::kernel::{distance_between_extents, Extent};
+use crate::spatial::{Bounds, LOWER_BOUND_TOLERANCE};
+
+/// Пара сооружений двух кластеров и безразмерное расстояние между ними.
+/// Пары упорядочены по расстоянию, при равных расстояниях -- по индексам кластеров и сооружений,
+/// как при полном переборе.
+#[derive(Copy, Clone, Debug, PartialEq)]
+pub struct BuildingPair {
+    pub distance: f64,
+    pub offset: f64,
+    pub first_cluster: usize,
+    pub second_cluster: usize,
+    pub first_idx: usize,
+    pub second_idx: usize,
+}
+
+impl Eq for BuildingPair {}
+
+impl Ord for BuildingPair {
+    fn cmp(&self, other: &Self) -> Ordering {
+        self.distance
+            .total_cmp(&other.distance)
+            .then(self.first_cluster.cmp(&other.first_cluster))
+            .then(self.second_cluster.cmp(&other.second_cluster))
+            .then(self.first_idx.cmp(&other.first_idx))
+            .then(self.second_idx.cmp(&other.second_idx))
+    }
+}
+
+impl PartialOrd for BuildingPair {
+    fn partial_cmp(&self, other: &Self) -> Option<Ordering> {
+        Some(self.cmp(other))
+    }
+}
+
+/// `k` ближайших пар сооружений: куча ограниченного размера, на вершине которой худшая из найденных пар.
+pub struct ClosestPairs {
+    k: usize,
+    heap: BinaryHeap<BuildingPair>,
+}
+
+impl ClosestPairs {
+    pub fn new(k: usize) -> ClosestPairs {
+        ClosestPairs { k, heap: BinaryHeap::with_capacity(k + 1) }
+    }
+
+    /// Расстояние, которое должна не превышать пара, чтобы попасть в кучу;
+    /// пока найдено меньше `k` пар -- бесконечность.
+    pub fn threshold(&self) -> f64 {
+        match self.heap.peek() {
+            Some(worst) if self.heap.len() >= self.k => worst.distance,
+            _ => f64::INFINITY,
+        }
+    }
+
+    pub fn push(&mut self, pair: BuildingPair) {
+        if self.k == 0 {
+            return;
+        }
+        if self.heap.len() < self.k {
+            self.heap.push(pair);
+        } else if let Some(mut worst) = self.heap.peek_mut() {
+            if pair < *worst {
+                *worst = pair;
+            }
+        }
+    }
+
+    /// Добавляет пары сооружений двух кластеров, сдвинутых на `first_shift` и `second_shift`.
+    ///
+    /// Сооружения первого кластера перебираются по возрастанию нижней оценки: расстояния от габарита сооружения
+    /// до габарита второго кластера, делённого на наибольший возможный оффсет. Перебор прекращается, как только
+    /// оценка превышает расстояние худшей пары в куче. `first_max_offsets` -- наибольшие оффсеты сооружений
+    /// первого кластера, `second_max_offset` -- наибольший оффсет сооружений второго кластера.
+    /// Возвращает `false`, если для какой-либо рассмотренной пары оффсет не задан (NaN).
+    pub fn add_clusters<F: Fn(usize, usize) -> f64>(
+        &mut self,
+        clusters: (usize, usize),
+        first: &[Extent],
+        second: &[Extent],
+        first_shift: (f64, f64),
+        second_shift: (f64, f64),
+        first_max_offsets: &[f64],
+        second_max_offset: f64,
+        offset: F,
+    ) -> bool {
+        if second.is_empty() || self.k == 0 {
+            return true;
+        }
+        let second_bounds = Bounds::from_extents(second).shifted(second_shift);
+        let mut rows: Vec<(f64, usize)> = first
+            .iter()
+            .enumerate()
+            .map(|(idx, extent)| {
+                let gap = Bounds::from_extent(extent).shifted(first_shift).lower_bound(&second_bounds);
+                (lower_bound(gap, first_max_offsets[idx].min(second_max_offset)), idx)
+            })
+            .collect();
+        rows.sort_by(|a, b| a.0.total_cmp(&b.0).then(a.1.cmp(&b.1)));
+
+        for (row_lower_bound, first_idx) in rows {
+            if row_lower_bound > self.threshold() {
+                break;
+            }
+            for (second_idx, second_extent) in second.iter().enumerate() {
+                let offset = offset(first_idx, second_idx);
+                if offset.is_nan() {
+                    return false;
+                }
+                let distance =
+                    distance_between_extents(&first[first_idx], second_extent, first_shift, second_shift) / offset;
+                if distance <= self.threshold() {
+                    self.push(BuildingPair {
+                        distance,
+                        offset,
+                        first_cluster: clusters.0,
+                        second_cluster: clusters.1,
+                        first_idx,
+                        second_idx,
+                    });
+                }
+            }
+        }
+        true
+    }
+
+    /// Найденные пары по возрастанию расстояния.
+    pub fn into_sorted_vec(self) -> Vec<BuildingPair> {
+        self.heap.into_sorted_vec()
+    }
+}
+
+/// `k` ближайших пар сооружений из разных кластеров, сдвинутых на `shifts`.
+///
+/// Пары кластеров перебираются по возрастанию нижней оценки: расстояния между габаритами кластеров,
+/// делённого на наибольший возможный оффсет. `max_offsets[c][i]` -- наибольший оффсет `i`-го сооружения
+/// кластера `c`, `offset(c1, i, c2, j)` -- оффсет между `i`-м сооружением кластера `c1` и `j`-м кластера `c2`.
+/// Возвращает `None`, если для какой-либо рассмотренной пары оффсет не задан (NaN).
+pub fn closest_building_pairs<F: Fn(usize, usize, usize, usize) -> f64>(
+    clusters: &[&[Extent]],
+    shifts: &[(f64, f64)],
+    max_offsets: &[Vec<f64>],
+    k: usize,
+    offset: F,
+) -> Option<Vec<BuildingPair>> {
+    let bounds: Vec<Bounds> = clusters
+        .iter()
+        .zip(shifts)
+        .map(|(extents, &shift)| Bounds::from_extents(extents).shifted(shift))
+        .collect();
+    let cluster_max_offsets: Vec<f64> = max_offsets
+        .iter()
+        .map(|offsets| offsets.iter().fold(0., |max: f64, &offset| max.max(offset)))
+        .collect();
+
+    let mut cluster_pairs: Vec<(f64, usize, usize)> = Vec::with_capacity(clusters.len() * clusters.len() / 2);
+    for first in 0..clusters.len() {
+        for second in first + 1..clusters.len() {
+            let max_offset = cluster_max_offsets[first].min(cluster_max_offsets[second]);
+            cluster_pairs.push((lower_bound(bounds[first].lower_bound(&bounds[second]), max_offset), first, second));
+        }
+    }
+    cluster_pairs.sort_by(|a, b| a.0.total_cmp(&b.0).then((a.1, a.2).cmp(&(b.1, b.2))));
+
+    let mut closest = ClosestPairs::new(k);
+    if k == 0 {
+        return Some(Vec::new());
+    }
+    for (pair_lower_bound, first, second) in cluster_pairs {
+        if pair_lower_bound > closest.threshold() {
+            break;
+        }
+        let added = closest.add_clusters(
+            (first, second),
+            clusters[first],
+            clusters[second],
+            shifts[first],
+            shifts[second],
+            &max_offsets[first],
+            cluster_max_offsets[second],
+            |i, j| offset(first, i, second, j),
+        );
+        if !added {
+            return None;
+        }
+    }
+    Some(closest.into_sorted_vec())
+}
+
+/// Есть ли пара сооружений двух кластеров, сдвинутых на `first_shift` и `second_shift`, безразмерное расстояние
+/// между которыми меньше `threshold`.
+///
+/// Перебор прекращается на первой найденной паре. Сооружения первого кластера, нижняя оценка для которых
+/// (расстояние от габарита сооружения до габарита второго кластера, делённое на наибольший возможный оффсет)
+/// не меньше `threshold`, пропускаются, остальные перебираются по возрастанию нижней оценки. Возвращает `None`,
+/// если для какой-либо рассмотренной пары оффсет не задан (NaN); пары после найденной не рассматриваются.
+pub fn any_closer_than<F: Fn(usize, usize) -> f64>(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+    first_max_offsets: &[f64],
+    second_max_offset: f64,
+    threshold: f64,
+    offset: F,
+) -> Option<bool> {
+    if second.is_empty() {
+        return Some(false);
+    }
+    let second_bounds = Bounds::from_extents(second).shifted(second_shift);
+    let mut rows: Vec<(f64, usize)> = first
+        .iter()
+        .enumerate()
+        .map(|(idx, extent)| {
+            let gap = Bounds::from_extent(extent).shifted(first_shift).lower_bound(&second_bounds);
+            (lower_bound(gap, first_max_offsets[idx].min(second_max_offset)), idx)
+        })
+        .filter(|&(row_lower_bound, _)| row_lower_bound < threshold)
+        .collect();
+    // ближайшие сооружения проверяются первыми, как в `force.distance.is_min_distance_less_than`
+    rows.sort_by(|a, b| a.0.total_cmp(&b.0).then(a.1.cmp(&b.1)));
+
+    for (_, first_idx) in rows {
+        for (second_idx, second_extent) in second.iter().enumerate() {
+            let offset = offset(first_idx, second_idx);
+            if offset.is_nan() {
+                return None;
+            }
+            let distance = distance_between_extents(&first[first_idx], second_extent, first_shift, second_shift);
+            if distance / offset < threshold {
+                return Some(true);
+            }
+        }
+    }
+    Some(false)
+}
+
+/// Нижняя оценка безразмерного расстояния по расстоянию между габаритами,
+/// при пересечении габаритов сооружения могут пересекаться и оценки нет.
+pub fn lower_bound(gap: f64, max_offset: f64) -> f64 {
+    if gap > 0. {
+        (gap - LOWER_BOUND_TOLERANCE) / max_offset
+    } else {
+        f64::NEG_INFINITY
+    }
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::kernel;
+
+    fn pseudo_random_extents(count: usize, seed: u64) -> Vec<Extent> {
+        let mut state = seed;
+        let mut next = move || {
+            state = state.wrapping_mul(6364136223846793005).wrapping_add(1442695040888963407);
+            ((state >> 33) % 1000) as f64 / 10.
+        };
+        (0..count)
+            .map(|_| Extent::new(next() * 2., next() * 2., 5. + next() / 4., 5. + next() / 4., 0.))
+            .collect()
+    }
+
+    fn offset(first_cluster: usize, i: usize, second_cluster: usize, j: usize) -> f64 {
+        1. + ((first_cluster * 7 + i * 3 + second_cluster * 5 + j) % 4) as f64
+    }
+
+    #[test]
+    fn test_closest_building_pairs_equal_brute_force() {
+        let clusters = vec![pseudo_random_extents(40, 1), pseudo_random_extents(30, 2), pseudo_random_extents(20, 3)];
+        let shifts = vec![(0., 0.), (150., 0.), (0., 300.)];
+        let slices: Vec<&[Extent]> = clusters.iter().map(|c| c.as_slice()).collect();
+        let max_offsets: Vec<Vec<f64>> = clusters.iter().map(|c| vec![4.; c.len()]).collect();
+
+        let mut expected: Vec<BuildingPair> = Vec::new();
+        for first in 0..clusters.len() {
+            for second in first + 1..clusters.len() {
+                for (i, a) in clusters[first].iter().enumerate() {
+                    for (j, b) in clusters[second].iter().enumerate() {
+                        let offset = offset(first, i, second, j);
+                        let distance = distance_between_extents(a, b, shifts[first], shifts[second]) / offset;
+                        expected.push(BuildingPair {
+                            distance,
+                            offset,
+                            first_cluster: first,
+                            second_cluster: second,
+                            first_idx: i,
+                            second_idx: j,
+                        });
+                    }
+                }
+            }
+        }
+        expected.sort();
+        for &k in &[1, 5, 100] {
+            let pairs = closest_building_pairs(&slices, &shifts, &max_offsets, k, offset).unwrap();
+            assert_eq!(pairs, expected[..k].to_vec());
+        }
+        assert!(closest_building_pairs(&slices, &shifts, &max_offsets, 0, offset).unwrap().is_empty());
+        assert!(closest_building_pairs(&slices, &shifts, &max_offsets, 1, |_, _, _, _| f64::NAN).is_none());
+    }
+
+    #[test]
+    fn test_any_closer_than_equal_brute_force() {
+        let first = pseudo_random_extents(40, 4);
+        let second = pseudo_random_extents(30, 5);
+        let max_offsets = vec![4.; first.len()];
+        for &shift in &[(0., 0.), (120., 0.), (160., 230.)] {
+            let min = kernel::min_normalized_distance(&first, &second, (0., 0.), shift, |i, j| offset(0, i, 1, j))
+                .unwrap()
+                .0;
+            for &threshold in &[-2., 0.5, 1., 5., min, min + 1e-9, f64::INFINITY] {
+                let closer = any_closer_than(&first, &second, (0., 0.), shift, &max_offsets, 4., threshold, |i, j| {
+                    offset(0, i, 1, j)
+                });
+                assert_eq!(closer, Some(min < threshold));
+            }
+        }
+        assert_eq!(any_closer_than(&first, &[], (0., 0.), (0., 0.), &max_offsets, 4., 1., |_, _| 1.), Some(false));
+        assert!(any_closer_than(&first, &second, (0., 0.), (0., 0.), &max_offsets, 4., 1., |_, _| f64::NAN).is_none());
+    }
+}
@@ -0,0 +1,196 @@
+// Параллельные варианты вычислительных функций и настройка пула потоков rayon.
+use rayon::prelude::*;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::{Arc, RwLock};
+
+use crate::kernel::{self, Extent, OrientedExtent};
+use crate::spatial;
+
+/// Количество пар сооружений, начиная с которого расчет выполняется параллельно.
+/// На маленьких кластерах накладные расходы rayon больше выигрыша от параллельности.
+pub const DEFAULT_PARALLEL_THRESHOLD: usize = 10_000;
+
+static PARALLEL_THRESHOLD: AtomicUsize = AtomicUsize::new(DEFAULT_PARALLEL_THRESHOLD);
+
+lazy_static! {
+    // собственный пул вместо глобального, тк глобальный пул rayon нельзя перенастроить после создания
+    static ref THREAD_POOL: RwLock<Option<Arc<rayon::ThreadPool>>> = RwLock::new(None);
+}
+
+pub fn parallel_threshold() -> usize {
+    PARALLEL_THRESHOLD.load(Ordering::Relaxed)
+}
+
+pub fn set_parallel_threshold(pair_count: usize) {
+    PARALLEL_THRESHOLD.store(pair_count, Ordering::Relaxed);
+}
+
+pub fn is_parallel(pair_count: usize) -> bool {
+    pair_count >= parallel_threshold()
+}
+
+/// Задает количество потоков, 0 -- вернуться к глобальному пулу rayon.
+pub fn set_num_threads(num_threads: usize) -> Result<(), String> {
+    let pool = if num_threads == 0 {
+        None
+    } else {
+        let pool = rayon::ThreadPoolBuilder::new()
+            .num_threads(num_threads)
+            .build()
+            .map_err(|e| e.to_string())?;
+        Some(Arc::new(pool))
+    };
+    *THREAD_POOL.write().unwrap() = pool;
+    Ok(())
+}
+
+pub fn current_num_threads() -> usize {
+    match THREAD_POOL.read().unwrap().as_ref() {
+        Some(pool) => pool.current_num_threads(),
+        None => rayon::current_num_threads(),
+    }
+}
+
+/// Выполняет `op` в настроенном пуле потоков.
+pub fn install<R: Send, F: FnOnce() -> R + Send>(op: F) -> R {
+    // пул клонируется, чтобы не держать блокировку во время расчета
+    let pool = THREAD_POOL.read().unwrap().clone();
+    match pool {
+        Some(pool) => pool.install(op),
+        None => op(),
+    }
+}
+
+/// Из двух результатов выбирается меньшее расстояние, при равенстве -- пара с меньшими индексами,
+/// чтобы результат совпадал с последовательным перебором.
+fn pick_min(a: (f64, f64, usize, usize), b: (f64, f64, usize, usize)) -> (f64, f64, usize, usize) {
+    if b.0 < a.0 || (b.0 == a.0 && (b.2, b.3) < (a.2, a.3)) {
+        b
+    } else {
+        a
+    }
+}
+
+/// Параллельный вариант `kernel::min_distance`, строки первого кластера распределяются по потокам.
+pub fn min_distance(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+) -> (f64, usize, usize) {
+    let (distance, _, first_idx, second_idx) = first
+        .par_iter()
+        .enumerate()
+        .map(|(first_idx, extent)| {
+            let (distance, _, second_idx) = kernel::min_distance(
+                std::slice::from_ref(extent),
+                second,
+                first_shift,
+                second_shift,
+            );
+            (distance, 0., first_idx, second_idx)
+        })
+        .reduce(|| (f64::INFINITY, 0., usize::MAX, usize::MAX), pick_min);
+    (distance, first_idx, second_idx)
+}
+
+/// Параллельный вариант `kernel::min_normalized_distance`.
+pub fn min_normalized_distance<F: Fn(usize, usize) -> f64 + Sync>(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+    offset: F,
+) -> Option<(f64, f64, usize, usize)> {
+    first
+        .par_iter()
+        .enumerate()
+        .map(|(first_idx, extent)| {
+            kernel::min_normalized_distance(
+                std::slice::from_ref(extent),
+                second,
+                first_shift,
+                second_shift,
+                |_, second_idx| offset(first_idx, second_idx),
+            ).map(|(distance, offset_m, _, second_idx)| (distance, offset_m, first_idx, second_idx))
+        })
+        .reduce(
+            || Some((f64::INFINITY, 0., usize::MAX, usize::MAX)),
+            |a, b| match (a, b) {
+                (Some(a), Some(b)) => Some(pick_min(a, b)),
+                _ => None,
+            },
+        )
+}
+
+/// Последовательный или параллельный расчет в зависимости от количества пар сооружений.
+pub fn min_distance_adaptive(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+) -> (f64, usize, usize) {
+    if is_parallel(first.len() * second.len()) {
+        install(|| min_distance(first, second, first_shift, second_shift))
+    } else {
+        kernel::min_distance(first, second, first_shift, second_shift)
+    }
+}
+
+/// Последовательный или параллельный расчет безразмерного расстояния в зависимости от количества пар сооружений.
+pub fn min_normalized_distance_adaptive<F: Fn(usize, usize) -> f64 + Send + Sync>(
+    first: &[Extent],
+    second: &[Extent],
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+    offset: F,
+) -> Option<(f64, f64, usize, usize)> {
+    if is_parallel(first.len() * second.len()) {
+        install(|| min_normalized_distance(first, second, first_shift, second_shift, offset))
+    } else {
+        kernel::min_normalized_distance(first, second, first_shift, second_shift, offset)
+    }
+}
+
+/// Параллельный вариант `spatial::overlapping_pairs`, сооружения распределяются по потокам.
+pub fn overlapping_pairs(extents: &[Extent], cell_size: Option<f64>) -> Vec<(usize, usize)> {
+    let grid = spatial::OverlapGrid::new(extents, cell_size);
+    let overlaps: Vec<Vec<usize>> = (0..grid.len()).into_par_iter().map(|idx| grid.overlaps(idx)).collect();
+    overlaps
+        .into_iter()
+        .enumerate()
+        .flat_map(|(first_idx, seconds)| seconds.into_iter().map(move |second_idx| (first_idx, second_idx)))
+        .collect()
+}
+
+/// Последовательный или параллельный поиск пересекающихся сооружений. Количество проверяемых
+/// пар пропорционально количеству сооружений, поэтому с порогом сравнивается количество сооружений.
+pub fn overlapping_pairs_adaptive(extents: &[Extent], cell_size: Option<f64>) -> Vec<(usize, usize)> {
+    if is_parallel(extents.len()) {
+        install(|| overlapping_pairs(extents, cell_size))
+    } else {
+        spatial::overlapping_pairs(extents, cell_size)
+    }
+}
+
+/// Параллельный вариант `kernel::oriented_distance_matrix`, строки матрицы распределяются по потокам.
+pub fn oriented_distance_matrix(first: &[OrientedExtent], second: &[OrientedExtent]) -> Vec<f64> {
+    let mut distances = vec![0.; first.len() * second.len()];
+    if !second.is_empty() {
+        distances.par_chunks_mut(second.len()).zip(first.par_iter()).for_each(|(row, first_extent)| {
+            for (value, second_extent) in row.iter_mut().zip(second) {
+                *value = kernel::oriented_distance(first_extent, second_extent);
+            }
+        });
+    }
+    distances
+}
+
+/// Последовательный или параллельный расчет матрицы расстояний в зависимости от количества пар сооружений.
+pub fn oriented_distance_matrix_adaptive(first: &[OrientedExtent], second: &[OrientedExtent]) -> Vec<f64> {
+    if is_parallel(first.len() * second.len()) {
+        install(|| oriented_distance_matrix(first, second))
+    } else {
+        kernel::oriented_distance_matrix(first, second)
+    }
+}
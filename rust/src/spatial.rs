@@ -0,0 +1,362 @@
+// Пространственный индекс сооружений кластера для поиска минимального расстояния
+// без полного перебора пар.
+use std::collections::HashMap;
+
+use crate::kernel::{distance_between_extents, Extent};
+
+/// Среднее количество сооружений в ячейке сетки.
+pub const DEFAULT_BUCKET_SIZE: usize = 32;
+/// Запас на погрешность округления при сравнении нижней оценки с найденным минимумом, м.
+pub const LOWER_BOUND_TOLERANCE: f64 = 1e-7;
+
+/// Габарит (axis-aligned bounding box).
+#[derive(Copy, Clone, Debug)]
+pub struct Bounds {
+    pub min_x: f64,
+    pub max_x: f64,
+    pub min_y: f64,
+    pub max_y: f64,
+}
+
+impl Bounds {
+    pub fn empty() -> Bounds {
+        Bounds {
+            min_x: f64::INFINITY,
+            max_x: f64::NEG_INFINITY,
+            min_y: f64::INFINITY,
+            max_y: f64::NEG_INFINITY,
+        }
+    }
+
+    /// Общий габарит сооружений, для пустого набора -- `Bounds::empty()`.
+    pub fn from_extents(extents: &[Extent]) -> Bounds {
+        let mut bounds = Bounds::empty();
+        for extent in extents {
+            bounds.extend(extent);
+        }
+        bounds
+    }
+
+    pub fn from_extent(extent: &Extent) -> Bounds {
+        Bounds {
+            min_x: extent.x - extent.half_length,
+            max_x: extent.x + extent.half_length,
+            min_y: extent.y - extent.half_width,
+            max_y: extent.y + extent.half_width,
+        }
+    }
+
+    pub fn extend(&mut self, extent: &Extent) {
+        self.min_x = self.min_x.min(extent.x - extent.half_length);
+        self.max_x = self.max_x.max(extent.x + extent.half_length);
+        self.min_y = self.min_y.min(extent.y - extent.half_width);
+        self.max_y = self.max_y.max(extent.y + extent.half_width);
+    }
+
+    pub fn shifted(&self, shift: (f64, f64)) -> Bounds {
+        Bounds {
+            min_x: self.min_x + shift.0,
+            max_x: self.max_x + shift.0,
+            min_y: self.min_y + shift.1,
+            max_y: self.max_y + shift.1,
+        }
+    }
+
+    /// Расстояние между габаритами, для пересекающихся габаритов равно 0.
+    pub fn lower_bound(&self, other: &Bounds) -> f64 {
+        let gap_x = (self.min_x - other.max_x).max(other.min_x - self.max_x).max(0.);
+        let gap_y = (self.min_y - other.max_y).max(other.min_y - self.max_y).max(0.);
+        (gap_x.powi(2) + gap_y.powi(2)).sqrt()
+    }
+}
+
+pub struct Cell {
+    pub bounds: Bounds,
+    // индексы сооружений по возрастанию
+    pub members: Vec<usize>,
+}
+
+/// Равномерная сетка над габаритами сооружений кластера в локальных координатах.
+/// Сооружения раскладываются по ячейкам по положению центра.
+pub struct GridIndex {
+    pub extents: Vec<Extent>,
+    pub cells: Vec<Cell>,
+}
+
+impl GridIndex {
+    pub fn new(extents: Vec<Extent>, bucket_size: usize) -> GridIndex {
+        if extents.is_empty() {
+            return GridIndex { extents, cells: Vec::new() };
+        }
+        let cell_count = (extents.len() + bucket_size - 1) / bucket_size.max(1);
+        let side = (cell_count as f64).sqrt().ceil().max(1.) as usize;
+
+        let (min_x, max_x) = extents.iter().fold((f64::INFINITY, f64::NEG_INFINITY), |(lo, hi), e| (lo.min(e.x), hi.max(e.x)));
+        let (min_y, max_y) = extents.iter().fold((f64::INFINITY, f64::NEG_INFINITY), |(lo, hi), e| (lo.min(e.y), hi.max(e.y)));
+
+        let mut grid: Vec<Vec<usize>> = vec![Vec::new(); side * side];
+        for (idx, extent) in extents.iter().enumerate() {
+            let cell_x = cell_coordinate(extent.x, min_x, max_x, side);
+            let cell_y = cell_coordinate(extent.y, min_y, max_y, side);
+            grid[cell_x * side + cell_y].push(idx);
+        }
+
+        let cells = grid
+            .into_iter()
+            .filter(|members| !members.is_empty())
+            .map(|members| {
+                let mut bounds = Bounds::empty();
+                for &idx in &members {
+                    bounds.extend(&extents[idx]);
+                }
+                Cell { bounds, members }
+            })
+            .collect();
+        GridIndex { extents, cells }
+    }
+}
+
+fn cell_coordinate(value: f64, min: f64, max: f64, side: usize) -> usize {
+    let span = max - min;
+    if span == 0. {
+        return 0;
+    }
+    (((value - min) / span * side as f64) as usize).min(side - 1)
+}
+
+/// Минимальное расстояние между сооружениями двух кластеров, сдвинутых на `first_shift` и `second_shift`.
+///
+/// Пары ячеек перебираются по возрастанию нижней оценки расстояния между их габаритами,
+/// перебор прекращается, как только оценка превышает найденный минимум.
+/// Возвращает расстояние и индексы пары сооружений, для пустых кластеров -- бесконечность.
+pub fn min_distance(
+    first: &GridIndex,
+    second: &GridIndex,
+    first_shift: (f64, f64),
+    second_shift: (f64, f64),
+) -> (f64, usize, usize) {
+    let mut cell_pairs: Vec<(f64, usize, usize)> = Vec::with_capacity(first.cells.len() * second.cells.len());
+    for (first_cell_idx, first_cell) in first.cells.iter().enumerate() {
+        let first_bounds = first_cell.bounds.shifted(first_shift);
+        for (second_cell_idx, second_cell) in second.cells.iter().enumerate() {
+            let lower_bound = first_bounds.lower_bound(&second_cell.bounds.shifted(second_shift));
+            cell_pairs.push((lower_bound, first_cell_idx, second_cell_idx));
+        }
+    }
+    cell_pairs.sort_by(|a, b| a.0.total_cmp(&b.0));
+
+    let mut min_distance: f64 = f64::INFINITY;
+    let mut min_pair: (usize, usize) = (usize::MAX, usize::MAX);
+    for (lower_bound, first_cell_idx, second_cell_idx) in cell_pairs {
+        if lower_bound - LOWER_BOUND_TOLERANCE > min_distance {
+            break;
+        }
+        for &first_idx in &first.cells[first_cell_idx].members {
+            for &second_idx in &second.cells[second_cell_idx].members {
+                let distance = distance_between_extents(
+                    &first.extents[first_idx],
+                    &second.extents[second_idx],
+                    first_shift,
+                    second_shift,
+                );
+                if distance < min_distance {
+                    min_distance = distance;
+                    min_pair = (first_idx, second_idx);
+                }
+            }
+        }
+    }
+    (min_distance, min_pair.0, min_pair.1)
+}
+
+/// Сетка габаритов сооружений площадки для поиска пересекающихся сооружений,
+/// повторяет `force.spatial.find_overlapping_buildings`.
+///
+/// Каждое сооружение попадает во все ячейки, которые покрывает его габарит. Пара сооружений проверяется
+/// только в ячейке, содержащей левый нижний угол пересечения габаритов, поэтому каждая пара
+/// рассматривается один раз.
+pub struct OverlapGrid<'a> {
+    extents: &'a [Extent],
+    bounds: Vec<Bounds>,
+    origin: (f64, f64),
+    cell_size: f64,
+    cells: HashMap<(i64, i64), Vec<usize>>,
+}
+
+impl<'a> OverlapGrid<'a> {
+    /// `cell_size` по умолчанию -- медиана большей стороны габаритов сооружений.
+    pub fn new(extents: &'a [Extent], cell_size: Option<f64>) -> OverlapGrid<'a> {
+        let bounds: Vec<Bounds> = extents.iter().map(Bounds::from_extent).collect();
+        let cell_size = match cell_size {
+            Some(cell_size) => cell_size,
+            None => median_size(&bounds),
+        };
+        // у вырожденных сооружений нет размера, все они попадают в ячейки своих центров
+        let cell_size = if cell_size > 0. { cell_size } else { 1. };
+        let origin = bounds
+            .iter()
+            .fold((f64::INFINITY, f64::INFINITY), |(x, y), b| (x.min(b.min_x), y.min(b.min_y)));
+        let mut grid = OverlapGrid { extents, bounds, origin, cell_size, cells: HashMap::new() };
+        for idx in 0..extents.len() {
+            let (low, high) = grid.cell_range(idx);
+            for cell_x in low.0..=high.0 {
+                for cell_y in low.1..=high.1 {
+                    grid.cells.entry((cell_x, cell_y)).or_insert_with(Vec::new).push(idx);
+                }
+            }
+        }
+        grid
+    }
+
+    pub fn len(&self) -> usize {
+        self.extents.len()
+    }
+
+    /// Сооружения с индексами больше `first_idx`, пересекающиеся с ним, по возрастанию индексов.
+    pub fn overlaps(&self, first_idx: usize) -> Vec<usize> {
+        let mut result: Vec<usize> = Vec::new();
+        let (low, high) = self.cell_range(first_idx);
+        let first = &self.bounds[first_idx];
+        for cell_x in low.0..=high.0 {
+            for cell_y in low.1..=high.1 {
+                for &second_idx in &self.cells[&(cell_x, cell_y)] {
+                    if second_idx <= first_idx {
+                        continue;
+                    }
+                    let second = &self.bounds[second_idx];
+                    let corner = self.cell(first.min_x.max(second.min_x), first.min_y.max(second.min_y));
+                    if corner == (cell_x, cell_y)
+                        && distance_between_extents(
+                            &self.extents[first_idx],
+                            &self.extents[second_idx],
+                            (0., 0.),
+                            (0., 0.),
+                        ) < 0.
+                    {
+                        result.push(second_idx);
+                    }
+                }
+            }
+        }
+        result.sort_unstable();
+        result
+    }
+
+    fn cell(&self, x: f64, y: f64) -> (i64, i64) {
+        (
+            ((x - self.origin.0) / self.cell_size).floor() as i64,
+            ((y - self.origin.1) / self.cell_size).floor() as i64,
+        )
+    }
+
+    /// Ячейки габарита сооружения, расширенного на погрешность,
+    /// чтобы угол пересечения попадал в ячейки обоих сооружений.
+    fn cell_range(&self, idx: usize) -> ((i64, i64), (i64, i64)) {
+        let bounds = &self.bounds[idx];
+        (
+            self.cell(bounds.min_x - LOWER_BOUND_TOLERANCE, bounds.min_y - LOWER_BOUND_TOLERANCE),
+            self.cell(bounds.max_x + LOWER_BOUND_TOLERANCE, bounds.max_y + LOWER_BOUND_TOLERANCE),
+        )
+    }
+}
+
+fn median_size(bounds: &[Bounds]) -> f64 {
+    let mut sizes: Vec<f64> = bounds.iter().map(|b| (b.max_x - b.min_x).max(b.max_y - b.min_y)).collect();
+    if sizes.is_empty() {
+        return 0.;
+    }
+    sizes.sort_by(|a, b| a.total_cmp(b));
+    let middle = sizes.len() / 2;
+    if sizes.len() % 2 == 0 {
+        (sizes[middle - 1] + sizes[middle]) / 2.
+    } else {
+        sizes[middle]
+    }
+}
+
+/// Все пары пересекающихся сооружений (расстояние между которыми равно -1),
+/// первый индекс меньше второго, пары упорядочены по возрастанию индексов.
+pub fn overlapping_pairs(extents: &[Extent], cell_size: Option<f64>) -> Vec<(usize, usize)> {
+    let grid = OverlapGrid::new(extents, cell_size);
+    (0..grid.len())
+        .flat_map(|first_idx| grid.overlaps(first_idx).into_iter().map(move |second_idx| (first_idx, second_idx)))
+        .collect()
+}
+
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn brute_force(first: &[Extent], second: &[Extent], first_shift: (f64, f64), second_shift: (f64, f64)) -> f64 {
+        let mut min = f64::INFINITY;
+        for a in first {
+            for b in second {
+                min = min.min(distance_between_extents(a, b, first_shift, second_shift));
+            }
+        }
+        min
+    }
+
+    fn pseudo_random_extents(count: usize, seed: u64) -> Vec<Extent> {
+        let mut state = seed;
+        let mut next = move || {
+            state = state.wrapping_mul(6364136223846793005).wrapping_add(1442695040888963407);
+            ((state >> 33) % 1000) as f64 / 10.
+        };
+        (0..count)
+            .map(|_| Extent::new(next() * 3., next() * 3., 5. + next() / 4., 5. + next() / 4., 0.))
+            .collect()
+    }
+
+    #[test]
+    fn test_min_distance_equals_brute_force() {
+        let first = pseudo_random_extents(300, 1);
+        let second = pseudo_random_extents(200, 2);
+        let first_index = GridIndex::new(first.clone(), 8);
+        let second_index = GridIndex::new(second.clone(), 8);
+        for shift in &[0., 150., 400., 1000.] {
+            let (distance, i, j) = min_distance(&first_index, &second_index, (0., 0.), (*shift, 20.));
+            assert_eq!(distance, brute_force(&first, &second, (0., 0.), (*shift, 20.)));
+            assert_eq!(distance, distance_between_extents(&first[i], &second[j], (0., 0.), (*shift, 20.)));
+        }
+    }
+
+    #[test]
+    fn test_min_distance_with_nan_coordinates() {
+        let mut first = pseudo_random_extents(50, 4);
+        first[0] = Extent::new(f64::NAN, 0., 5., 5., 0.);
+        let second = pseudo_random_extents(50, 5);
+        // сортировка пар ячеек не должна паниковать на NaN
+        min_distance(&GridIndex::new(first, 4), &GridIndex::new(second, 4), (0., 0.), (0., 0.));
+    }
+
+    #[test]
+    fn test_bounds_from_extents() {
+        let extents = [Extent::new(0., 0., 2., 4., 0.), Extent::new(10., 5., 2., 4., 90.)];
+        let bounds = Bounds::from_extents(&extents);
+        assert_eq!((bounds.min_x, bounds.max_x, bounds.min_y, bounds.max_y), (-2., 11., -1., 7.));
+        assert_eq!(Bounds::from_extents(&[]).min_x, f64::INFINITY);
+    }
+
+    #[test]
+    fn test_overlapping_pairs_equal_brute_force() {
+        let extents = pseudo_random_extents(400, 3);
+        let mut expected: Vec<(usize, usize)> = Vec::new();
+        for i in 0..extents.len() {
+            for j in i + 1..extents.len() {
+                if distance_between_extents(&extents[i], &extents[j], (0., 0.), (0., 0.)) == -1. {
+                    expected.push((i, j));
+                }
+            }
+        }
+        assert!(!expected.is_empty());
+        for cell_size in &[None, Some(2.), Some(1000.)] {
+            assert_eq!(overlapping_pairs(&extents, *cell_size), expected);
+        }
+        // касающиеся сооружения не пересекаются
+        let touching = [Extent::new(0., 0., 10., 10., 0.), Extent::new(10., 0., 10., 10., 0.)];
+        assert!(overlapping_pairs(&touching, None).is_empty());
+        assert!(overlapping_pairs(&[], None).is_empty());
+    }
+}